@@ -21,8 +21,11 @@ from apps.inventory.models import (
     Batch, StockBalance, Reserve, BouquetBatchComponentSnapshot,
 )
 from apps.inventory.services import (
-    fifo_write_off, _update_stock_balance, InsufficientStockError,
+    fifo_write_off, _update_stock_balance, _fifo_cost, InsufficientStockError,
+    lock_reserve, reserve_stock_keys, shift_reserved_qty,
 )
+from apps.inventory.ledger import record_movements, stock_ledger
+from apps.inventory.locks import lock_stock, retry_on_conflict
 from apps.nomenclature.models import Nomenclature, NomenclatureGroup
 
 from .serializers import (
@@ -223,17 +226,10 @@ class CashierFeedView(viewsets.ViewSet):
         if q:
             batch_qs = batch_qs.filter(nomenclature__name__icontains=q)
 
-        # Sum reserved quantities
-        reserved = defaultdict(Decimal)
-        for r in Reserve.objects.filter(
-            organization=org, status='active',
-        ).values('batch_id').annotate(total=Sum('quantity')):
-            reserved[str(r['batch_id'])] = r['total']
-
         batch_qs = batch_qs.select_related('nomenclature', 'warehouse', 'nomenclature__bouquet_template')
         result = []
         for batch in batch_qs[:100]:
-            avail = batch.remaining - reserved.get(str(batch.id), Decimal('0'))
+            avail = batch.remaining - batch.reserved_qty
             if avail <= 0:
                 continue
             nom = batch.nomenclature
@@ -326,6 +322,8 @@ class ReserveViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             qs = qs.filter(status=st)
         return qs
 
+    @retry_on_conflict
+    @db_transaction.atomic
     def create(self, request, *args, **kwargs):
         ser = ReserveCreateSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
@@ -345,7 +343,9 @@ class ReserveViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         phone = d.get('phone', '')
         phone_norm = _normalize_phone(phone)
 
+        # Порядок как у чека: строка организации, затем пара склад + букет
         lock_organization_row(org.id)
+        lock_stock([(wh, nom)])
         next_number = (Reserve.objects.filter(organization=org).aggregate(
             mx=Max('reserve_number'))['mx'] or 0) + 1
 
@@ -365,23 +365,52 @@ class ReserveViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             warehouse=wh,
             quantity=d.get('quantity', 1),
         )
+        shift_reserved_qty(reserve, 1)
         return Response(ReserveCashierSerializer(reserve).data, status=201)
 
+    @retry_on_conflict
+    @db_transaction.atomic
+    def perform_update(self, serializer):
+        # Снимаем резерв со счётчиков в прежнем виде и учитываем в новом
+        lock_stock(reserve_stock_keys(serializer.instance, serializer.validated_data))
+        lock_reserve(serializer.instance)
+        shift_reserved_qty(serializer.instance, -1)
+        super().perform_update(serializer)
+        shift_reserved_qty(serializer.instance, 1)
+
+    @retry_on_conflict
+    @db_transaction.atomic
+    def perform_destroy(self, instance):
+        lock_stock(reserve_stock_keys(instance))
+        instance = lock_reserve(instance)
+        shift_reserved_qty(instance, -1)
+        instance.delete()
+
     @action(detail=True, methods=['post'], url_path='cancel')
+    @retry_on_conflict
+    @db_transaction.atomic
     def cancel(self, request, pk=None):
         reserve = self.get_object()
+        lock_stock(reserve_stock_keys(reserve))
+        reserve = lock_reserve(reserve)
         if reserve.status != 'active':
             return Response({'detail': 'Можно отменить только активный резерв.'}, status=400)
+        shift_reserved_qty(reserve, -1)
         reserve.status = 'cancelled'
         reserve.cancelled_at = timezone.now()
         reserve.save(update_fields=['status', 'cancelled_at', 'updated_at'])
         return Response({'status': 'ok'})
 
     @action(detail=True, methods=['post'], url_path='expire')
+    @retry_on_conflict
+    @db_transaction.atomic
     def expire(self, request, pk=None):
         reserve = self.get_object()
+        lock_stock(reserve_stock_keys(reserve))
+        reserve = lock_reserve(reserve)
         if reserve.status != 'active':
             return Response({'detail': 'Можно просрочить только активный резерв.'}, status=400)
+        shift_reserved_qty(reserve, -1)
         reserve.status = 'expired'
         reserve.save(update_fields=['status', 'updated_at'])
         return Response({'status': 'ok'})
@@ -412,6 +441,7 @@ class ReserveViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
 class CheckoutView(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_conflict
     @db_transaction.atomic
     def create(self, request):
         """POST /api/cashier/checkout/"""
@@ -461,28 +491,41 @@ class CheckoutView(viewsets.ViewSet):
         subtotal = Decimal('0')
         total_cost = Decimal('0')
 
+        # Все блокировки чека — заранее и в общем для складских операций порядке
+        # (locks): пары склад + номенклатура (lock_stock), затем позиции по id
+        lock_stock(self._stock_keys(org, tp, lines))
+        noms = {
+            nom.pk: nom for nom in Nomenclature.objects.select_for_update().filter(
+                pk__in={line['nomenclature'] for line in lines},
+            ).order_by('pk')
+        }
+
         try:
-            for line in lines:
-                sm = line['source_mode']
-                nom = Nomenclature.objects.select_for_update().get(pk=line['nomenclature'])
-                qty = Decimal(str(line['quantity']))
-                price = Decimal(str(line['price']))
-                discount = Decimal(str(line.get('discount_percent', 0)))
-                line_total = price * qty * (1 - discount / 100)
-                subtotal += line_total
-
-                if sm == 'catalog':
-                    # Обычный товар или услуга
-                    cost = self._sell_catalog(org, nom, qty, line, sale, request.user)
-                    total_cost += cost
-
-                elif sm == 'ready_bouquet':
-                    cost = self._sell_bouquet(org, nom, qty, price, discount, line, sale, request.user)
-                    total_cost += cost
-
-                elif sm == 'reserve':
-                    cost = self._sell_reserve(org, nom, qty, price, discount, line, sale, request.user)
-                    total_cost += cost
+            # Движения и остатки всех строк чека пишутся пакетом в конце
+            with stock_ledger():
+                for line in lines:
+                    sm = line['source_mode']
+                    nom = noms.get(line['nomenclature'])
+                    if nom is None:
+                        raise Nomenclature.DoesNotExist
+                    qty = Decimal(str(line['quantity']))
+                    price = Decimal(str(line['price']))
+                    discount = Decimal(str(line.get('discount_percent', 0)))
+                    line_total = price * qty * (1 - discount / 100)
+                    subtotal += line_total
+
+                    if sm == 'catalog':
+                        # Обычный товар или услуга
+                        cost = self._sell_catalog(org, nom, qty, line, sale, request.user)
+                        total_cost += cost
+
+                    elif sm == 'ready_bouquet':
+                        cost = self._sell_bouquet(org, nom, qty, price, discount, line, sale, request.user)
+                        total_cost += cost
+
+                    elif sm == 'reserve':
+                        cost = self._sell_reserve(org, nom, qty, price, discount, line, sale, request.user)
+                        total_cost += cost
         except InsufficientStockError as e:
             raise DRFValidationError({'detail': str(e)})
         except Nomenclature.DoesNotExist:
@@ -527,6 +570,49 @@ class CheckoutView(viewsets.ViewSet):
             'total': str(sale.total),
         }, status=201)
 
+    @staticmethod
+    def _default_warehouse(org, trading_point):
+        """Склад продаж точки: отмеченный для продаж или первый."""
+        from apps.core.models import Warehouse
+        warehouses = Warehouse.objects.filter(organization=org, trading_point=trading_point)
+        return warehouses.filter(is_default_for_sales=True).first() or warehouses.first()
+
+    def _stock_keys(self, org, trading_point, lines):
+        """
+        Пары (склад, номенклатура) всех строк чека для одного lock_stock.
+        Строка резерва продаёт партию резерва — склад берётся из партии,
+        плюс пара самого резерва (его счётчик reserved_qty).
+        """
+        reserves = {
+            pk: (batch_id, warehouse_id, bouquet_id)
+            for pk, batch_id, warehouse_id, bouquet_id in Reserve.objects.filter(
+                organization=org,
+                pk__in={line['reserve'] for line in lines if line['source_mode'] == 'reserve' and line.get('reserve')},
+            ).values_list('pk', 'batch_id', 'warehouse_id', 'bouquet_nomenclature_id')
+        }
+        batch_warehouses = dict(Batch.objects.filter(
+            pk__in={line['batch'] for line in lines if line.get('batch')}
+            | {batch_id for batch_id, _, _ in reserves.values() if batch_id},
+        ).values_list('pk', 'warehouse_id'))
+        default_wh = None
+        stock_keys = []
+        for line in lines:
+            if line['source_mode'] == 'reserve' and line.get('reserve') in reserves:
+                batch_id, reserve_wh_id, bouquet_id = reserves[line['reserve']]
+                if bouquet_id:
+                    stock_keys.append((reserve_wh_id, bouquet_id))
+                wh_id = batch_warehouses.get(batch_id)
+            elif line.get('batch'):
+                wh_id = batch_warehouses.get(line['batch'])
+            else:
+                wh_id = line.get('warehouse')
+                if not wh_id:
+                    default_wh = default_wh or self._default_warehouse(org, trading_point)
+                    wh_id = default_wh.pk if default_wh else None
+            if wh_id:
+                stock_keys.append((wh_id, line['nomenclature']))
+        return stock_keys
+
     def _sell_catalog(self, org, nom, qty, line, sale, user):
         """Продажа обычного материала или услуги."""
         price = Decimal(str(line['price']))
@@ -540,34 +626,27 @@ class CheckoutView(viewsets.ViewSet):
             from apps.core.models import Warehouse
             wh_id = line.get('warehouse')
             if not wh_id:
-                wh = Warehouse.objects.filter(
-                    organization=org,
-                    trading_point=sale.trading_point,
-                    is_default_for_sales=True,
-                ).first()
-                if not wh:
-                    wh = Warehouse.objects.filter(
-                        organization=org,
-                        trading_point=sale.trading_point,
-                    ).first()
+                wh = self._default_warehouse(org, sale.trading_point)
             else:
                 wh = Warehouse.objects.get(pk=wh_id)
 
             if wh:
                 from apps.inventory.models import StockMovement
                 fifo = fifo_write_off(org, wh, nom, qty, user)
-                cost_total = sum(r['qty'] * r['price'] for r in fifo)
+                cost_total = _fifo_cost(fifo)
                 cost_price = cost_total / qty if qty else Decimal('0')
                 if len(fifo) == 1:
                     batch_ref = fifo[0]['batch']
-                for r in fifo:
-                    StockMovement.objects.create(
+                record_movements([
+                    StockMovement(
                         organization=org, nomenclature=nom,
                         movement_type='sale', warehouse_from=wh,
                         batch=r['batch'], quantity=r['qty'], price=r['price'],
                         sale=sale, user=user, notes=f'Касса #{sale.number}',
                     )
-                _update_stock_balance(org, wh, nom, -qty)
+                    for r in fifo
+                ])
+                _update_stock_balance(org, wh, nom, -qty, -cost_total)
 
         SaleItem.objects.create(
             sale=sale, nomenclature=nom, batch=batch_ref,
@@ -591,13 +670,13 @@ class CheckoutView(viewsets.ViewSet):
         batch.save(update_fields=['remaining'])
 
         from apps.inventory.models import StockMovement
-        StockMovement.objects.create(
+        record_movements([StockMovement(
             organization=org, nomenclature=nom,
             movement_type='sale', warehouse_from=batch.warehouse,
             batch=batch, quantity=qty, price=cost_price,
             sale=sale, user=user, notes=f'Касса #{sale.number} (букет)',
-        )
-        _update_stock_balance(org, batch.warehouse, nom, -qty)
+        )])
+        _update_stock_balance(org, batch.warehouse, nom, -qty, -cost_price * qty)
 
         si = SaleItem.objects.create(
             sale=sale, nomenclature=nom, batch=batch,
@@ -647,13 +726,13 @@ class CheckoutView(viewsets.ViewSet):
         batch.save(update_fields=['remaining'])
 
         from apps.inventory.models import StockMovement
-        StockMovement.objects.create(
+        record_movements([StockMovement(
             organization=org, nomenclature=nom,
             movement_type='sale', warehouse_from=batch.warehouse,
             batch=batch, quantity=qty, price=cost_price,
             sale=sale, user=user, notes=f'Касса #{sale.number} (резерв #{reserve.reserve_number})',
-        )
-        _update_stock_balance(org, batch.warehouse, nom, -qty)
+        )])
+        _update_stock_balance(org, batch.warehouse, nom, -qty, -cost_price * qty)
 
         si = SaleItem.objects.create(
             sale=sale, nomenclature=nom, batch=batch,
@@ -672,6 +751,7 @@ class CheckoutView(viewsets.ViewSet):
             )
 
         # Mark reserve as sold
+        shift_reserved_qty(reserve, -1)
         reserve.status = 'sold'
         reserve.sold_sale = sale
         reserve.sold_at = timezone.now()
@@ -8,7 +8,7 @@ from .models import (
 @admin.register(Organization)
 class OrganizationAdmin(admin.ModelAdmin):
     list_display = ('name', 'inn', 'phone', 'is_active', 'subscription_plan', 'paid_until')
-    list_filter = ('is_active', 'subscription_plan')
+    list_filter = ('is_active', 'subscription_plan', 'auto_write_off_expired')
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -0,0 +1,61 @@
+"""
+Обслуживание помесячных секций журналов (stock_movements, transactions).
+
+Без аргументов печатает секции. --ensure досоздаёт секции наперёд
+(то же делает ночная задача ensure_journal_partitions), --detach-before
+отсоединяет месяцы раньше указанного и переносит их в схему archive.
+
+    python manage.py journal_partitions
+    python manage.py journal_partitions --ensure --months-ahead 6
+    python manage.py journal_partitions --detach-before 2025-01 --table stock_movements
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.core.partitioning import (
+    PARTITIONED_TABLES, detach_partitions, ensure_partitions, is_partitioned, list_partitions,
+)
+
+
+def _month(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Ожидается месяц в формате ГГГГ-ММ: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Помесячные секции журналов: список, создание наперёд, отсоединение в архив.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', choices=sorted(PARTITIONED_TABLES))
+        parser.add_argument('--ensure', action='store_true', help='Досоздать секции наперёд.')
+        parser.add_argument('--months-ahead', type=int)
+        parser.add_argument('--detach-before', type=_month, help='ГГГГ-ММ: отсоединить более ранние месяцы.')
+        parser.add_argument('--keep-in-schema', action='store_true', help='Не переносить отсоединённые секции в archive.')
+
+    def handle(self, *args, **options):
+        tables = options.get('table') or list(PARTITIONED_TABLES)
+
+        for table in tables:
+            if not is_partitioned(table):
+                self.stdout.write(self.style.WARNING(f'{table}: таблица не секционирована'))
+                continue
+
+            if options['ensure']:
+                for name in ensure_partitions(table, months_ahead=options.get('months_ahead')):
+                    self.stdout.write(f'Создана секция {name}')
+
+            if options.get('detach_before'):
+                for name in detach_partitions(
+                    table, options['detach_before'], archive=not options['keep_in_schema'],
+                ):
+                    self.stdout.write(self.style.SUCCESS(f'Отсоединена секция {name}'))
+
+            with connection.cursor() as cursor:
+                partitions = list_partitions(table, cursor)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{table}: {len(partitions)} секций'))
+            for name, month in partitions:
+                self.stdout.write(f'  {name}' + ('' if month else ' (DEFAULT)'))
@@ -0,0 +1,23 @@
+"""Add the per-organization policy for automatic write-off of expired batches."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='auto_write_off_expired',
+            field=models.BooleanField(default=False, verbose_name='Автосписание просроченных партий'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='auto_write_off_grace_days',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Дней после срока годности до автосписания'),
+        ),
+    ]
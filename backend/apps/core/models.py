@@ -62,6 +62,11 @@ class Organization(models.Model):
     paid_until = models.DateField('Оплачено до', null=True, blank=True)
     max_users = models.PositiveIntegerField('Макс. пользователей', default=5)
     notes = models.TextField('Заметки администратора', blank=True, default='')
+    # Склад
+    auto_write_off_expired = models.BooleanField('Автосписание просроченных партий', default=False)
+    auto_write_off_grace_days = models.PositiveSmallIntegerField(
+        'Дней после срока годности до автосписания', default=0,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,38 @@
+"""
+Отложенная обработка ключей до коммита транзакции.
+
+Складские операции отмечают «грязные» ключи (позиции для пересчёта цены,
+пары склад + номенклатура для кэшей) много раз за транзакцию. collect_on_commit
+копит их в наборе, привязанном к текущей транзакции соединения, и вешает
+один on_commit на обработчик: после коммита обработчик получает весь набор
+одним вызовом.
+
+Набор живёт ровно столько, сколько его on_commit: при откате транзакции
+(или точки сохранения, в которой он появился) Django отбрасывает колбэк,
+и следующая отметка начинает новый набор — ключи откаченной транзакции
+в чужой коммит не попадают. Вне транзакции обработчик вызывается сразу.
+"""
+from django.db import transaction
+
+
+def collect_on_commit(flush, keys, using=None):
+    """Добавить keys в набор обработчика flush текущей транзакции; flush(набор) — после коммита."""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        flush(set(keys))
+        return
+
+    pending = connection.__dict__.setdefault('_collect_on_commit', {})
+    entry = pending.get(flush)
+    # Колбэк отброшен откатом — набор больше некому обработать
+    if entry is None or not any(callback is entry[1] for _, callback, *_ in connection.run_on_commit):
+        collected = set()
+
+        def callback():
+            if pending.get(flush) is entry:
+                del pending[flush]
+            flush(collected)
+
+        entry = pending[flush] = (collected, callback)
+        transaction.on_commit(callback, using=using)
+    entry[0].update(keys)
@@ -0,0 +1,131 @@
+"""
+Пагинация журналов (движения, транзакции, продажи, заказы).
+
+JournalPagination по умолчанию ведёт себя как глобальная PageNumberPagination,
+а по запросу клиента переключается в режимы постоянного времени:
+
+- ?cursor=<token> или ?pagination=cursor — keyset по (created_at, id):
+  WHERE (created_at, id) < (последняя строка) ORDER BY created_at DESC, id DESC,
+  без COUNT(*) и OFFSET. Ответ: {next, previous: null, results};
+- ?no_count=1 — обычные страницы (?page=N), но без COUNT(*):
+  ответ {next, previous, results}, наличие следующей страницы
+  определяется выборкой page_size + 1 строк.
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _truthy(value):
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class JournalPagination(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    no_count_query_param = 'no_count'
+    cursor_ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        if (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        ):
+            self.mode = 'cursor'
+            return self._paginate_cursor(queryset, request)
+        if _truthy(request.query_params.get(self.no_count_query_param)):
+            self.mode = 'no_count'
+            return self._paginate_no_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['count']['nullable'] = True
+        return response
+
+    # ─── keyset ──────────────────────────────────────────────
+
+    def _paginate_cursor(self, queryset, request):
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            created_at, pk = self._decode_cursor(token)
+            try:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk),
+                )
+            except ValidationError:
+                raise NotFound('Некорректный курсор.')
+
+        rows = list(queryset[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        self.previous_link = None
+        self.next_link = None
+        if has_next:
+            last = rows[-1]
+            url = request.build_absolute_uri()
+            url = remove_query_param(url, self.mode_query_param)
+            self.next_link = replace_query_param(
+                url, self.cursor_query_param, self._encode_cursor(last.created_at, last.pk),
+            )
+        return rows
+
+    def _encode_cursor(self, created_at, pk):
+        payload = json.dumps([created_at.isoformat(), str(pk)]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def _decode_cursor(self, token):
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(token.encode()))
+            return datetime.fromisoformat(created_at), uuid.UUID(pk)
+        except (TypeError, ValueError, AttributeError, binascii.Error, ValidationError):
+            raise NotFound('Некорректный курсор.')
+
+    # ─── страницы без COUNT(*) ────────────────────────────────
+
+    def _paginate_no_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except (TypeError, ValueError):
+            raise NotFound('Некорректный номер страницы.')
+
+        offset = (page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        has_next = len(rows) > page_size
+
+        url = request.build_absolute_uri()
+        self.next_link = (
+            replace_query_param(url, self.page_query_param, page_number + 1) if has_next else None
+        )
+        if page_number == 1:
+            self.previous_link = None
+        elif page_number == 2:
+            self.previous_link = remove_query_param(url, self.page_query_param)
+        else:
+            self.previous_link = replace_query_param(url, self.page_query_param, page_number - 1)
+        return rows[:page_size]
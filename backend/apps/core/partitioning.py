@@ -0,0 +1,266 @@
+"""
+Помесячное секционирование журналов (PostgreSQL, PARTITION BY RANGE).
+
+Журналы только дописываются и растут без ограничений: движения товара
+(stock_movements) и финансовые транзакции (transactions). Таблица-родитель
+секционируется по created_at, секция — календарный месяц в часовом поясе
+проекта (TIME_ZONE), имя секции — <таблица>_pYYYYMM, плюс секция DEFAULT
+для строк вне подготовленных месяцев.
+
+- Запросы с границами по created_at (отчёты, остатки на дату, keyset-страницы)
+  отсекают лишние секции ещё на этапе планирования.
+- Первичный ключ секционированной таблицы обязан включать ключ секционирования:
+  в БД это (id, created_at), для ORM первичным ключом остаётся id.
+- Индексы создаются на родителе и автоматически появляются в каждой секции.
+  CREATE INDEX CONCURRENTLY на родителе не поддерживается — новые индексы
+  этих таблиц добавлять обычным AddIndex.
+- Старый месяц снимается с таблицы DETACH PARTITION (без перезаписи данных)
+  и переносится в схему архива, откуда его можно выгрузить и удалить.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Секционированные журналы: таблица → колонка ключа секционирования
+PARTITIONED_TABLES = {
+    'stock_movements': 'created_at',
+    'transactions': 'created_at',
+}
+
+# На сколько месяцев вперёд держать готовые секции
+PARTITION_MONTHS_AHEAD = settings.PARTITION_MONTHS_AHEAD
+
+ARCHIVE_SCHEMA = 'archive'
+
+
+def _month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _month_bound(month):
+    """Начало месяца как aware datetime в часовом поясе проекта."""
+    return timezone.make_aware(
+        datetime.datetime.combine(month, datetime.time.min),
+        timezone.get_default_timezone(),
+    )
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(table, cursor=None):
+    def _check(cur):
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [table],
+        )
+        return cur.fetchone() is not None
+
+    if cursor is not None:
+        return _check(cursor)
+    with connection.cursor() as cur:
+        return _check(cur)
+
+
+def list_partitions(table, cursor):
+    """[(имя секции, месяц | None для DEFAULT)] в порядке месяцев."""
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        ORDER BY child.relname
+        """,
+        [table],
+    )
+    result = []
+    prefix = f'{table}_p'
+    for (name,) in cursor.fetchall():
+        month = None
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            suffix = name[len(prefix):]
+            month = datetime.date(int(suffix[:4]), int(suffix[4:6]), 1)
+        result.append((name, month))
+    return result
+
+
+def _create_month_partition(cursor, table, column, month):
+    """
+    Создать секцию месяца. Если строки этого месяца уже попали в DEFAULT,
+    они переносятся в новую таблицу, которая затем присоединяется секцией.
+    """
+    name = partition_name(table, month)
+    start, end = _month_bound(month), _month_bound(_add_months(month, 1))
+    default = f'{table}_default'
+
+    cursor.execute(
+        f'SELECT 1 FROM {default} WHERE {column} >= %s AND {column} < %s LIMIT 1',
+        [start, end],
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        return name
+
+    cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        [start, end],
+    )
+    cursor.execute(
+        f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+    logger.warning('Строки %s за %s перенесены из секции DEFAULT', table, f'{month:%Y-%m}')
+    return name
+
+
+def ensure_partitions(table, months_ahead=None, start_month=None):
+    """
+    Досоздать помесячные секции от start_month (или текущего месяца)
+    до текущего месяца + months_ahead. Возвращает имена созданных секций.
+    """
+    column = PARTITIONED_TABLES[table]
+    if months_ahead is None:
+        months_ahead = PARTITION_MONTHS_AHEAD
+    current = _month_start(timezone.localdate())
+    month = _month_start(start_month) if start_month else current
+    last = _add_months(current, months_ahead)
+
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(table, cursor):
+            return created
+        existing = {month for _, month in list_partitions(table, cursor) if month}
+        while month <= last:
+            if month not in existing:
+                created.append(_create_month_partition(cursor, table, column, month))
+            month = _add_months(month, 1)
+    return created
+
+
+def detach_partitions(table, before, archive=True):
+    """
+    Отсоединить секции месяцев строго раньше месяца `before`.
+
+    Секция становится обычной таблицей (данные не копируются); при archive=True
+    переносится в схему archive. Возвращает имена отсоединённых секций.
+    """
+    before = _month_start(before)
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(table, cursor):
+            return detached
+        if archive:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}')
+        for name, month in list_partitions(table, cursor):
+            if month is None or month >= before:
+                continue
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+            if archive:
+                cursor.execute(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}')
+            detached.append(name)
+    return detached
+
+
+# ─── Перестройка таблицы (миграции) ──────────────────────────
+
+def _capture_definitions(cursor, table):
+    """Определения индексов (кроме PK) и внешних ключей таблицы."""
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s) AND NOT i.indisprimary
+        """,
+        [table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype = 'f'
+        """,
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def _rebuild(cursor, table, partitioned):
+    column = PARTITIONED_TABLES[table]
+    legacy = f'{table}_unpartitioned'
+    indexes, foreign_keys = _capture_definitions(cursor, table)
+
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    if partitioned:
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({column})'
+        )
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        cursor.execute(f'SELECT MIN({column}) FROM {legacy}')
+        first = cursor.fetchone()[0]
+        current = _month_start(timezone.localdate())
+        month = _month_start(timezone.localtime(first)) if first else current
+        while month <= _add_months(current, PARTITION_MONTHS_AHEAD):
+            cursor.execute(
+                f'CREATE TABLE {partition_name(table, month)} PARTITION OF {table} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [_month_bound(month), _month_bound(_add_months(month, 1))],
+            )
+            month = _add_months(month, 1)
+        primary_key = f'(id, {column})'
+    else:
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        primary_key = '(id)'
+
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+    cursor.execute(f'DROP TABLE {legacy}')
+
+    cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY {primary_key}')
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    cursor.execute(f'ANALYZE {table}')
+
+
+def partition_table(apps, schema_editor, table):
+    """Перестроить обычную таблицу в помесячно секционированную (RunPython)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(table, cursor):
+            _rebuild(cursor, table, partitioned=True)
+
+
+def unpartition_table(apps, schema_editor, table):
+    """Обратная операция: собрать секции обратно в одну таблицу."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(table, cursor):
+            _rebuild(cursor, table, partitioned=False)
@@ -9,7 +9,10 @@ class OrganizationSerializer(serializers.ModelSerializer):
     """Базовый сериализатор (для владельцев/сотрудников тенанта)."""
     class Meta:
         model = Organization
-        fields = ['id', 'name', 'inn', 'phone', 'email', 'is_active', 'created_at']
+        fields = [
+            'id', 'name', 'inn', 'phone', 'email', 'is_active',
+            'auto_write_off_expired', 'auto_write_off_grace_days', 'created_at',
+        ]
         read_only_fields = ['id', 'is_active', 'created_at']
 
 
@@ -23,6 +26,7 @@ class OrganizationAdminSerializer(serializers.ModelSerializer):
             'id', 'name', 'inn', 'phone', 'email',
             'is_active', 'subscription_plan', 'monthly_price',
             'paid_until', 'max_users', 'notes',
+            'auto_write_off_expired', 'auto_write_off_grace_days',
             'users_count', 'created_at',
         ]
         read_only_fields = ['id', 'created_at']
@@ -0,0 +1,20 @@
+from celery import shared_task
+import logging
+
+from apps.core.partitioning import PARTITIONED_TABLES, ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def ensure_journal_partitions(months_ahead=None):
+    """
+    Заранее создать помесячные секции журналов (stock_movements, transactions),
+    чтобы новые строки не попадали в секцию DEFAULT.
+    """
+    created = []
+    for table in PARTITIONED_TABLES:
+        created += ensure_partitions(table, months_ahead=months_ahead)
+    if created:
+        logger.info('Созданы секции: %s', ', '.join(created))
+    return created
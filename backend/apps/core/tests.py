@@ -0,0 +1,186 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.models import Organization, TradingPoint, User, Warehouse
+from apps.core.pagination import JournalPagination
+from apps.core.partitioning import (
+    ARCHIVE_SCHEMA, PARTITION_MONTHS_AHEAD, PARTITIONED_TABLES, _add_months, _month_start,
+    detach_partitions, ensure_partitions, is_partitioned, list_partitions, partition_name,
+    partition_table, unpartition_table,
+)
+from apps.inventory.models import StockMovement
+from apps.nomenclature.models import Nomenclature
+
+URL = '/api/inventory/movements/'
+
+
+@mock.patch.object(JournalPagination, 'page_size', 3)
+class JournalCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name='Флора')
+        tp = TradingPoint.objects.create(organization=org, name='Точка')
+        warehouse = Warehouse.objects.create(organization=org, trading_point=tp, name='Склад')
+        tulip = Nomenclature.objects.create(organization=org, name='Тюльпан')
+        cls.user = User.objects.create(username='owner', organization=org, role='owner')
+
+        movements = StockMovement.objects.bulk_create([
+            StockMovement(
+                organization=org, nomenclature=tulip,
+                movement_type=StockMovement.MovementType.RECEIPT,
+                warehouse_to=warehouse, quantity=Decimal('1'), price=Decimal('10'),
+            )
+            for _ in range(11)
+        ])
+        # Часть строк с одинаковым created_at — порядок внутри решает id
+        now = timezone.now()
+        for i, movement in enumerate(movements):
+            movement.created_at = now - timedelta(minutes=i // 4)
+        StockMovement.objects.bulk_update(movements, ['created_at'])
+        cls.expected = [
+            str(pk) for pk in StockMovement.objects.order_by('-created_at', '-id').values_list('pk', flat=True)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_walk_the_journal_without_gaps_or_duplicates(self):
+        seen = []
+        url = f'{URL}?pagination=cursor'
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data['previous'])
+            self.assertNotIn('count', response.data)
+            seen += [str(row['id']) for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(seen, self.expected)
+
+    def test_next_link_carries_the_cursor_only(self):
+        response = self.client.get(URL, {'pagination': 'cursor'})
+
+        self.assertIn('cursor=', response.data['next'])
+        self.assertNotIn('pagination=', response.data['next'])
+
+    def test_malformed_cursor_is_not_found(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for cursor in [
+            '!!!',
+            'a',
+            token([1]),
+            token(['2026-01-01T00:00:00+00:00', 'not-a-uuid']),
+            token(['2026-01-01T00:00:00+00:00', 5]),
+            token(['not-a-date', self.expected[0]]),
+        ]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(URL, {'cursor': cursor}).status_code, 404)
+
+
+@mock.patch.dict(PARTITIONED_TABLES, {'partition_probe': 'created_at'})
+class PartitioningTests(TestCase):
+    """Полный цикл на маленькой таблице: секционировать → досоздать/отсоединить → собрать обратно."""
+
+    table = 'partition_probe'
+
+    def setUp(self):
+        self.org = Organization.objects.create(name='Флора')
+        self.schema_editor = SimpleNamespace(connection=connection)
+        self.current = _month_start(timezone.localdate())
+        self.old = _month_start(timezone.localdate() - timedelta(days=100))
+        self.execute(f"""
+            CREATE TABLE {self.table} (
+                id uuid NOT NULL PRIMARY KEY,
+                created_at timestamptz NOT NULL,
+                organization_id uuid NOT NULL REFERENCES organizations (id),
+                note varchar(50) NOT NULL DEFAULT ''
+            )
+        """)
+        self.execute(f'CREATE INDEX partition_probe_org_created ON {self.table} (organization_id, created_at)')
+        now = timezone.now()
+        for created_at in (now - timedelta(days=100), now):
+            self.insert(created_at)
+
+    def execute(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def insert(self, created_at):
+        self.execute(
+            f'INSERT INTO {self.table} (id, created_at, organization_id) VALUES (%s, %s, %s)',
+            [uuid.uuid4(), created_at, self.org.pk],
+        )
+
+    def count(self, table=None):
+        return self.execute(f'SELECT COUNT(*) FROM {table or self.table}')[0][0]
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            return dict(list_partitions(self.table, cursor))
+
+    def indexes(self):
+        return {name for (name,) in self.execute(
+            'SELECT indexname FROM pg_indexes WHERE tablename = %s', [self.table],
+        )}
+
+    def primary_key(self):
+        return self.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+            [self.table],
+        )[0][0]
+
+    def test_round_trip(self):
+        partition_table(None, self.schema_editor, self.table)
+
+        self.assertTrue(is_partitioned(self.table))
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(f'{self.table}_default'), 0)
+        partitions = self.partitions()
+        self.assertIsNone(partitions[f'{self.table}_default'])
+        months = {month for month in partitions.values() if month}
+        self.assertEqual(min(months), self.old)
+        self.assertEqual(max(months), _add_months(self.current, PARTITION_MONTHS_AHEAD))
+        self.assertIn('partition_probe_org_created', self.indexes())
+        self.assertEqual(self.primary_key(), 'PRIMARY KEY (id, created_at)')
+
+        # Строка за пределами готовых месяцев попадает в DEFAULT и переезжает в новую секцию
+        far = _add_months(self.current, PARTITION_MONTHS_AHEAD + 2)
+        self.insert(timezone.make_aware(datetime(far.year, far.month, 15)))
+        self.assertEqual(self.count(f'{self.table}_default'), 1)
+
+        created = ensure_partitions(self.table, months_ahead=PARTITION_MONTHS_AHEAD + 2)
+
+        self.assertEqual(created[-1], partition_name(self.table, far))
+        self.assertEqual(self.count(f'{self.table}_default'), 0)
+        self.assertEqual(self.count(partition_name(self.table, far)), 1)
+
+        detached = detach_partitions(self.table, self.current)
+
+        self.assertIn(partition_name(self.table, self.old), detached)
+        self.assertGreaterEqual(min(month for month in self.partitions().values() if month), self.current)
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(f'{ARCHIVE_SCHEMA}.{partition_name(self.table, self.old)}'), 1)
+
+        unpartition_table(None, self.schema_editor, self.table)
+
+        self.assertFalse(is_partitioned(self.table))
+        self.assertEqual(self.count(), 2)
+        self.assertIn('partition_probe_org_created', self.indexes())
+        self.assertEqual(self.primary_key(), 'PRIMARY KEY (id)')
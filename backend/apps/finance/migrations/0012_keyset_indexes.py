@@ -0,0 +1,25 @@
+"""Extend (..., -created_at) journal indexes with -id to back keyset (cursor) pagination."""
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('finance', '0011_alter_debt_options_alter_transactioncategory_options_and_more'),
+        ('sales', '0011_saleitem_reserve_saleitem_source_mode_salescategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='idx_txn_org_dt',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='idx_txn_org_dt_id'),
+        ),
+    ]
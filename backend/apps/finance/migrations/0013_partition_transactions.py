@@ -0,0 +1,27 @@
+"""
+Monthly range partitioning of transactions by created_at.
+
+The table is rebuilt under an exclusive lock: rows are copied into a
+partitioned parent (one partition per month plus DEFAULT), then indexes and
+foreign keys are recreated. Plan for downtime proportional to table size.
+"""
+
+from functools import partial
+
+from django.db import migrations
+
+from apps.core.partitioning import partition_table, unpartition_table
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            partial(partition_table, table='transactions'),
+            partial(unpartition_table, table='transactions'),
+        ),
+    ]
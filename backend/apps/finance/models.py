@@ -142,7 +142,7 @@ class Transaction(models.Model):
         verbose_name_plural = 'Транзакции'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['organization', '-created_at'], name='idx_txn_org_dt'),
+            models.Index(fields=['organization', '-created_at', '-id'], name='idx_txn_org_dt_id'),
             models.Index(fields=['wallet_from', '-created_at'], name='idx_txn_wfrom_dt'),
             models.Index(fields=['wallet_to', '-created_at'], name='idx_txn_wto_dt'),
             models.Index(fields=['transaction_type'], name='idx_txn_type'),
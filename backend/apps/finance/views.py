@@ -23,6 +23,7 @@ from apps.core.mixins import (
     OrgPerformCreateMixin, _tenant_filter, _resolve_org,
     IsOwnerOrAdmin, ReadOnlyOrManager,
 )
+from apps.core.pagination import JournalPagination
 
 
 class WalletViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
@@ -64,6 +65,7 @@ class TransactionCategoryViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
 class TransactionViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     queryset = Transaction.objects.all()
+    pagination_class = JournalPagination
     permission_classes = [ReadOnlyOrManager]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['transaction_type', 'wallet_from', 'wallet_to', 'category']
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Batch, StockBalance, StockMovement, InventoryDocument, InventoryItem, Reserve
+from .models import (
+    Batch, StockBalance, StockMovement, StockSnapshot, ExpiryAlert, InventoryDocument, InventoryItem, Reserve,
+    ArchivedBatch, TransferDocument, TransferDocumentItem,
+)
 
 
 @admin.register(Batch)
@@ -8,12 +11,37 @@ class BatchAdmin(admin.ModelAdmin):
     list_filter = ('organization', 'warehouse', 'arrival_date')
     readonly_fields = ('remaining',)
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            from .batches import apply_default_expiry
+            apply_default_expiry([obj])
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ArchivedBatch)
+class ArchivedBatchAdmin(admin.ModelAdmin):
+    list_display = ('nomenclature', 'quantity', 'arrival_date', 'warehouse', 'archived_at', 'organization')
+    list_filter = ('organization', 'arrival_date')
+
 
 @admin.register(StockBalance)
 class StockBalanceAdmin(admin.ModelAdmin):
-    list_display = ('nomenclature', 'warehouse', 'quantity', 'avg_purchase_price', 'organization')
+    list_display = ('nomenclature', 'warehouse', 'quantity', 'avg_purchase_price', 'total_cost', 'organization')
     list_filter = ('organization', 'warehouse')
-    readonly_fields = ('quantity', 'avg_purchase_price')
+    readonly_fields = ('quantity', 'avg_purchase_price', 'total_cost')
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('snapshot_date', 'nomenclature', 'warehouse', 'quantity', 'total_cost', 'organization')
+    list_filter = ('organization', 'snapshot_date', 'warehouse')
+    readonly_fields = ('snapshot_date', 'taken_at', 'quantity', 'total_cost')
+
+
+@admin.register(ExpiryAlert)
+class ExpiryAlertAdmin(admin.ModelAdmin):
+    list_display = ('nomenclature', 'warehouse', 'expiry_date', 'quantity', 'total_cost', 'organization')
+    list_filter = ('organization', 'trading_point', 'expiry_date')
 
 
 @admin.register(StockMovement)
@@ -33,6 +61,19 @@ class InventoryDocumentAdmin(admin.ModelAdmin):
     inlines = [InventoryItemInline]
 
 
+class TransferDocumentItemInline(admin.TabularInline):
+    model = TransferDocumentItem
+    extra = 0
+    readonly_fields = ('batch', 'total')
+
+
+@admin.register(TransferDocument)
+class TransferDocumentAdmin(admin.ModelAdmin):
+    list_display = ('number', 'date', 'warehouse_from', 'status', 'total_cost', 'organization')
+    list_filter = ('organization', 'status', 'date')
+    inlines = [TransferDocumentItemInline]
+
+
 @admin.register(Reserve)
 class ReserveAdmin(admin.ModelAdmin):
     list_display = ('reserve_number', 'bouquet_nomenclature', 'warehouse', 'quantity', 'status')
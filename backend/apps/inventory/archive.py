@@ -0,0 +1,159 @@
+"""
+Холодный архив истощённых партий.
+
+Партии с remaining = 0, по которым давно не было движений, переносятся
+из batches в batches_archive вместе со снимками состава букетов — горячая
+таблица и её индексы (в том числе FIFO) содержат только «живую» историю.
+
+Перенос идёт порциями: каждая порция — одна транзакция с
+WITH moved AS (DELETE ... RETURNING *) INSERT INTO <архив>, строки
+блокируются и перепроверяются (remaining = 0) перед переносом.
+
+StockMovement, SaleItem, ReceiptDocumentItem, Reserve и Claim ссылаются
+на партию без FK в БД, поэтому их batch_id остаётся валидным. Для чтения
+используются get_batch / get_batches / batch_values — они ищут в обеих
+таблицах. Если архивная партия снова нужна для учёта (возврат продажи),
+get_batch_for_update возвращает её в batches.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import (
+    ArchivedBatch, ArchivedBouquetBatchComponentSnapshot, Batch,
+    BouquetBatchComponentSnapshot, Reserve, StockMovement,
+)
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields if field.column != 'archived_at']
+
+
+def _move_rows(cursor, source, target, key_column, ids, archived_at=None):
+    """Перенести строки source → target (одинаковые колонки) одним запросом."""
+    columns = ', '.join(_columns(source))
+    params = [ids]
+    target_columns, select_columns = columns, columns
+    if archived_at is not None:
+        target_columns += ', archived_at'
+        select_columns += ', %s'
+        params.append(archived_at)
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {source._meta.db_table}
+            WHERE {key_column} = ANY(%s::uuid[])
+            RETURNING {columns}
+        )
+        INSERT INTO {target._meta.db_table} ({target_columns})
+        SELECT {select_columns} FROM moved
+        """,
+        params,
+    )
+    return cursor.rowcount
+
+
+def depleted_batches(cutoff, organization=None):
+    """Партии с нулевым остатком и резервом, без движений и активных резервов после cutoff."""
+    recent_movements = StockMovement.objects.filter(batch_id=OuterRef('pk'), created_at__gte=cutoff)
+    active_reserves = Reserve.objects.filter(batch_id=OuterRef('pk'), status=Reserve.Status.ACTIVE)
+    batches = Batch.objects.filter(remaining=0, reserved_qty=0, created_at__lt=cutoff).exclude(
+        Exists(recent_movements),
+    ).exclude(Exists(active_reserves))
+    if organization is not None:
+        batches = batches.filter(organization=organization)
+    return batches
+
+
+@transaction.atomic
+def _archive_chunk(batch_ids):
+    # Повторная проверка под блокировкой: возврат мог вернуть остаток в партию
+    ids = [
+        str(pk) for pk in Batch.objects.select_for_update(skip_locked=True).filter(
+            pk__in=batch_ids, remaining=0, reserved_qty=0,
+        ).values_list('pk', flat=True)
+    ]
+    if not ids:
+        return 0
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        moved = _move_rows(cursor, Batch, ArchivedBatch, 'id', ids, archived_at=now)
+        _move_rows(
+            cursor, BouquetBatchComponentSnapshot, ArchivedBouquetBatchComponentSnapshot, 'batch_id', ids,
+        )
+    return moved
+
+
+def archive_depleted_batches(older_than_days=None, organization=None, chunk_size=1000):
+    """
+    Перенести в архив партии, истощённые более older_than_days дней назад
+    (по умолчанию settings.BATCH_ARCHIVE_AFTER_DAYS). Возвращает число партий.
+    """
+    if older_than_days is None:
+        older_than_days = settings.BATCH_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    total, last_id = 0, None
+    while True:
+        candidates = depleted_batches(cutoff, organization).order_by('pk')
+        if last_id is not None:
+            candidates = candidates.filter(pk__gt=last_id)
+        ids = list(candidates.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        last_id = ids[-1]
+        total += _archive_chunk(ids)
+
+
+# ─── Чтение через обе таблицы ────────────────────────────────
+
+def get_batches(batch_ids):
+    """{id: Batch | ArchivedBatch} — партии из горячей таблицы и архива."""
+    batch_ids = {pk for pk in batch_ids if pk}
+    found = {batch.pk: batch for batch in Batch.objects.filter(pk__in=batch_ids)}
+    missing = batch_ids - set(found)
+    if missing:
+        found.update((batch.pk, batch) for batch in ArchivedBatch.objects.filter(pk__in=missing))
+    return found
+
+
+def get_batch(batch_id):
+    """Партия по id из горячей таблицы или архива (None, если нет нигде)."""
+    if not batch_id:
+        return None
+    return (
+        Batch.objects.filter(pk=batch_id).first()
+        or ArchivedBatch.objects.filter(pk=batch_id).first()
+    )
+
+
+def batch_values(*fields, **filters):
+    """
+    values() по партиям из обеих таблиц (UNION ALL) для отчётов.
+    Поля и фильтры — общие для Batch и ArchivedBatch.
+    """
+    return Batch.objects.filter(**filters).values(*fields).union(
+        ArchivedBatch.objects.filter(**filters).values(*fields), all=True,
+    )
+
+
+def get_batch_for_update(batch_id):
+    """
+    Партия под блокировкой для изменения остатка. Архивная партия
+    (со снимками состава) сначала возвращается в batches.
+    """
+    batch = Batch.objects.select_for_update().filter(pk=batch_id).first()
+    if batch is not None or not batch_id:
+        return batch
+    if not ArchivedBatch.objects.select_for_update().filter(pk=batch_id).exists():
+        return None
+    with connection.cursor() as cursor:
+        _move_rows(
+            cursor, ArchivedBouquetBatchComponentSnapshot, BouquetBatchComponentSnapshot,
+            'batch_id', [str(batch_id)],
+        )
+        _move_rows(cursor, ArchivedBatch, Batch, 'id', [str(batch_id)])
+    return Batch.objects.select_for_update().get(pk=batch_id)
@@ -0,0 +1,72 @@
+"""
+Создание партий со сроком годности по умолчанию.
+
+Партия без явного срока годности получает arrival_date + default_shelf_life_days
+своей номенклатуры. Срок проставляется при создании партии: сроки берутся
+из словаря {nomenclature_id: дней}, собранного заранее (shelf_life_map) — из
+уже загруженных объектов номенклатуры или одним запросом по id. Batch.save
+номенклатуру не читает, поэтому сохранения остатка партии в FIFO
+(save(update_fields=['remaining'])) не делают лишних запросов, а bulk_create
+получает те же сроки, что и одиночное создание.
+"""
+from datetime import timedelta
+
+from .models import Batch
+
+_nomenclature_field = Batch._meta.get_field('nomenclature')
+
+
+def shelf_life_map(nomenclatures):
+    """
+    {nomenclature_id: default_shelf_life_days} по объектам Nomenclature и/или их id.
+    Объекты читаются как есть, по id — один запрос на всех.
+    """
+    from apps.nomenclature.models import Nomenclature
+
+    shelf_life = {}
+    missing = set()
+    for nomenclature in nomenclatures:
+        if isinstance(nomenclature, Nomenclature):
+            shelf_life[nomenclature.pk] = nomenclature.default_shelf_life_days
+        else:
+            missing.add(nomenclature)
+    missing.difference_update(shelf_life)
+    if missing:
+        shelf_life.update(
+            Nomenclature.objects.filter(pk__in=missing).values_list('pk', 'default_shelf_life_days')
+        )
+    return shelf_life
+
+
+def apply_default_expiry(batches, shelf_life=None):
+    """
+    Проставить срок годности по умолчанию партиям без него.
+    Без shelf_life словарь собирается по номенклатурам партий (загруженным или по id).
+    """
+    pending = [batch for batch in batches if not batch.expiry_date]
+    if not pending:
+        return batches
+    if shelf_life is None:
+        shelf_life = shelf_life_map(
+            batch.nomenclature if _nomenclature_field.is_cached(batch) else batch.nomenclature_id
+            for batch in pending
+        )
+    for batch in pending:
+        days = shelf_life.get(batch.nomenclature_id)
+        if days:
+            batch.expiry_date = batch.arrival_date + timedelta(days=days)
+    return batches
+
+
+def bulk_create_batches(batches, shelf_life=None):
+    """bulk_create партий со сроком годности по умолчанию; возвращает те же объекты."""
+    Batch.objects.bulk_create(apply_default_expiry(batches, shelf_life))
+    return batches
+
+
+def create_batch(shelf_life=None, **fields):
+    """Создать одну партию (как Batch.objects.create) со сроком годности по умолчанию."""
+    batch = Batch(**fields)
+    apply_default_expiry([batch], shelf_life)
+    batch.save(force_insert=True)
+    return batch
@@ -0,0 +1,108 @@
+"""
+Сколько букетов по каждому шаблону можно собрать из остатков точки прямо сейчас.
+
+Считается одним SQL-запросом по всем шаблонам организации: свободный остаток
+(quantity − reserved_qty по складам точки) каждого обязательного компонента
+делится на его расход в шаблоне, минимум по компонентам — сколько букетов
+можно собрать, компонент с минимумом — лимитирующий. Необязательные
+компоненты и замены не ограничивают сборку.
+
+Результат кэшируется на пару (организация, торговая точка) под версией
+остатков точки (summary_cache.stock_summary_version): любое изменение остатка
+или справочников делает старую матрицу недостижимой.
+"""
+import json
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+
+from .summary_cache import ALL_SCOPE, STOCK_SUMMARY_TTL, stock_summary_version
+
+logger = logging.getLogger(__name__)
+
+_BUILDABLE_SQL = """
+    WITH stock AS (
+        SELECT sb.nomenclature_id, SUM(sb.quantity - sb.reserved_qty) AS available
+        FROM stock_balances sb
+        JOIN warehouses w ON w.id = sb.warehouse_id
+        WHERE sb.organization_id = %(organization)s
+          AND (%(trading_point)s::uuid IS NULL OR w.trading_point_id = %(trading_point)s::uuid)
+        GROUP BY sb.nomenclature_id
+    ),
+    components AS (
+        SELECT c.template_id, c.nomenclature_id, SUM(c.quantity) AS per_bouquet
+        FROM bouquet_components c
+        JOIN bouquet_templates t ON t.id = c.template_id
+        JOIN nomenclatures n ON n.id = t.nomenclature_id
+        WHERE n.organization_id = %(organization)s
+          AND n.is_active
+          AND c.is_required
+        GROUP BY c.template_id, c.nomenclature_id
+        HAVING SUM(c.quantity) > 0
+    ),
+    per_component AS (
+        SELECT c.template_id, c.nomenclature_id, c.per_bouquet,
+               GREATEST(COALESCE(s.available, 0), 0) AS available,
+               FLOOR(GREATEST(COALESCE(s.available, 0), 0) / c.per_bouquet) AS buildable
+        FROM components c
+        LEFT JOIN stock s ON s.nomenclature_id = c.nomenclature_id
+    )
+    SELECT DISTINCT ON (pc.template_id)
+           pc.template_id, t.nomenclature_id, n.name, pc.buildable,
+           pc.nomenclature_id, cn.name, pc.per_bouquet, pc.available
+    FROM per_component pc
+    JOIN bouquet_templates t ON t.id = pc.template_id
+    JOIN nomenclatures n ON n.id = t.nomenclature_id
+    JOIN nomenclatures cn ON cn.id = pc.nomenclature_id
+    ORDER BY pc.template_id, pc.buildable, pc.available / pc.per_bouquet, cn.name
+"""
+
+
+def build_buildable_matrix(organization_id, trading_point_id=None):
+    """
+    [{template, nomenclature, name, buildable, limiting_component: {...}}, ...]
+    по всем активным шаблонам с обязательными компонентами, по названию.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_BUILDABLE_SQL, {
+            'organization': str(organization_id),
+            'trading_point': str(trading_point_id) if trading_point_id else None,
+        })
+        rows = cursor.fetchall()
+
+    result = [
+        {
+            'template': str(template_id),
+            'nomenclature': str(nomenclature_id),
+            'name': name,
+            'buildable': int(buildable),
+            'limiting_component': {
+                'nomenclature': str(component_id),
+                'name': component_name,
+                'per_bouquet': str(per_bouquet),
+                'available': str(available),
+            },
+        }
+        for (template_id, nomenclature_id, name, buildable,
+             component_id, component_name, per_bouquet, available) in rows
+    ]
+    result.sort(key=lambda row: row['name'])
+    return result
+
+
+def get_buildable_matrix(organization_id, trading_point_id=None):
+    """Матрица из кэша по версии остатков точки; при промахе — build_buildable_matrix."""
+    try:
+        version = stock_summary_version(organization_id, trading_point_id)
+    except Exception:
+        logger.exception('Кэш матрицы сборки недоступен, ответ из БД')
+        return build_buildable_matrix(organization_id, trading_point_id)
+
+    key = f'buildable:{organization_id}:{trading_point_id or ALL_SCOPE}:{version}'
+    payload = cache.get(key)
+    if payload is None:
+        matrix = build_buildable_matrix(organization_id, trading_point_id)
+        cache.set(key, json.dumps(matrix, ensure_ascii=False), timeout=STOCK_SUMMARY_TTL)
+        return matrix
+    return json.loads(payload)
@@ -0,0 +1,123 @@
+"""
+Автосписание просроченных партий.
+
+Включается политикой организации (Organization.auto_write_off_expired):
+живые партии, у которых срок годности истёк более auto_write_off_grace_days
+дней назад, списываются с причиной «Срок годности» — иначе FIFO первыми
+продаёт и кладёт в букеты именно их.
+
+Партии находятся по частичному индексу idx_batch_expiry_live и списываются
+порциями: каждая порция — одна транзакция с блокировкой пар склад +
+номенклатура, одним UPDATE остатков партий, bulk_create движений и пакетным
+upsert остатков через журнал (stock_ledger). Партии под активным резервом
+(reserved_qty > 0) не трогаются — их решает продавец.
+
+Результат — сводка по складам: партий, количество и себестоимость списанного.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ledger import record_movements, stock_ledger
+from .locks import lock_stock, retry_on_conflict
+from .models import Batch, StockMovement
+
+AUTO_WRITE_OFF_NOTES = 'Автосписание: истёк срок годности'
+
+
+def expired_batches(organization_id, cutoff):
+    """Живые партии организации со сроком годности раньше cutoff и без резерва."""
+    return Batch.objects.filter(
+        organization_id=organization_id,
+        remaining__gt=0,
+        expiry_date__isnull=False,
+        expiry_date__lt=cutoff,
+        reserved_qty=0,
+    )
+
+
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def _write_off_chunk(organization, batch_ids, cutoff):
+    """Списать порцию партий; возвращает {warehouse_id: {...}} по списанному."""
+    from .services import _update_stock_balance
+
+    candidates = Batch.objects.filter(pk__in=batch_ids)
+    lock_stock(candidates.values_list('warehouse_id', 'nomenclature_id'))
+    # Повторная проверка под блокировкой: партию могли продать или зарезервировать.
+    # Порядок строк — как у fifo_write_off_many (склад → номенклатура → FIFO).
+    batches = list(
+        expired_batches(organization.pk, cutoff).filter(pk__in=batch_ids)
+        .select_for_update(of=('self',))
+        .select_related('warehouse', 'nomenclature')
+        .order_by('warehouse_id', 'nomenclature_id', 'arrival_date', 'created_at', 'id')
+    )
+    if not batches:
+        return {}
+    Batch.objects.filter(pk__in=[batch.pk for batch in batches]).update(remaining=0)
+
+    movements = []
+    balances = {}
+    report = {}
+    for batch in batches:
+        cost = batch.remaining * batch.purchase_price
+        movements.append(StockMovement(
+            organization=organization,
+            nomenclature=batch.nomenclature,
+            movement_type=StockMovement.MovementType.WRITE_OFF,
+            warehouse_from=batch.warehouse,
+            batch=batch,
+            quantity=batch.remaining,
+            price=batch.purchase_price,
+            write_off_reason=StockMovement.WriteOffReason.EXPIRED,
+            notes=AUTO_WRITE_OFF_NOTES,
+        ))
+        key = (batch.warehouse_id, batch.nomenclature_id)
+        if key not in balances:
+            balances[key] = [batch.warehouse, batch.nomenclature, Decimal('0'), Decimal('0')]
+        balances[key][2] += batch.remaining
+        balances[key][3] += cost
+
+        row = report.setdefault(batch.warehouse_id, {
+            'warehouse': batch.warehouse.name,
+            'batches': 0, 'quantity': Decimal('0'), 'total_cost': Decimal('0'),
+        })
+        row['batches'] += 1
+        row['quantity'] += batch.remaining
+        row['total_cost'] += cost
+
+    record_movements(movements)
+    for warehouse, nomenclature, qty, cost in balances.values():
+        _update_stock_balance(organization, warehouse, nomenclature, -qty, -cost)
+    return report
+
+
+def write_off_expired_batches(organization, grace_days=None, chunk_size=500):
+    """
+    Списать просроченные партии организации порциями по chunk_size.
+    Возвращает сводку {warehouse_id: {'warehouse', 'batches', 'quantity', 'total_cost'}}.
+    """
+    if grace_days is None:
+        grace_days = organization.auto_write_off_grace_days
+    cutoff = timezone.localdate() - timedelta(days=grace_days)
+
+    summary = defaultdict(lambda: {'warehouse': '', 'batches': 0, 'quantity': Decimal('0'), 'total_cost': Decimal('0')})
+    last_id = None
+    while True:
+        candidates = expired_batches(organization.pk, cutoff).order_by('pk')
+        if last_id is not None:
+            candidates = candidates.filter(pk__gt=last_id)
+        ids = list(candidates.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return dict(summary)
+        last_id = ids[-1]
+        for warehouse_id, row in _write_off_chunk(organization, ids, cutoff).items():
+            total = summary[warehouse_id]
+            total['warehouse'] = row['warehouse']
+            total['batches'] += row['batches']
+            total['quantity'] += row['quantity']
+            total['total_cost'] += row['total_cost']
@@ -0,0 +1,201 @@
+"""
+Складской журнал транзакции (unit of work).
+
+Внутри `stock_ledger()` сервисы склада не пишут движения и остатки построчно,
+а накапливают их в журнале:
+- StockMovement — сбрасываются одним bulk_create;
+- изменения StockBalance — сворачиваются по паре склад + номенклатура и
+  сбрасываются пакетно (apply_stock_balance_deltas): вставка недостающих
+  строк, блокировка и один UPDATE ... FROM unnest на все пары.
+
+Сброс выполняется при выходе из блока, внутри той же транзакции, в порядке
+(организация, склад, номенклатура) — блокировки строк остатков берутся
+только на время финального upsert и всегда в одном порядке.
+
+Использование:
+
+    with stock_ledger():
+        ...  # fifo_write_off / _update_stock_balance / record_movements
+
+    @stock_ledger()
+    def some_service(...): ...
+
+Вложенные блоки присоединяются к внешнему журналу. При исключении журнал
+отбрасывается вместе с откатом транзакции.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+from asgiref.local import Local
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import StockBalance, StockMovement
+from .locks import lock_stock
+from .read_model import mark_stock_read_model_dirty
+from .stock_alerts import mark_stock_alerts_dirty
+from .summary_cache import mark_stock_summary_dirty
+
+_state = Local()
+
+
+def get_active_ledger():
+    """Текущий журнал транзакции или None."""
+    return getattr(_state, 'ledger', None)
+
+
+class StockLedger:
+    """Буфер движений и дельт остатков в рамках одной транзакции."""
+
+    def __init__(self):
+        self.movements = []
+        # (organization_id, warehouse_id, nomenclature_id) -> {'quantity', 'cost', 'recompute'}
+        self.balance_deltas = {}
+
+    def add_movements(self, movements):
+        self.movements.extend(movements)
+
+    def add_balance_delta(self, organization, warehouse, nomenclature, qty_delta, cost_delta=None):
+        key = (organization.pk, warehouse.pk, nomenclature.pk)
+        delta = self.balance_deltas.setdefault(
+            key, {'quantity': Decimal('0'), 'cost': Decimal('0'), 'recompute': False},
+        )
+        delta['quantity'] += Decimal(str(qty_delta))
+        if cost_delta is None:
+            delta['recompute'] = True
+        else:
+            delta['cost'] += Decimal(str(cost_delta))
+
+    def flush(self):
+        if self.movements:
+            StockMovement.objects.bulk_create(self.movements)
+            self.movements = []
+
+        rows = [
+            (*key, delta['quantity'], delta['cost'])
+            for key, delta in self.balance_deltas.items()
+        ]
+        recompute = [key for key, delta in self.balance_deltas.items() if delta['recompute']]
+        self.balance_deltas = {}
+        apply_stock_balance_deltas(rows)
+
+        for organization_id, warehouse_id, nomenclature_id in recompute:
+            _recompute_stock_balance_cost(organization_id, warehouse_id, nomenclature_id)
+        if recompute:
+            mark_stock_read_model_dirty((key[1], key[2]) for key in recompute)
+
+
+def apply_stock_balance_deltas(rows):
+    """
+    Применить дельты остатков набором из трёх запросов, независимо от числа строк:
+    1) INSERT ... ON CONFLICT DO NOTHING — недостающие строки остатков;
+    2) SELECT ... FOR UPDATE в порядке (организация, склад, номенклатура);
+    3) один UPDATE ... FROM unnest(...) с дельтами количества и стоимости.
+
+    rows = [(organization_id, warehouse_id, nomenclature_id, qty_delta, cost_delta), ...]
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(str(part) for part in row[:3]))
+    organization_ids = [str(row[0]) for row in rows]
+    warehouse_ids = [str(row[1]) for row in rows]
+    nomenclature_ids = [str(row[2]) for row in rows]
+    table = StockBalance._meta.db_table
+
+    lock_stock(zip(warehouse_ids, nomenclature_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                id, organization_id, warehouse_id, nomenclature_id,
+                quantity, avg_purchase_price, total_cost, reserved_qty, updated_at
+            )
+            SELECT gen_random_uuid(), k.organization_id, k.warehouse_id, k.nomenclature_id,
+                   0, 0, 0, 0, %s
+            FROM unnest(%s::uuid[], %s::uuid[], %s::uuid[])
+                WITH ORDINALITY AS k(organization_id, warehouse_id, nomenclature_id, pos)
+            ORDER BY k.pos
+            ON CONFLICT (organization_id, warehouse_id, nomenclature_id) DO NOTHING
+            """,
+            [timezone.now(), organization_ids, warehouse_ids, nomenclature_ids],
+        )
+        cursor.execute(
+            f"""
+            SELECT sb.id FROM {table} sb
+            JOIN unnest(%s::uuid[], %s::uuid[], %s::uuid[])
+                AS k(organization_id, warehouse_id, nomenclature_id)
+              ON sb.organization_id = k.organization_id
+             AND sb.warehouse_id = k.warehouse_id
+             AND sb.nomenclature_id = k.nomenclature_id
+            ORDER BY sb.organization_id, sb.warehouse_id, sb.nomenclature_id
+            FOR UPDATE OF sb
+            """,
+            [organization_ids, warehouse_ids, nomenclature_ids],
+        )
+        cursor.execute(
+            f"""
+            UPDATE {table} AS sb SET
+                quantity = sb.quantity + d.qty,
+                total_cost = GREATEST(sb.total_cost + d.cost, 0),
+                avg_purchase_price = CASE
+                    WHEN sb.quantity + d.qty > 0 AND sb.total_cost + d.cost > 0
+                    THEN (sb.total_cost + d.cost) / (sb.quantity + d.qty)
+                    ELSE sb.avg_purchase_price
+                END,
+                updated_at = %s
+            FROM unnest(%s::uuid[], %s::uuid[], %s::uuid[], %s::numeric[], %s::numeric[])
+                AS d(organization_id, warehouse_id, nomenclature_id, qty, cost)
+            WHERE sb.organization_id = d.organization_id
+              AND sb.warehouse_id = d.warehouse_id
+              AND sb.nomenclature_id = d.nomenclature_id
+            """,
+            [
+                timezone.now(), organization_ids, warehouse_ids, nomenclature_ids,
+                [row[3] for row in rows], [row[4] for row in rows],
+            ],
+        )
+    mark_stock_read_model_dirty(zip(warehouse_ids, nomenclature_ids))
+    keys = list(zip(organization_ids, warehouse_ids, nomenclature_ids))
+    mark_stock_alerts_dirty(keys)
+    mark_stock_summary_dirty(keys)
+
+
+def _recompute_stock_balance_cost(organization_id, warehouse_id, nomenclature_id):
+    """Пересчёт стоимости по партиям для дельт без cost_delta."""
+    from .services import _batches_cost_aggregate
+
+    sb = StockBalance.objects.select_for_update().get(
+        organization_id=organization_id,
+        warehouse_id=warehouse_id,
+        nomenclature_id=nomenclature_id,
+    )
+    _, sb.total_cost = _batches_cost_aggregate(organization_id, warehouse_id, nomenclature_id)
+    if sb.quantity > 0 and sb.total_cost > 0:
+        sb.avg_purchase_price = sb.total_cost / sb.quantity
+    sb.save(update_fields=['total_cost', 'avg_purchase_price', 'updated_at'])
+
+
+def record_movements(movements):
+    """Записать движения: в журнал транзакции, если он открыт, иначе сразу bulk_create."""
+    ledger = get_active_ledger()
+    if ledger is not None:
+        ledger.add_movements(movements)
+    elif movements:
+        StockMovement.objects.bulk_create(movements)
+
+
+@contextmanager
+def stock_ledger():
+    """Открыть складской журнал на время блока (или присоединиться к открытому)."""
+    if get_active_ledger() is not None:
+        yield get_active_ledger()
+        return
+
+    ledger = StockLedger()
+    _state.ledger = ledger
+    try:
+        with transaction.atomic():
+            yield ledger
+            ledger.flush()
+    finally:
+        _state.ledger = None
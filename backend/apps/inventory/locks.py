@@ -0,0 +1,100 @@
+"""
+Порядок блокировок складских операций и повтор транзакции при конфликте.
+
+Каждая операция, меняющая остатки, до блокировки строк Batch / StockBalance
+берёт advisory-блокировки транзакции (pg_advisory_xact_lock) на все свои пары
+склад + номенклатура — одним запросом, в порядке (склад, номенклатура).
+Два чека с одинаковыми позициями в разном порядке корзины встают в очередь
+на первой общей паре и не блокируют друг друга взаимно.
+
+Общий порядок блокировок для всех операций: advisory-блокировки пар →
+строки номенклатуры (Nomenclature, например обновление закупочной цены) →
+партии (Batch) → остатки (StockBalance). Строки номенклатуры до lock_stock
+не блокируются.
+
+Блокировки реентерабельны: вложенные вызовы (fifo_write_off_many,
+_update_stock_balance) повторно берут уже удерживаемые пары без ожидания.
+Освобождаются они при завершении транзакции.
+
+Если взаимная блокировка всё же случилась (пары стали известны не сразу,
+сторонние блокировки) или PostgreSQL отклонил транзакцию при сериализации,
+retry_on_conflict повторяет её целиком с небольшой случайной паузой.
+"""
+import functools
+import hashlib
+import logging
+import random
+import time
+
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+# deadlock_detected, serialization_failure
+DB_CONFLICT_CODES = {'40P01', '40001'}
+DB_CONFLICT_ATTEMPTS = 3
+# Базовая пауза перед повтором, сек (удваивается с каждой попыткой, плюс случайный разброс)
+DB_CONFLICT_BACKOFF = 0.05
+
+
+def _pk(value):
+    return str(getattr(value, 'pk', value))
+
+
+def _advisory_key(warehouse_id, nomenclature_id):
+    digest = hashlib.blake2b(f'stock:{warehouse_id}:{nomenclature_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def lock_stock(keys):
+    """
+    Взять блокировки транзакции на пары (склад, номенклатура) в порядке сортировки.
+    Склад и номенклатура — объекты или их id. Вызывать внутри транзакции.
+    """
+    keys = sorted({(_pk(warehouse), _pk(nomenclature)) for warehouse, nomenclature in keys})
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        # unnest отдаёт элементы в порядке массива — блокировки берутся по порядку
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(k) FROM unnest(%s::bigint[]) AS k',
+            [[_advisory_key(*key) for key in keys]],
+        )
+
+
+def is_db_conflict(exc):
+    """Ошибка БД — взаимная блокировка или сбой сериализации."""
+    cause = exc.__cause__
+    code = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)
+    return code in DB_CONFLICT_CODES
+
+
+def retry_on_conflict(func=None, *, attempts=DB_CONFLICT_ATTEMPTS):
+    """
+    Повторить функцию-транзакцию при взаимной блокировке или сбое сериализации.
+
+    Ставится над @transaction.atomic. Если функция вызвана внутри чужой
+    транзакции, повтор невозможен (откатилась бы вся внешняя транзакция) —
+    ошибка пробрасывается владельцу внешней транзакции.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if connection.in_atomic_block:
+                return func(*args, **kwargs)
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except DatabaseError as exc:
+                    if attempt == attempts or not is_db_conflict(exc):
+                        raise
+                    logger.warning(
+                        '%s: конфликт транзакции (%s), попытка %s из %s',
+                        func.__qualname__, exc.__cause__.__class__.__name__, attempt, attempts,
+                    )
+                    time.sleep(random.uniform(0, DB_CONFLICT_BACKOFF * 2 ** attempt))
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
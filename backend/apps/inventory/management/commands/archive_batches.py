@@ -0,0 +1,29 @@
+"""
+Перенос давно истощённых партий в архив (batches_archive).
+
+То же делает ночная задача archive_depleted_batches; команда удобна для
+первичного переноса накопленной истории.
+
+    python manage.py archive_batches
+    python manage.py archive_batches --older-than-days 30 --organization <uuid> --chunk-size 5000
+"""
+from django.core.management.base import BaseCommand
+
+from apps.inventory.archive import archive_depleted_batches
+
+
+class Command(BaseCommand):
+    help = 'Перенести истощённые партии и снимки составов букетов в архивные таблицы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, help='По умолчанию — BATCH_ARCHIVE_AFTER_DAYS.')
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        moved = archive_depleted_batches(
+            older_than_days=options.get('older_than_days'),
+            organization=options.get('organization'),
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Перенесено в архив: {moved}'))
@@ -0,0 +1,138 @@
+"""
+Бенчмарк FIFO-чтения на синтетической таблице партий.
+
+Создаёт отдельную организацию, --batches партий (по умолчанию 1 млн), из которых
+живых (remaining > 0) только --live-ratio, показывает план запроса fifo_queue
+(EXPLAIN ANALYZE, BUFFERS) и задержку чтения очереди с блокировкой строк.
+С --compare то же самое повторяется без индекса idx_batch_fifo_live.
+
+Все данные создаются в одной транзакции и откатываются. Запускать только на
+тестовой/стейджинг БД: на время прогона таблица batches получает 1 млн строк,
+а с --compare индекс удаляется внутри транзакции (эксклюзивная блокировка).
+
+    python manage.py benchmark_fifo
+    python manage.py benchmark_fifo --batches 1000000 --live-ratio 0.03 --compare
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.core.models import Organization, TradingPoint, Warehouse
+from apps.inventory.models import Batch
+from apps.inventory.services import fifo_queue
+from apps.nomenclature.models import Nomenclature
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк FIFO-чтения партий (план + задержка), данные откатываются.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batches', type=int, default=1_000_000)
+        parser.add_argument('--live-ratio', type=float, default=0.05, help='Доля живых партий.')
+        parser.add_argument('--skus', type=int, default=2000)
+        parser.add_argument('--warehouses', type=int, default=4)
+        parser.add_argument('--reads', type=int, default=200, help='Число замеряемых чтений.')
+        parser.add_argument('--compare', action='store_true', help='Повторить без idx_batch_fifo_live.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Синтетические данные откатаны.')
+
+    def _run(self, options):
+        org, keys = self._seed(options)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексом idx_batch_fifo_live'))
+        self._measure(org, keys, options['reads'])
+
+        if options['compare']:
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('DROP INDEX idx_batch_fifo_live')
+                        cursor.execute(f'ANALYZE {Batch._meta.db_table}')
+                    self.stdout.write(self.style.MIGRATE_HEADING('Без idx_batch_fifo_live'))
+                    self._measure(org, keys, options['reads'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _seed(self, options):
+        org = Organization.objects.create(name='FIFO benchmark')
+        tp = TradingPoint.objects.create(organization=org, name='FIFO benchmark')
+        warehouses = Warehouse.objects.bulk_create([
+            Warehouse(organization=org, trading_point=tp, name=f'Склад {i}')
+            for i in range(options['warehouses'])
+        ])
+        nomenclatures = Nomenclature.objects.bulk_create([
+            Nomenclature(organization=org, name=f'SKU {i}')
+            for i in range(options['skus'])
+        ])
+
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Batch._meta.db_table} (
+                    id, organization_id, nomenclature_id, warehouse_id,
+                    purchase_price, quantity, remaining, reserved_qty, arrival_date,
+                    invoice_number, is_assembly, notes, created_at
+                )
+                SELECT gen_random_uuid(), %s,
+                       (%s::uuid[])[1 + g %% %s],
+                       (%s::uuid[])[1 + (g / %s) %% %s],
+                       10, 10,
+                       CASE WHEN random() < %s THEN 10 ELSE 0 END, 0,
+                       CURRENT_DATE - (g %% 365),
+                       '', false, '',
+                       NOW() - (g %% 365) * INTERVAL '1 day'
+                FROM generate_series(1, %s) AS g
+                """,
+                [
+                    org.pk,
+                    [str(n.pk) for n in nomenclatures], len(nomenclatures),
+                    [str(w.pk) for w in warehouses], len(nomenclatures), len(warehouses),
+                    options['live_ratio'],
+                    options['batches'],
+                ],
+            )
+            cursor.execute(f'ANALYZE {Batch._meta.db_table}')
+        self.stdout.write(
+            f'Создано партий: {options["batches"]} за {time.perf_counter() - started:.1f} с'
+        )
+
+        keys = list(
+            Batch.objects.filter(organization=org, remaining__gt=0)
+            .values_list('warehouse_id', 'nomenclature_id')
+            .distinct()[:options['reads']]
+        )
+        return org, keys
+
+    def _measure(self, org, keys, reads):
+        if not keys:
+            self.stdout.write('Нет живых партий для замера.')
+            return
+
+        self.stdout.write(fifo_queue(org, keys[:1]).select_for_update().explain(analyze=True, buffers=True))
+
+        for label, size in (('1 позиция', 1), ('чек из 10 позиций', 10)):
+            timings = []
+            for i in range(min(reads, len(keys))):
+                chunk = [keys[(i + j) % len(keys)] for j in range(size)]
+                started = time.perf_counter()
+                list(fifo_queue(org, chunk).select_for_update())
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{label}: p50={timings[len(timings) // 2]:.2f} мс, '
+                f'p95={timings[int(len(timings) * 0.95)]:.2f} мс, '
+                f'max={timings[-1]:.2f} мс ({len(timings)} чтений)'
+            )
@@ -0,0 +1,32 @@
+"""
+Перестроить кэш минусовых и низких остатков в Redis (apps.inventory.stock_alerts).
+
+Кэш перестраивается и сам — при первом запросе и по истечении TTL; команда
+нужна после сбоя Redis или массовых изменений в обход сервисов.
+
+    python manage.py rebuild_stock_alerts
+    python manage.py rebuild_stock_alerts --organization <uuid>
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Organization
+from apps.inventory.stock_alerts import _redis, rebuild_stock_alerts
+
+
+class Command(BaseCommand):
+    help = 'Перестроить кэш минусовых и низких остатков в Redis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+
+    def handle(self, *args, **options):
+        if _redis() is None:
+            raise CommandError('Redis недоступен (CACHES["default"] не django-redis или нет соединения).')
+
+        organizations = Organization.objects.all()
+        if options.get('organization'):
+            organizations = organizations.filter(pk=options['organization'])
+
+        for organization_id in organizations.values_list('id', flat=True):
+            count = rebuild_stock_alerts(organization_id)
+            self.stdout.write(f'{organization_id}: {count} позиций')
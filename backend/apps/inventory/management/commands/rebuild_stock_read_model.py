@@ -0,0 +1,31 @@
+"""
+Перестроить витрину остатков страницы склада (apps.inventory.read_model).
+
+Витрина поддерживается складскими сервисами; команда нужна после изменений
+в обход них (переименование склада, правки в админке, ручной SQL).
+
+    python manage.py rebuild_stock_read_model
+    python manage.py rebuild_stock_read_model --organization <uuid>
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import Organization
+from apps.inventory.read_model import rebuild_stock_read_model
+
+
+class Command(BaseCommand):
+    help = 'Перестроить витрину остатков страницы склада.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.all()
+        if options.get('organization'):
+            organizations = organizations.filter(pk=options['organization'])
+
+        for organization_id in organizations.values_list('id', flat=True):
+            with transaction.atomic():
+                count = rebuild_stock_read_model(organization_id)
+            self.stdout.write(f'{organization_id}: {count} строк')
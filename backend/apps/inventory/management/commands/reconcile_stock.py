@@ -0,0 +1,76 @@
+"""
+Сверка StockBalance.quantity с журналом движений и партиями.
+
+Каждый склад сверяется отдельно (reconciliation.reconcile_warehouse),
+при --workers > 1 — в пуле процессов. Расхождения выводятся в stdout,
+с --report — дополнительно в CSV. С --repair остаток доводится до
+replay журнала движений.
+
+    python manage.py reconcile_stock
+    python manage.py reconcile_stock --organization <uuid> --workers 8 --report diff.csv
+    python manage.py reconcile_stock --warehouse <uuid> --repair
+"""
+import csv
+
+from django.core.management.base import BaseCommand
+
+from apps.core.models import Warehouse
+from apps.inventory.reconciliation import reconcile_warehouses
+
+REPORT_FIELDS = [
+    'organization_id', 'warehouse_id', 'nomenclature_id',
+    'balance_qty', 'movements_qty', 'batches_qty',
+    'ledger_delta', 'batches_delta',
+]
+
+
+class Command(BaseCommand):
+    help = 'Сверка остатков с журналом движений и партиями (с опциональным исправлением).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+        parser.add_argument('--warehouse', action='append', help='UUID склада (можно несколько раз).')
+        parser.add_argument('--repair', action='store_true', help='Исправить остатки по журналу движений.')
+        parser.add_argument('--workers', type=int, default=1, help='Число процессов (по складу на процесс).')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--report', help='Путь к CSV-файлу с расхождениями.')
+
+    def handle(self, *args, **options):
+        warehouses = Warehouse.objects.all()
+        if options.get('organization'):
+            warehouses = warehouses.filter(organization_id=options['organization'])
+        if options.get('warehouse'):
+            warehouses = warehouses.filter(pk__in=options['warehouse'])
+        warehouse_ids = list(warehouses.order_by('id').values_list('id', flat=True))
+
+        report_file = open(options['report'], 'w', newline='') if options.get('report') else None
+        writer = None
+        if report_file:
+            writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+
+        mismatched = 0
+        try:
+            for warehouse_id, diffs in reconcile_warehouses(
+                warehouse_ids,
+                repair=options['repair'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+            ):
+                mismatched += len(diffs)
+                for row in diffs:
+                    self.stdout.write(
+                        f"склад={row['warehouse_id']} номенклатура={row['nomenclature_id']} "
+                        f"остаток={row['balance_qty']} по движениям={row['movements_qty']} "
+                        f"по партиям={row['batches_qty']}"
+                    )
+                    if writer:
+                        writer.writerow(row)
+        finally:
+            if report_file:
+                report_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено складов: {len(warehouse_ids)}, расхождений: {mismatched}'
+            + (', исправлено по журналу.' if options['repair'] else '.')
+        ))
@@ -0,0 +1,53 @@
+"""
+Полный пересчёт закупочной цены номенклатуры.
+
+Nomenclature.purchase_price обновляется отложенно (recompute_purchase_prices
+после коммита прихода). Команда проходит по всем позициям потоком, пачками
+по --chunk-size, и пересчитывает каждую пачку одним GROUP BY.
+
+    python manage.py refresh_purchase_prices
+    python manage.py refresh_purchase_prices --organization <uuid> --chunk-size 5000
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.inventory.services import recompute_purchase_prices
+from apps.nomenclature.models import Nomenclature
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт Nomenclature.purchase_price по партиям для всех позиций.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        nomenclatures = Nomenclature.objects.exclude(accounting_type='service')
+        if options.get('organization'):
+            nomenclatures = nomenclatures.filter(organization_id=options['organization'])
+
+        scanned = 0
+        updated = 0
+        chunk = []
+        for pk in nomenclatures.values_list('id', flat=True).iterator(chunk_size=chunk_size):
+            chunk.append(pk)
+            if len(chunk) >= chunk_size:
+                scanned += len(chunk)
+                updated += self._flush(chunk)
+
+        if chunk:
+            scanned += len(chunk)
+            updated += self._flush(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено позиций: {scanned}, обновлено цен: {updated}.'
+        ))
+
+    def _flush(self, chunk):
+        with transaction.atomic():
+            updated = recompute_purchase_prices(chunk)
+        chunk.clear()
+        return updated
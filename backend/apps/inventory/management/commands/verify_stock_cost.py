@@ -0,0 +1,127 @@
+"""
+Сверка накопленной стоимости остатков с партиями.
+
+StockBalance.total_cost ведётся инкрементально (дельтами в _update_stock_balance).
+Команда заново выводит её из живых партий (Σ remaining × purchase_price),
+показывает расхождения и с --fix переписывает total_cost и avg_purchase_price.
+
+Поиск расхождений идёт без блокировок. Исправление — порциями: каждая
+порция в своей транзакции берёт lock_stock на свои пары, заново считает
+агрегат партий и пишет его одним UPDATE ... FROM только там, где расхождение
+подтвердилось, — параллельно применённые дельты не затираются. Витрина
+остатков по исправленным парам пересчитывается в той же транзакции.
+
+    python manage.py verify_stock_cost
+    python manage.py verify_stock_cost --organization <uuid> --fix
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from apps.inventory.locks import lock_stock
+from apps.inventory.models import Batch, StockBalance
+from apps.inventory.read_model import refresh_stock_read_model
+
+
+class Command(BaseCommand):
+    help = 'Сверка StockBalance.total_cost с партиями (Σ remaining × purchase_price).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='UUID организации (по умолчанию — все).')
+        parser.add_argument('--fix', action='store_true', help='Исправить расхождения.')
+        parser.add_argument(
+            '--tolerance', type=Decimal, default=Decimal('0.01'),
+            help='Допустимое расхождение стоимости (по умолчанию 0.01).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        organization_id = options.get('organization')
+        tolerance = options['tolerance']
+        chunk_size = options['chunk_size']
+
+        batches = Batch.objects.filter(remaining__gt=0)
+        balances = StockBalance.objects.all()
+        if organization_id:
+            batches = batches.filter(organization_id=organization_id)
+            balances = balances.filter(organization_id=organization_id)
+
+        expected = {
+            (row['warehouse_id'], row['nomenclature_id']): row['total_cost']
+            for row in batches.values('warehouse_id', 'nomenclature_id').annotate(
+                total_cost=Sum(F('remaining') * F('purchase_price')),
+            )
+        }
+
+        checked = 0
+        mismatched = 0
+        fixed = 0
+        to_fix = []
+        for sb in balances.only(
+            'id', 'warehouse_id', 'nomenclature_id', 'total_cost',
+        ).iterator(chunk_size=chunk_size):
+            checked += 1
+            total_cost = expected.get((sb.warehouse_id, sb.nomenclature_id), Decimal('0'))
+            if abs(sb.total_cost - total_cost) <= tolerance:
+                continue
+
+            mismatched += 1
+            self.stdout.write(
+                f'{sb.id}: склад={sb.warehouse_id} номенклатура={sb.nomenclature_id} '
+                f'total_cost={sb.total_cost} по партиям={total_cost}'
+            )
+            if options['fix']:
+                to_fix.append(sb)
+                if len(to_fix) >= chunk_size:
+                    fixed += self._fix(to_fix, tolerance)
+
+        if to_fix:
+            fixed += self._fix(to_fix, tolerance)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено остатков: {checked}, расхождений: {mismatched}'
+            + (f', исправлено: {fixed}.' if options['fix'] else '.')
+        ))
+
+    def _fix(self, balances, tolerance):
+        """Пересчитать стоимость порции остатков по партиям под блокировками пар."""
+        balance_ids = [str(sb.pk) for sb in balances]
+        keys = [(sb.warehouse_id, sb.nomenclature_id) for sb in balances]
+        balances.clear()
+        table = StockBalance._meta.db_table
+        with transaction.atomic():
+            lock_stock(keys)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {table} AS sb SET
+                        total_cost = b.cost,
+                        avg_purchase_price = CASE
+                            WHEN b.remaining > 0 THEN b.cost / b.remaining
+                            ELSE sb.avg_purchase_price
+                        END,
+                        updated_at = %s
+                    FROM (
+                        SELECT s.id,
+                               COALESCE(SUM(bt.remaining), 0) AS remaining,
+                               COALESCE(SUM(bt.remaining * bt.purchase_price), 0) AS cost
+                        FROM {table} s
+                        LEFT JOIN {Batch._meta.db_table} bt
+                          ON bt.organization_id = s.organization_id
+                         AND bt.warehouse_id = s.warehouse_id
+                         AND bt.nomenclature_id = s.nomenclature_id
+                         AND bt.remaining > 0
+                        WHERE s.id = ANY(%s::uuid[])
+                        GROUP BY s.id
+                    ) b
+                    WHERE sb.id = b.id AND ABS(sb.total_cost - b.cost) > %s
+                    RETURNING sb.warehouse_id, sb.nomenclature_id
+                    """,
+                    [timezone.now(), balance_ids, tolerance],
+                )
+                fixed = cursor.fetchall()
+            refresh_stock_read_model(fixed)
+        return len(fixed)
@@ -0,0 +1,39 @@
+"""Add persisted total_cost to StockBalance and backfill it from live batches."""
+
+from django.db import migrations, models
+
+
+def backfill_total_cost(apps, schema_editor):
+    """total_cost = Σ remaining × purchase_price по живым партиям склада + номенклатуры."""
+    schema_editor.execute(
+        """
+        UPDATE stock_balances sb
+        SET total_cost = agg.total_cost
+        FROM (
+            SELECT organization_id, warehouse_id, nomenclature_id,
+                   SUM(remaining * purchase_price) AS total_cost
+            FROM batches
+            WHERE remaining > 0
+            GROUP BY organization_id, warehouse_id, nomenclature_id
+        ) agg
+        WHERE sb.organization_id = agg.organization_id
+          AND sb.warehouse_id = agg.warehouse_id
+          AND sb.nomenclature_id = agg.nomenclature_id
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_batch_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockbalance',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Стоимость остатка'),
+        ),
+        migrations.RunPython(backfill_total_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+"""Nightly stock snapshots (stock_snapshots) and an (organization, created_at) movement index."""
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0010_stockbalance_total_cost'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+        ('sales', '0011_saleitem_reserve_saleitem_source_mode_salescategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('snapshot_date', models.DateField(verbose_name='Дата снимка')),
+                ('taken_at', models.DateTimeField(verbose_name='Снят')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Количество')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Стоимость остатка')),
+            ],
+            options={
+                'verbose_name': 'Снимок остатков',
+                'verbose_name_plural': 'Снимки остатков',
+                'db_table': 'stock_snapshots',
+                'ordering': ['-snapshot_date', 'warehouse', 'nomenclature'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['organization', 'created_at'], name='idx_movement_org_date'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='nomenclature',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='nomenclature.nomenclature', verbose_name='Номенклатура'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='core.organization', verbose_name='Организация'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='core.warehouse', verbose_name='Склад'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['organization', 'taken_at'], name='idx_snapshot_org_taken'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('warehouse', 'nomenclature', 'snapshot_date'), name='unique_stock_snapshot_per_warehouse_nomenclature_date'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+"""
+Partial FIFO index on live batches (remaining > 0).
+
+Key order matches services.fifo_queue, so the FIFO read needs no sort and skips
+depleted batches. remaining and purchase_price are INCLUDE columns. The index
+is built CONCURRENTLY so the batches table is not locked during deploy.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0011_stock_snapshots'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='batch',
+            index=models.Index(
+                condition=models.Q(remaining__gt=0),
+                fields=['organization', 'warehouse', 'nomenclature', 'arrival_date', 'created_at', 'id'],
+                include=['remaining', 'purchase_price'],
+                name='idx_batch_fifo_live',
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+"""Persisted, aggregated expiry alerts (expiry_alerts) for the nightly expiring-batch task."""
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0012_batch_fifo_live_index'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryAlert',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('expiry_date', models.DateField(verbose_name='Годен до')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Количество')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Стоимость')),
+                ('batches_count', models.PositiveIntegerField(default=0, verbose_name='Партий')),
+                ('refreshed_at', models.DateTimeField(verbose_name='Обновлено')),
+                ('nomenclature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alerts', to='nomenclature.nomenclature', verbose_name='Номенклатура')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alerts', to='core.organization', verbose_name='Организация')),
+                ('trading_point', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alerts', to='core.tradingpoint', verbose_name='Торговая точка')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alerts', to='core.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Предупреждение о сроке годности',
+                'verbose_name_plural': 'Предупреждения о сроках годности',
+                'db_table': 'expiry_alerts',
+                'ordering': ['expiry_date', 'nomenclature'],
+                'indexes': [models.Index(fields=['organization', 'trading_point', 'expiry_date'], name='idx_expiry_alert_org_tp')],
+                'constraints': [models.UniqueConstraint(fields=('warehouse', 'nomenclature', 'expiry_date'), name='unique_expiry_alert_per_warehouse_nomenclature_date')],
+            },
+        ),
+    ]
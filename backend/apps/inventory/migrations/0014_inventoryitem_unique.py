@@ -0,0 +1,33 @@
+"""
+One InventoryItem per (document, nomenclature), so counts can be upserted.
+
+Duplicate rows, which nothing should have created so far, are collapsed
+before the constraint is added.
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_expiry_alerts'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            DELETE FROM inventory_items a
+            USING inventory_items b
+            WHERE a.document_id = b.document_id
+              AND a.nomenclature_id = b.nomenclature_id
+              AND a.id < b.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryitem',
+            constraint=models.UniqueConstraint(fields=('document', 'nomenclature'), name='unique_inventory_item_per_document_nomenclature'),
+        ),
+    ]
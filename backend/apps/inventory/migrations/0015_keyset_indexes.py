@@ -0,0 +1,26 @@
+"""Extend (..., -created_at) journal indexes with -id to back keyset (cursor) pagination."""
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0014_inventoryitem_unique'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+        ('sales', '0011_saleitem_reserve_saleitem_source_mode_salescategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockmovement',
+            name='idx_movement_org_date',
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='idx_movement_org_dt_id'),
+        ),
+    ]
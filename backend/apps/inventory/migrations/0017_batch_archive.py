@@ -0,0 +1,84 @@
+"""Archive tables for depleted batches; references to batches no longer carry DB-level FKs."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0016_partition_stock_movements'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+        ('suppliers', '0002_alter_supplier_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='receiptdocumentitem',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipt_document_items', to='inventory.batch', verbose_name='Партия'),
+        ),
+        migrations.AlterField(
+            model_name='reserve',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reserves', to='inventory.batch', verbose_name='Партия'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='inventory.batch', verbose_name='Партия'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedBatch',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('purchase_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Закупочная цена')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Количество')),
+                ('remaining', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Остаток')),
+                ('arrival_date', models.DateField(verbose_name='Дата прихода')),
+                ('expiry_date', models.DateField(blank=True, null=True, verbose_name='Годен до')),
+                ('invoice_number', models.CharField(blank=True, default='', max_length=100, verbose_name='Номер накладной')),
+                ('is_assembly', models.BooleanField(default=False, verbose_name='Сборка букета')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='bouquet_batches/', verbose_name='Фото витринного букета')),
+                ('notes', models.TextField(blank=True, default='', verbose_name='Примечания')),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(verbose_name='Перенесена в архив')),
+                ('nomenclature', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='nomenclature.nomenclature', verbose_name='Номенклатура')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_batches', to='core.organization', verbose_name='Организация')),
+                ('receipt_document', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.receiptdocument', verbose_name='Документ поступления')),
+                ('supplier', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suppliers.supplier', verbose_name='Поставщик')),
+                ('warehouse', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Архивная партия',
+                'verbose_name_plural': 'Архивные партии',
+                'db_table': 'batches_archive',
+                'ordering': ['-arrival_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBouquetBatchComponentSnapshot',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('accounting_type', models.CharField(blank=True, default='stock_material', max_length=20, verbose_name='Тип учёта')),
+                ('quantity_per_unit', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Кол-во на 1 букет')),
+                ('price_per_unit', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Цена за ед.')),
+                ('sort_order', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('source_mode', models.CharField(choices=[('template', 'Из шаблона'), ('manual', 'Ручная сборка'), ('correction', 'Коррекция')], default='template', max_length=20, verbose_name='Источник')),
+                ('created_at', models.DateTimeField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='component_snapshots', to='inventory.archivedbatch', verbose_name='Партия букета')),
+                ('nomenclature', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='nomenclature.nomenclature', verbose_name='Номенклатура компонента')),
+            ],
+            options={
+                'verbose_name': 'Архивный снимок состава букета',
+                'verbose_name_plural': 'Архивные снимки составов букетов',
+                'db_table': 'bouquet_batch_component_snapshots_archive',
+                'ordering': ['sort_order', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedbatch',
+            index=models.Index(fields=['organization', 'nomenclature', 'arrival_date'], name='idx_batch_arch_org_nom_date'),
+        ),
+    ]
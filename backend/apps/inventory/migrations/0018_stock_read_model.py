@@ -0,0 +1,139 @@
+"""Add the flattened stock read model for the inventory page and backfill it."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Снимок запроса read_model на момент этой миграции: витрина заполняется
+# по схеме 0018, а не по текущему коду приложения.
+BACKFILL_SQL = """
+    INSERT INTO stock_read_model (
+        id, organization_id, warehouse_id, trading_point_id, nomenclature_id, group_id,
+        warehouse_name, nomenclature_name, group_name, accounting_type, is_active, is_listed,
+        min_stock, purchase_price, retail_price,
+        quantity, avg_purchase_price, total_cost,
+        reserved_qty, nearest_expiry, latest_batch_id, latest_batch_created_at, latest_batch,
+        updated_at
+    )
+    SELECT sb.id, sb.organization_id, sb.warehouse_id, w.trading_point_id, sb.nomenclature_id, n.group_id,
+           w.name, n.name, COALESCE(g.name, ''), n.accounting_type, n.is_active,
+           n.accounting_type <> 'service'
+               AND NOT (sb.quantity = 0 AND n.accounting_type = 'finished_bouquet'),
+           n.min_stock, n.purchase_price, n.retail_price,
+           sb.quantity, sb.avg_purchase_price, sb.total_cost,
+           COALESCE(rs.reserved, 0), ex.nearest_expiry, lb.id, lb.created_at,
+           CASE WHEN lb.id IS NULL THEN NULL ELSE json_build_object(
+               'arrival_date', lb.arrival_date::text,
+               'cost_price', lb.purchase_price::text,
+               'is_assembly', lb.is_assembly,
+               'image', COALESCE(lb.image, ''),
+               'notes', lb.notes,
+               'creator', COALESCE(cr.name, ''),
+               'components', COALESCE(cm.items, '[]'::json)
+           ) END,
+           now()
+    FROM stock_balances sb
+    JOIN warehouses w ON w.id = sb.warehouse_id
+    JOIN nomenclatures n ON n.id = sb.nomenclature_id
+    LEFT JOIN nomenclature_groups g ON g.id = n.group_id
+    LEFT JOIN LATERAL (
+        SELECT SUM(r.quantity) AS reserved FROM reserves r
+        WHERE r.warehouse_id = sb.warehouse_id
+          AND r.bouquet_nomenclature_id = sb.nomenclature_id
+          AND r.status = 'active'
+    ) rs ON true
+    LEFT JOIN LATERAL (
+        SELECT MIN(b.expiry_date) AS nearest_expiry FROM batches b
+        WHERE b.organization_id = sb.organization_id
+          AND b.warehouse_id = sb.warehouse_id
+          AND b.nomenclature_id = sb.nomenclature_id
+          AND b.remaining > 0
+    ) ex ON true
+    LEFT JOIN LATERAL (
+        SELECT b.id, b.created_at, b.arrival_date, b.purchase_price, b.is_assembly, b.image, b.notes
+        FROM batches b
+        WHERE n.accounting_type = 'finished_bouquet'
+          AND b.organization_id = sb.organization_id
+          AND b.warehouse_id = sb.warehouse_id
+          AND b.nomenclature_id = sb.nomenclature_id
+          AND b.remaining > 0
+        ORDER BY b.created_at DESC
+        LIMIT 1
+    ) lb ON true
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(NULLIF(TRIM(u.first_name || ' ' || u.last_name), ''), u.username, '') AS name
+        FROM stock_movements m
+        LEFT JOIN users u ON u.id = m.user_id
+        WHERE m.batch_id = lb.id AND m.movement_type IN ('assembly', 'receipt')
+        ORDER BY m.created_at
+        LIMIT 1
+    ) cr ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'nomenclature_id', s.nomenclature_id::text,
+            'nomenclature_name', cn.name,
+            'quantity', s.quantity_per_unit::text,
+            'price', s.price_per_unit::text,
+            'accounting_type', s.accounting_type,
+            'source_mode', s.source_mode
+        ) ORDER BY s.sort_order) AS items
+        FROM bouquet_batch_component_snapshots s
+        JOIN nomenclatures cn ON cn.id = s.nomenclature_id
+        WHERE s.batch_id = lb.id
+    ) cm ON true
+"""
+
+
+def backfill_stock_read_model(apps, schema_editor):
+    """Заполнить витрину по текущим остаткам (StockBalance)."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(BACKFILL_SQL)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0017_batch_archive'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReadModel',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('warehouse_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Склад')),
+                ('nomenclature_name', models.CharField(blank=True, default='', max_length=500, verbose_name='Номенклатура')),
+                ('group_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Группа')),
+                ('accounting_type', models.CharField(blank=True, default='', max_length=20, verbose_name='Тип учёта')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('is_listed', models.BooleanField(default=True)),
+                ('min_stock', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Мин. остаток')),
+                ('purchase_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Закупочная цена')),
+                ('retail_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Розничная цена')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Количество')),
+                ('avg_purchase_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Средняя закупочная')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Стоимость остатка')),
+                ('reserved_qty', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='В резерве')),
+                ('nearest_expiry', models.DateField(blank=True, null=True, verbose_name='Ближайший срок годности')),
+                ('latest_batch_id', models.UUIDField(blank=True, null=True, verbose_name='Последняя партия букета')),
+                ('latest_batch_created_at', models.DateTimeField(blank=True, null=True)),
+                ('latest_batch', models.JSONField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('group', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='nomenclature.nomenclaturegroup', verbose_name='Группа')),
+                ('nomenclature', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='nomenclature.nomenclature', verbose_name='Номенклатура')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organization', verbose_name='Организация')),
+                ('trading_point', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.tradingpoint', verbose_name='Торговая точка')),
+                ('warehouse', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Строка остатка (витрина)',
+                'verbose_name_plural': 'Строки остатков (витрина)',
+                'db_table': 'stock_read_model',
+                'ordering': ['nomenclature_name'],
+                'indexes': [models.Index(condition=models.Q(('is_listed', True)), fields=['organization', 'nomenclature_name'], name='idx_stock_rm_org_name'), models.Index(condition=models.Q(('is_listed', True)), fields=['organization', 'trading_point', 'nomenclature_name'], name='idx_stock_rm_tp_name'), models.Index(condition=models.Q(('is_listed', True)), fields=['organization', 'warehouse', 'nomenclature_name'], name='idx_stock_rm_wh_name'), models.Index(fields=['nomenclature'], name='idx_stock_rm_nomenclature')],
+            },
+        ),
+        migrations.RunPython(backfill_stock_read_model, migrations.RunPython.noop),
+    ]
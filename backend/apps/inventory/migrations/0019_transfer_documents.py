@@ -0,0 +1,65 @@
+"""Add multi-line transfer documents."""
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('inventory', '0018_stock_read_model'),
+        ('nomenclature', '0014_purchasepricehistory_retail_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferDocument',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('number', models.PositiveIntegerField(verbose_name='Номер перемещения')),
+                ('date', models.DateField(verbose_name='Дата перемещения')),
+                ('status', models.CharField(choices=[('draft', 'Черновик'), ('posted', 'Проведён')], default='draft', max_length=20, verbose_name='Статус')),
+                ('comment', models.TextField(blank=True, default='', verbose_name='Комментарий')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Себестоимость перемещения')),
+                ('posted_at', models.DateTimeField(blank=True, null=True, verbose_name='Проведён')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Создал')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfer_documents', to='core.organization', verbose_name='Организация')),
+                ('posted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Провёл')),
+                ('warehouse_from', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfer_documents_out', to='core.warehouse', verbose_name='Склад-отправитель')),
+            ],
+            options={
+                'verbose_name': 'Документ перемещения',
+                'verbose_name_plural': 'Документы перемещений',
+                'db_table': 'transfer_documents',
+                'ordering': ['-date', '-number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransferDocumentItem',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Количество')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Себестоимость')),
+                ('batch', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfer_document_items', to='inventory.batch', verbose_name='Партия')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='inventory.transferdocument', verbose_name='Документ')),
+                ('nomenclature', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfer_items', to='nomenclature.nomenclature', verbose_name='Номенклатура')),
+                ('warehouse_to', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfer_items_in', to='core.warehouse', verbose_name='Склад-получатель')),
+            ],
+            options={
+                'verbose_name': 'Строка документа перемещения',
+                'verbose_name_plural': 'Строки документов перемещений',
+                'db_table': 'transfer_document_items',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='transferdocument',
+            constraint=models.UniqueConstraint(fields=('organization', 'number'), name='unique_transfer_number_per_org'),
+        ),
+    ]
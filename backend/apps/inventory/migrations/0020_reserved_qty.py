@@ -0,0 +1,59 @@
+"""Keep reserved quantities on batches and stock balances and backfill them from active reserves."""
+
+from django.db import migrations, models
+
+
+def backfill_reserved_qty(apps, schema_editor):
+    """Посчитать резервы по активным Reserve."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE batches b SET reserved_qty = r.qty
+            FROM (
+                SELECT batch_id, SUM(quantity) AS qty FROM reserves
+                WHERE status = 'active' AND batch_id IS NOT NULL
+                GROUP BY batch_id
+            ) r
+            WHERE b.id = r.batch_id
+            """
+        )
+        cursor.execute(
+            """
+            UPDATE stock_balances sb SET reserved_qty = r.qty
+            FROM (
+                SELECT organization_id, warehouse_id, bouquet_nomenclature_id, SUM(quantity) AS qty
+                FROM reserves
+                WHERE status = 'active' AND bouquet_nomenclature_id IS NOT NULL
+                GROUP BY organization_id, warehouse_id, bouquet_nomenclature_id
+            ) r
+            WHERE sb.organization_id = r.organization_id
+              AND sb.warehouse_id = r.warehouse_id
+              AND sb.nomenclature_id = r.bouquet_nomenclature_id
+            """
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_transfer_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedbatch',
+            name='reserved_qty',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='В резерве'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='reserved_qty',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='В резерве'),
+        ),
+        migrations.AddField(
+            model_name='stockbalance',
+            name='reserved_qty',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='В резерве'),
+        ),
+        migrations.RunPython(backfill_reserved_qty, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+"""
+Partial index on live batches with an expiry date, for the expired-batch auto write-off.
+
+The index is built CONCURRENTLY so the batches table is not locked during deploy.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0020_reserved_qty'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='batch',
+            index=models.Index(
+                condition=models.Q(remaining__gt=0, expiry_date__isnull=False),
+                fields=['organization', 'expiry_date'],
+                name='idx_batch_expiry_live',
+            ),
+        ),
+    ]
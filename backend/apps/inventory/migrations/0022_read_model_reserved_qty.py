@@ -0,0 +1,26 @@
+"""Sync reserved quantities in the stock read model with the stock balance counters."""
+
+from django.db import migrations
+
+
+def sync_read_model_reserved_qty(apps, schema_editor):
+    """Витрина берёт резерв из StockBalance.reserved_qty — выровнять уже заполненные строки."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE stock_read_model rm SET reserved_qty = sb.reserved_qty
+            FROM stock_balances sb
+            WHERE sb.id = rm.id AND rm.reserved_qty IS DISTINCT FROM sb.reserved_qty
+            """
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_batch_expiry_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(sync_read_model_reserved_qty, migrations.RunPython.noop),
+    ]
@@ -5,7 +5,10 @@ from decimal import Decimal
 
 
 class Batch(models.Model):
-    """Партия товара (приход от поставщика)."""
+    """
+    Партия товара (приход от поставщика).
+    Срок годности по умолчанию проставляется при создании (batches.create_batch / bulk_create_batches).
+    """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     organization = models.ForeignKey(
         'core.Organization', on_delete=models.CASCADE,
@@ -32,6 +35,7 @@ class Batch(models.Model):
     )
     quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2)
     remaining = models.DecimalField('Остаток', max_digits=10, decimal_places=2)
+    reserved_qty = models.DecimalField('В резерве', max_digits=10, decimal_places=2, default=0)
     arrival_date = models.DateField('Дата прихода')
     expiry_date = models.DateField('Годен до', null=True, blank=True)
     invoice_number = models.CharField('Номер накладной', max_length=100, blank=True, default='')
@@ -47,6 +51,19 @@ class Batch(models.Model):
         ordering = ['-arrival_date']
         indexes = [
             models.Index(fields=['organization', 'warehouse', 'nomenclature', 'remaining'], name='idx_batch_fifo'),
+            # Очередь FIFO только по живым партиям, в порядке списания (services.fifo_queue)
+            models.Index(
+                fields=['organization', 'warehouse', 'nomenclature', 'arrival_date', 'created_at', 'id'],
+                condition=models.Q(remaining__gt=0),
+                include=['remaining', 'purchase_price'],
+                name='idx_batch_fifo_live',
+            ),
+            # Поиск просроченных живых партий (expiry.write_off_expired_batches)
+            models.Index(
+                fields=['organization', 'expiry_date'],
+                condition=models.Q(remaining__gt=0, expiry_date__isnull=False),
+                name='idx_batch_expiry_live',
+            ),
         ]
         constraints = [
             models.CheckConstraint(
@@ -55,12 +72,6 @@ class Batch(models.Model):
             ),
         ]
 
-    def save(self, *args, **kwargs):
-        if not self.expiry_date and self.nomenclature.default_shelf_life_days:
-            from datetime import timedelta
-            self.expiry_date = self.arrival_date + timedelta(days=self.nomenclature.default_shelf_life_days)
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f'{self.nomenclature.name} — {self.quantity} ({self.arrival_date})'
 
@@ -134,6 +145,7 @@ class ReceiptDocumentItem(models.Model):
     batch = models.ForeignKey(
         Batch, on_delete=models.SET_NULL, null=True, blank=True,
         related_name='receipt_document_items', verbose_name='Партия',
+        db_constraint=False,
     )
 
     class Meta:
@@ -165,6 +177,10 @@ class StockBalance(models.Model):
     avg_purchase_price = models.DecimalField(
         'Средняя закупочная', max_digits=12, decimal_places=2, default=0,
     )
+    total_cost = models.DecimalField(
+        'Стоимость остатка', max_digits=14, decimal_places=2, default=0,
+    )
+    reserved_qty = models.DecimalField('В резерве', max_digits=10, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -183,6 +199,165 @@ class StockBalance(models.Model):
         return f'{self.nomenclature.name} @ {self.warehouse.name}: {self.quantity}'
 
 
+class StockReadModel(models.Model):
+    """
+    Плоская строка остатка для страницы склада (apps.inventory.read_model).
+    id совпадает с StockBalance.id; поля номенклатуры, склада, резервов и
+    последней партии букета копируются при изменении остатка.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    organization = models.ForeignKey(
+        'core.Organization', on_delete=models.CASCADE,
+        related_name='+', verbose_name='Организация',
+    )
+    warehouse = models.ForeignKey(
+        'core.Warehouse', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+', verbose_name='Склад',
+    )
+    trading_point = models.ForeignKey(
+        'core.TradingPoint', on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+', verbose_name='Торговая точка',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+', verbose_name='Номенклатура',
+    )
+    group = models.ForeignKey(
+        'nomenclature.NomenclatureGroup', on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+', verbose_name='Группа',
+    )
+    warehouse_name = models.CharField('Склад', max_length=255, blank=True, default='')
+    nomenclature_name = models.CharField('Номенклатура', max_length=500, blank=True, default='')
+    group_name = models.CharField('Группа', max_length=255, blank=True, default='')
+    accounting_type = models.CharField('Тип учёта', max_length=20, blank=True, default='')
+    is_active = models.BooleanField('Активна', default=True)
+    # Строка показывается на странице склада (не услуга и не пустой готовый букет)
+    is_listed = models.BooleanField(default=True)
+    min_stock = models.DecimalField('Мин. остаток', max_digits=10, decimal_places=2, default=0)
+    purchase_price = models.DecimalField('Закупочная цена', max_digits=12, decimal_places=2, default=0)
+    retail_price = models.DecimalField('Розничная цена', max_digits=12, decimal_places=2, default=0)
+    quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2, default=0)
+    avg_purchase_price = models.DecimalField('Средняя закупочная', max_digits=12, decimal_places=2, default=0)
+    total_cost = models.DecimalField('Стоимость остатка', max_digits=14, decimal_places=2, default=0)
+    reserved_qty = models.DecimalField('В резерве', max_digits=10, decimal_places=2, default=0)
+    nearest_expiry = models.DateField('Ближайший срок годности', null=True, blank=True)
+    latest_batch_id = models.UUIDField('Последняя партия букета', null=True, blank=True)
+    latest_batch_created_at = models.DateTimeField(null=True, blank=True)
+    # Данные для bouquet-detail: цена, фото, автор сборки, состав
+    latest_batch = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'stock_read_model'
+        verbose_name = 'Строка остатка (витрина)'
+        verbose_name_plural = 'Строки остатков (витрина)'
+        ordering = ['nomenclature_name']
+        indexes = [
+            models.Index(
+                fields=['organization', 'nomenclature_name'],
+                condition=models.Q(is_listed=True), name='idx_stock_rm_org_name',
+            ),
+            models.Index(
+                fields=['organization', 'trading_point', 'nomenclature_name'],
+                condition=models.Q(is_listed=True), name='idx_stock_rm_tp_name',
+            ),
+            models.Index(
+                fields=['organization', 'warehouse', 'nomenclature_name'],
+                condition=models.Q(is_listed=True), name='idx_stock_rm_wh_name',
+            ),
+            models.Index(fields=['nomenclature'], name='idx_stock_rm_nomenclature'),
+        ]
+
+    def __str__(self):
+        return f'{self.nomenclature_name} @ {self.warehouse_name}: {self.quantity}'
+
+
+class StockSnapshot(models.Model):
+    """Ночной снимок остатков — опорная точка для запросов «остаток на дату»."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        'core.Organization', on_delete=models.CASCADE,
+        related_name='stock_snapshots', verbose_name='Организация',
+    )
+    warehouse = models.ForeignKey(
+        'core.Warehouse', on_delete=models.CASCADE,
+        related_name='stock_snapshots', verbose_name='Склад',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.CASCADE,
+        related_name='stock_snapshots', verbose_name='Номенклатура',
+    )
+    snapshot_date = models.DateField('Дата снимка')
+    taken_at = models.DateTimeField('Снят')
+    quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2, default=0)
+    total_cost = models.DecimalField('Стоимость остатка', max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'stock_snapshots'
+        verbose_name = 'Снимок остатков'
+        verbose_name_plural = 'Снимки остатков'
+        ordering = ['-snapshot_date', 'warehouse', 'nomenclature']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['warehouse', 'nomenclature', 'snapshot_date'],
+                name='unique_stock_snapshot_per_warehouse_nomenclature_date',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'taken_at'], name='idx_snapshot_org_taken'),
+        ]
+
+    def __str__(self):
+        return f'{self.snapshot_date}: {self.nomenclature_id} @ {self.warehouse_id} = {self.quantity}'
+
+
+class ExpiryAlert(models.Model):
+    """
+    Агрегированное предупреждение о скоропортящемся остатке:
+    склад + номенклатура + срок годности (обновляется ночной задачей).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        'core.Organization', on_delete=models.CASCADE,
+        related_name='expiry_alerts', verbose_name='Организация',
+    )
+    trading_point = models.ForeignKey(
+        'core.TradingPoint', on_delete=models.CASCADE,
+        related_name='expiry_alerts', verbose_name='Торговая точка',
+    )
+    warehouse = models.ForeignKey(
+        'core.Warehouse', on_delete=models.CASCADE,
+        related_name='expiry_alerts', verbose_name='Склад',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.CASCADE,
+        related_name='expiry_alerts', verbose_name='Номенклатура',
+    )
+    expiry_date = models.DateField('Годен до')
+    quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2, default=0)
+    total_cost = models.DecimalField('Стоимость', max_digits=14, decimal_places=2, default=0)
+    batches_count = models.PositiveIntegerField('Партий', default=0)
+    refreshed_at = models.DateTimeField('Обновлено')
+
+    class Meta:
+        db_table = 'expiry_alerts'
+        verbose_name = 'Предупреждение о сроке годности'
+        verbose_name_plural = 'Предупреждения о сроках годности'
+        ordering = ['expiry_date', 'nomenclature']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['warehouse', 'nomenclature', 'expiry_date'],
+                name='unique_expiry_alert_per_warehouse_nomenclature_date',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'trading_point', 'expiry_date'], name='idx_expiry_alert_org_tp'),
+        ]
+
+    def __str__(self):
+        return f'{self.nomenclature_id} @ {self.warehouse_id}: {self.quantity} до {self.expiry_date}'
+
+
 class StockMovement(models.Model):
     """Движение товара (приход, списание, перемещение, инвентаризация)."""
 
@@ -222,9 +397,11 @@ class StockMovement(models.Model):
         'core.Warehouse', on_delete=models.SET_NULL, null=True, blank=True,
         related_name='movements_in', verbose_name='Склад-получатель',
     )
+    # Без FK в БД: истощённая партия может уйти в архив (apps.inventory.archive)
     batch = models.ForeignKey(
         Batch, on_delete=models.SET_NULL, null=True, blank=True,
         related_name='movements', verbose_name='Партия',
+        db_constraint=False,
     )
     sale = models.ForeignKey(
         'sales.Sale', on_delete=models.SET_NULL, null=True, blank=True,
@@ -251,6 +428,7 @@ class StockMovement(models.Model):
         indexes = [
             models.Index(fields=['organization', 'movement_type', 'sale'], name='idx_movement_org_type_sale'),
             models.Index(fields=['organization', 'nomenclature', 'created_at'], name='idx_movement_org_nom_date'),
+            models.Index(fields=['organization', '-created_at', '-id'], name='idx_movement_org_dt_id'),
         ]
 
     def __str__(self):
@@ -320,6 +498,12 @@ class InventoryItem(models.Model):
         db_table = 'inventory_items'
         verbose_name = 'Позиция инвентаризации'
         verbose_name_plural = 'Позиции инвентаризации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['document', 'nomenclature'],
+                name='unique_inventory_item_per_document_nomenclature',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Автовычисление разницы
@@ -331,6 +515,93 @@ class InventoryItem(models.Model):
         return f'{self.nomenclature.name}: ожид.={self.expected_quantity}'
 
 
+class TransferDocument(models.Model):
+    """Документ перемещения: один склад-отправитель, строки по складам-получателям."""
+
+    class Status(models.TextChoices):
+        DRAFT = 'draft', 'Черновик'
+        POSTED = 'posted', 'Проведён'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(
+        'core.Organization', on_delete=models.CASCADE,
+        related_name='transfer_documents', verbose_name='Организация',
+    )
+    number = models.PositiveIntegerField('Номер перемещения')
+    date = models.DateField('Дата перемещения')
+    warehouse_from = models.ForeignKey(
+        'core.Warehouse', on_delete=models.PROTECT,
+        related_name='transfer_documents_out', verbose_name='Склад-отправитель',
+    )
+    status = models.CharField(
+        'Статус', max_length=20, choices=Status.choices, default=Status.DRAFT,
+    )
+    comment = models.TextField('Комментарий', blank=True, default='')
+    total_cost = models.DecimalField(
+        'Себестоимость перемещения', max_digits=14, decimal_places=2, default=0,
+    )
+    created_by = models.ForeignKey(
+        'core.User', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name='Создал',
+    )
+    posted_by = models.ForeignKey(
+        'core.User', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name='Провёл',
+    )
+    posted_at = models.DateTimeField('Проведён', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transfer_documents'
+        verbose_name = 'Документ перемещения'
+        verbose_name_plural = 'Документы перемещений'
+        ordering = ['-date', '-number']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'number'],
+                name='unique_transfer_number_per_org',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Перемещение №{self.number} от {self.date}'
+
+
+class TransferDocumentItem(models.Model):
+    """Строка документа перемещения."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(
+        TransferDocument, on_delete=models.CASCADE,
+        related_name='items', verbose_name='Документ',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.PROTECT,
+        related_name='transfer_items', verbose_name='Номенклатура',
+    )
+    warehouse_to = models.ForeignKey(
+        'core.Warehouse', on_delete=models.PROTECT,
+        related_name='transfer_items_in', verbose_name='Склад-получатель',
+    )
+    quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2)
+    total = models.DecimalField('Себестоимость', max_digits=14, decimal_places=2, default=0)
+    # Партия, созданная на складе-получателе при проведении
+    batch = models.ForeignKey(
+        Batch, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='transfer_document_items', verbose_name='Партия',
+        db_constraint=False,
+    )
+
+    class Meta:
+        db_table = 'transfer_document_items'
+        verbose_name = 'Строка документа перемещения'
+        verbose_name_plural = 'Строки документов перемещений'
+        ordering = ['id']
+
+    def __str__(self):
+        return f'{self.nomenclature.name} x{self.quantity}'
+
+
 class Reserve(models.Model):
     """Резерв готового букета для клиента (кассовый сценарий)."""
 
@@ -373,6 +644,7 @@ class Reserve(models.Model):
     batch = models.ForeignKey(
         Batch, on_delete=models.SET_NULL, null=True, blank=True,
         related_name='reserves', verbose_name='Партия',
+        db_constraint=False,
     )
     warehouse = models.ForeignKey(
         'core.Warehouse', on_delete=models.PROTECT,
@@ -446,3 +718,86 @@ class BouquetBatchComponentSnapshot(models.Model):
 
     def __str__(self):
         return f'{self.nomenclature.name} x{self.quantity_per_unit} (batch={self.batch_id})'
+
+
+class ArchivedBatch(models.Model):
+    """
+    Архивная партия: истощённая (remaining = 0) давно, перенесена из batches
+    (apps.inventory.archive). Ссылки из движений и продаж сохраняют её id.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    organization = models.ForeignKey(
+        'core.Organization', on_delete=models.CASCADE,
+        related_name='archived_batches', verbose_name='Организация',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+', verbose_name='Номенклатура',
+    )
+    supplier = models.ForeignKey(
+        'suppliers.Supplier', on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+', verbose_name='Поставщик',
+    )
+    warehouse = models.ForeignKey(
+        'core.Warehouse', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+', verbose_name='Склад',
+    )
+    receipt_document = models.ForeignKey(
+        'inventory.ReceiptDocument', on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='+', verbose_name='Документ поступления',
+    )
+    purchase_price = models.DecimalField('Закупочная цена', max_digits=12, decimal_places=2)
+    quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2)
+    remaining = models.DecimalField('Остаток', max_digits=10, decimal_places=2)
+    reserved_qty = models.DecimalField('В резерве', max_digits=10, decimal_places=2, default=0)
+    arrival_date = models.DateField('Дата прихода')
+    expiry_date = models.DateField('Годен до', null=True, blank=True)
+    invoice_number = models.CharField('Номер накладной', max_length=100, blank=True, default='')
+    is_assembly = models.BooleanField('Сборка букета', default=False)
+    image = models.ImageField('Фото витринного букета', upload_to='bouquet_batches/', blank=True, null=True)
+    notes = models.TextField('Примечания', blank=True, default='')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField('Перенесена в архив')
+
+    class Meta:
+        db_table = 'batches_archive'
+        verbose_name = 'Архивная партия'
+        verbose_name_plural = 'Архивные партии'
+        ordering = ['-arrival_date']
+        indexes = [
+            models.Index(fields=['organization', 'nomenclature', 'arrival_date'], name='idx_batch_arch_org_nom_date'),
+        ]
+
+    def __str__(self):
+        return f'{self.nomenclature_id} — {self.quantity} ({self.arrival_date}, архив)'
+
+
+class ArchivedBouquetBatchComponentSnapshot(models.Model):
+    """Снимок состава архивной партии букета."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    batch = models.ForeignKey(
+        ArchivedBatch, on_delete=models.CASCADE,
+        related_name='component_snapshots', verbose_name='Партия букета',
+    )
+    nomenclature = models.ForeignKey(
+        'nomenclature.Nomenclature', on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='+', verbose_name='Номенклатура компонента',
+    )
+    accounting_type = models.CharField('Тип учёта', max_length=20, blank=True, default='stock_material')
+    quantity_per_unit = models.DecimalField('Кол-во на 1 букет', max_digits=10, decimal_places=2)
+    price_per_unit = models.DecimalField('Цена за ед.', max_digits=12, decimal_places=2, default=0)
+    sort_order = models.PositiveIntegerField('Порядок', default=0)
+    source_mode = models.CharField(
+        'Источник', max_length=20, choices=BouquetBatchComponentSnapshot.SourceMode.choices,
+        default=BouquetBatchComponentSnapshot.SourceMode.TEMPLATE,
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'bouquet_batch_component_snapshots_archive'
+        verbose_name = 'Архивный снимок состава букета'
+        verbose_name_plural = 'Архивные снимки составов букетов'
+        ordering = ['sort_order', 'id']
+
+    def __str__(self):
+        return f'{self.nomenclature_id} x{self.quantity_per_unit} (batch={self.batch_id}, архив)'
@@ -0,0 +1,203 @@
+"""
+Витрина остатков для страницы склада (StockReadModel).
+
+Страница склада и bouquet-detail читают одну плоскую таблицу вместо
+StockBalance + номенклатура + склад + партии + резервы + снимки состава.
+Строка витрины пересчитывается целиком одним INSERT ... SELECT ... ON CONFLICT
+по набору ключей:
+
+- остаток (_update_stock_balance, apply_stock_balance_deltas) и резерв букета
+  (создание, отмена, истечение, продажа) отмечают пары склад + номенклатура
+  через mark_stock_read_model_dirty; все пары транзакции пересчитываются
+  одним запросом после её коммита;
+- карточка номенклатуры (название, группа, цены, min_stock) — по всем складам
+  позиции, в той же транзакции.
+
+Что меняется в обход этих мест (переименование склада, правки в админке),
+подтягивает команда rebuild_stock_read_model.
+"""
+import logging
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.on_commit import collect_on_commit
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_SQL = """
+    INSERT INTO stock_read_model (
+        id, organization_id, warehouse_id, trading_point_id, nomenclature_id, group_id,
+        warehouse_name, nomenclature_name, group_name, accounting_type, is_active, is_listed,
+        min_stock, purchase_price, retail_price,
+        quantity, avg_purchase_price, total_cost,
+        reserved_qty, nearest_expiry, latest_batch_id, latest_batch_created_at, latest_batch,
+        updated_at
+    )
+    SELECT sb.id, sb.organization_id, sb.warehouse_id, w.trading_point_id, sb.nomenclature_id, n.group_id,
+           w.name, n.name, COALESCE(g.name, ''), n.accounting_type, n.is_active,
+           n.accounting_type <> 'service'
+               AND NOT (sb.quantity = 0 AND n.accounting_type = 'finished_bouquet'),
+           n.min_stock, n.purchase_price, n.retail_price,
+           sb.quantity, sb.avg_purchase_price, sb.total_cost,
+           sb.reserved_qty, ex.nearest_expiry, lb.id, lb.created_at,
+           CASE WHEN lb.id IS NULL THEN NULL ELSE json_build_object(
+               'arrival_date', lb.arrival_date::text,
+               'cost_price', lb.purchase_price::text,
+               'is_assembly', lb.is_assembly,
+               'image', COALESCE(lb.image, ''),
+               'notes', lb.notes,
+               'creator', COALESCE(cr.name, ''),
+               'components', COALESCE(cm.items, '[]'::json)
+           ) END,
+           %(now)s
+    FROM stock_balances sb
+    JOIN warehouses w ON w.id = sb.warehouse_id
+    JOIN nomenclatures n ON n.id = sb.nomenclature_id
+    LEFT JOIN nomenclature_groups g ON g.id = n.group_id
+    LEFT JOIN LATERAL (
+        SELECT MIN(b.expiry_date) AS nearest_expiry FROM batches b
+        WHERE b.organization_id = sb.organization_id
+          AND b.warehouse_id = sb.warehouse_id
+          AND b.nomenclature_id = sb.nomenclature_id
+          AND b.remaining > 0
+    ) ex ON true
+    LEFT JOIN LATERAL (
+        SELECT b.id, b.created_at, b.arrival_date, b.purchase_price, b.is_assembly, b.image, b.notes
+        FROM batches b
+        WHERE n.accounting_type = 'finished_bouquet'
+          AND b.organization_id = sb.organization_id
+          AND b.warehouse_id = sb.warehouse_id
+          AND b.nomenclature_id = sb.nomenclature_id
+          AND b.remaining > 0
+        ORDER BY b.created_at DESC
+        LIMIT 1
+    ) lb ON true
+    LEFT JOIN LATERAL (
+        SELECT COALESCE(NULLIF(TRIM(u.first_name || ' ' || u.last_name), ''), u.username, '') AS name
+        FROM stock_movements m
+        LEFT JOIN users u ON u.id = m.user_id
+        WHERE m.batch_id = lb.id AND m.movement_type IN ('assembly', 'receipt')
+        ORDER BY m.created_at
+        LIMIT 1
+    ) cr ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'nomenclature_id', s.nomenclature_id::text,
+            'nomenclature_name', cn.name,
+            'quantity', s.quantity_per_unit::text,
+            'price', s.price_per_unit::text,
+            'accounting_type', s.accounting_type,
+            'source_mode', s.source_mode
+        ) ORDER BY s.sort_order) AS items
+        FROM bouquet_batch_component_snapshots s
+        JOIN nomenclatures cn ON cn.id = s.nomenclature_id
+        WHERE s.batch_id = lb.id
+    ) cm ON true
+    WHERE {where}
+    ON CONFLICT (id) DO UPDATE SET
+        trading_point_id = EXCLUDED.trading_point_id,
+        group_id = EXCLUDED.group_id,
+        warehouse_name = EXCLUDED.warehouse_name,
+        nomenclature_name = EXCLUDED.nomenclature_name,
+        group_name = EXCLUDED.group_name,
+        accounting_type = EXCLUDED.accounting_type,
+        is_active = EXCLUDED.is_active,
+        is_listed = EXCLUDED.is_listed,
+        min_stock = EXCLUDED.min_stock,
+        purchase_price = EXCLUDED.purchase_price,
+        retail_price = EXCLUDED.retail_price,
+        quantity = EXCLUDED.quantity,
+        avg_purchase_price = EXCLUDED.avg_purchase_price,
+        total_cost = EXCLUDED.total_cost,
+        reserved_qty = EXCLUDED.reserved_qty,
+        nearest_expiry = EXCLUDED.nearest_expiry,
+        latest_batch_id = EXCLUDED.latest_batch_id,
+        latest_batch_created_at = EXCLUDED.latest_batch_created_at,
+        latest_batch = EXCLUDED.latest_batch,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def _refresh(where, params):
+    params = dict(params, now=timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(_REFRESH_SQL.format(where=where), params)
+        return cursor.rowcount
+
+
+def refresh_stock_read_model(keys):
+    """
+    Пересчитать строки витрины по парам (склад, номенклатура).
+    Пары без остатка (строка StockBalance удалена) из витрины убираются.
+    """
+    keys = {(str(warehouse_id), str(nomenclature_id)) for warehouse_id, nomenclature_id in keys}
+    if not keys:
+        return 0
+    warehouse_ids = [key[0] for key in keys]
+    nomenclature_ids = [key[1] for key in keys]
+    params = {'warehouses': warehouse_ids, 'nomenclatures': nomenclature_ids}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM stock_read_model rm
+            USING unnest(%(warehouses)s::uuid[], %(nomenclatures)s::uuid[]) AS k(warehouse_id, nomenclature_id)
+            WHERE rm.warehouse_id = k.warehouse_id
+              AND rm.nomenclature_id = k.nomenclature_id
+              AND NOT EXISTS (SELECT 1 FROM stock_balances sb WHERE sb.id = rm.id)
+            """,
+            params,
+        )
+    return _refresh(
+        """(sb.warehouse_id, sb.nomenclature_id) IN (
+            SELECT * FROM unnest(%(warehouses)s::uuid[], %(nomenclatures)s::uuid[])
+        )""",
+        params,
+    )
+
+
+def mark_stock_read_model_dirty(keys):
+    """
+    Отметить пары (склад, номенклатура) для пересчёта витрины. Пересчёт —
+    один refresh_stock_read_model на все пары транзакции после её коммита.
+    """
+    collect_on_commit(
+        _flush_dirty_stock_read_model,
+        ((str(warehouse_id), str(nomenclature_id)) for warehouse_id, nomenclature_id in keys),
+    )
+
+
+def _flush_dirty_stock_read_model(dirty):
+    if not dirty:
+        return
+    try:
+        with transaction.atomic():
+            refresh_stock_read_model(dirty)
+    except Exception:  # витрина не должна ломать складские операции
+        logger.exception('Не удалось обновить витрину остатков, нужен rebuild_stock_read_model')
+
+
+def refresh_stock_read_model_for_nomenclatures(nomenclature_ids):
+    """Пересчитать витрину по всем складам позиций (изменилась карточка номенклатуры)."""
+    nomenclature_ids = [str(pk) for pk in set(nomenclature_ids)]
+    if not nomenclature_ids:
+        return 0
+    return _refresh('sb.nomenclature_id = ANY(%(nomenclatures)s::uuid[])', {'nomenclatures': nomenclature_ids})
+
+
+def rebuild_stock_read_model(organization_id=None):
+    """Полная перестройка витрины (организации или всей БД). Возвращает число строк."""
+    if organization_id:
+        where, params = 'sb.organization_id = %(organization)s', {'organization': str(organization_id)}
+    else:
+        where, params = 'TRUE', {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM stock_read_model rm
+            WHERE {'rm.organization_id = %(organization)s AND' if organization_id else ''}
+                  NOT EXISTS (SELECT 1 FROM stock_balances sb WHERE sb.id = rm.id)
+            """,
+            params,
+        )
+    return _refresh(where, params)
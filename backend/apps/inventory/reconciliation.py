@@ -0,0 +1,174 @@
+"""
+Сверка складских остатков с партиями и журналом движений.
+
+Для каждой пары склад + номенклатура сравниваются три источника:
+- StockBalance.quantity — учётный остаток;
+- Σ StockMovement (приход на склад − расход со склада) — replay журнала;
+- Σ Batch.remaining — остаток по живым партиям.
+
+Эталоном количества считается журнал движений: продажа в минус
+(do_sale_fifo_write_off) пишет движение без партии, поэтому партии при
+отрицательном остатке расходятся с балансом ожидаемо, а журнал — нет.
+
+Все три источника агрегируются в БД (GROUP BY nomenclature_id), читаются
+серверными курсорами (.iterator) в порядке nomenclature_id и сливаются
+потоково — в памяти держится только текущая позиция. Склад сверяется в одной
+транзакции REPEATABLE READ, чтобы три запроса видели один снимок данных.
+"""
+import heapq
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import connection, connections, transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+
+from .models import Batch, StockBalance, StockMovement
+
+ZERO = Decimal('0')
+
+
+@dataclass
+class StockDiff:
+    organization_id: object
+    warehouse_id: object
+    nomenclature_id: object
+    balance_qty: Decimal
+    movements_qty: Decimal
+    batches_qty: Decimal
+
+    @property
+    def ledger_delta(self):
+        """Насколько журнал движений расходится с учётным остатком."""
+        return self.movements_qty - self.balance_qty
+
+    @property
+    def batches_delta(self):
+        """Насколько партии расходятся с неотрицательной частью остатка."""
+        return self.batches_qty - max(self.balance_qty, ZERO)
+
+    def as_row(self):
+        return {
+            'organization_id': str(self.organization_id),
+            'warehouse_id': str(self.warehouse_id),
+            'nomenclature_id': str(self.nomenclature_id),
+            'balance_qty': str(self.balance_qty),
+            'movements_qty': str(self.movements_qty),
+            'batches_qty': str(self.batches_qty),
+            'ledger_delta': str(self.ledger_delta),
+            'batches_delta': str(self.batches_delta),
+        }
+
+
+def _balance_stream(warehouse_id, chunk_size):
+    rows = StockBalance.objects.filter(warehouse_id=warehouse_id).order_by(
+        'nomenclature_id',
+    ).values_list('nomenclature_id', 'organization_id', 'quantity')
+    for nomenclature_id, organization_id, quantity in rows.iterator(chunk_size=chunk_size):
+        yield nomenclature_id, 0, (organization_id, quantity)
+
+
+def _movement_stream(warehouse_id, chunk_size):
+    signed = Case(
+        When(warehouse_to_id=warehouse_id, warehouse_from_id=warehouse_id, then=Value(ZERO)),
+        When(warehouse_to_id=warehouse_id, then=F('quantity')),
+        default=-F('quantity'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    rows = StockMovement.objects.filter(
+        Q(warehouse_to_id=warehouse_id) | Q(warehouse_from_id=warehouse_id),
+    ).values('nomenclature_id', 'organization_id').annotate(
+        total=Sum(signed),
+    ).order_by('nomenclature_id').values_list('nomenclature_id', 'organization_id', 'total')
+    for nomenclature_id, organization_id, total in rows.iterator(chunk_size=chunk_size):
+        yield nomenclature_id, 1, (organization_id, total or ZERO)
+
+
+def _batch_stream(warehouse_id, chunk_size):
+    rows = Batch.objects.filter(
+        warehouse_id=warehouse_id, remaining__gt=0,
+    ).values('nomenclature_id', 'organization_id').annotate(
+        total=Sum('remaining'),
+    ).order_by('nomenclature_id').values_list('nomenclature_id', 'organization_id', 'total')
+    for nomenclature_id, organization_id, total in rows.iterator(chunk_size=chunk_size):
+        yield nomenclature_id, 2, (organization_id, total or ZERO)
+
+
+def iter_warehouse_diffs(warehouse_id, chunk_size=2000):
+    """Потоковое слияние трёх отсортированных агрегатов; отдаёт только расхождения."""
+    merged = heapq.merge(
+        _balance_stream(warehouse_id, chunk_size),
+        _movement_stream(warehouse_id, chunk_size),
+        _batch_stream(warehouse_id, chunk_size),
+        key=lambda row: (row[0].int, row[1]),
+    )
+    for nomenclature_id, rows in groupby(merged, key=lambda row: row[0]):
+        values = [ZERO, ZERO, ZERO]
+        organization_id = None
+        for _, source, (org_id, value) in rows:
+            values[source] = value
+            organization_id = org_id
+        diff = StockDiff(organization_id, warehouse_id, nomenclature_id, *values)
+        if diff.ledger_delta or diff.batches_delta:
+            yield diff
+
+
+def reconcile_warehouse(warehouse_id, repair=False, chunk_size=2000):
+    """
+    Сверить один склад. Возвращает список расхождений (dict).
+
+    repair=True — довести StockBalance.quantity до replay журнала. Исправление
+    применяется дельтой (apply_stock_balance_deltas, как в stock_ledger), поэтому не затирает
+    изменения, закоммиченные параллельно после снимка.
+    """
+    from .ledger import apply_stock_balance_deltas
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        diffs = list(iter_warehouse_diffs(warehouse_id, chunk_size))
+
+    if repair:
+        with transaction.atomic():
+            apply_stock_balance_deltas([
+                (diff.organization_id, diff.warehouse_id, diff.nomenclature_id, diff.ledger_delta, ZERO)
+                for diff in diffs if diff.ledger_delta
+            ])
+
+    return [diff.as_row() for diff in diffs]
+
+
+def _reconcile_worker(args):
+    """Задача пула: своё соединение с БД на процесс, закрывается после склада."""
+    warehouse_id, repair, chunk_size = args
+    try:
+        return warehouse_id, reconcile_warehouse(warehouse_id, repair, chunk_size)
+    finally:
+        connections.close_all()
+
+
+def reconcile_warehouses(warehouse_ids, repair=False, workers=1, chunk_size=2000):
+    """
+    Сверить набор складов; при workers > 1 — в пуле процессов (по складу на задачу).
+    Отдаёт пары (warehouse_id, [расхождения]) по мере готовности.
+    """
+    warehouse_ids = list(warehouse_ids)
+    if workers <= 1 or len(warehouse_ids) <= 1:
+        for warehouse_id in warehouse_ids:
+            yield warehouse_id, reconcile_warehouse(warehouse_id, repair, chunk_size)
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    # Дочерние процессы не должны разделять сокет соединения родителя
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+    ) as pool:
+        futures = [
+            pool.submit(_reconcile_worker, (warehouse_id, repair, chunk_size))
+            for warehouse_id in warehouse_ids
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,8 +1,11 @@
+from decimal import Decimal
+from django.db import transaction
 from django.db.models import Max
 from rest_framework import serializers
 from .models import (
     Batch, StockBalance, StockMovement, InventoryDocument, InventoryItem,
-    Reserve, ReceiptDocument, ReceiptDocumentItem,
+    Reserve, ReceiptDocument, ReceiptDocumentItem, ExpiryAlert, StockReadModel,
+    TransferDocument, TransferDocumentItem,
 )
 
 
@@ -19,7 +22,7 @@ class BatchSerializer(serializers.ModelSerializer):
     class Meta:
         model = Batch
         fields = '__all__'
-        read_only_fields = ['organization']
+        read_only_fields = ['organization', 'reserved_qty']
 
 
 class StockBalanceSerializer(serializers.ModelSerializer):
@@ -32,7 +35,21 @@ class StockBalanceSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockBalance
         fields = '__all__'
-        read_only_fields = ['organization']
+        read_only_fields = ['organization', 'reserved_qty']
+
+
+class StockReadModelSerializer(serializers.ModelSerializer):
+    """Строка страницы склада из витрины: поля StockBalanceSerializer + группа, резерв, срок годности."""
+
+    class Meta:
+        model = StockReadModel
+        fields = [
+            'id', 'organization', 'warehouse', 'nomenclature', 'quantity', 'avg_purchase_price',
+            'total_cost', 'updated_at', 'nomenclature_name', 'warehouse_name', 'purchase_price',
+            'retail_price', 'accounting_type', 'trading_point', 'group', 'group_name', 'min_stock',
+            'reserved_qty', 'nearest_expiry',
+        ]
+        read_only_fields = fields
 
 
 class StockMovementSerializer(serializers.ModelSerializer):
@@ -51,6 +68,45 @@ class StockMovementSerializer(serializers.ModelSerializer):
         read_only_fields = ['organization']
 
 
+class WriteOffLineSerializer(serializers.Serializer):
+    """Строка пакетного списания (склад и номенклатура — id, объекты подгружаются пакетом)."""
+    warehouse = serializers.UUIDField()
+    nomenclature = serializers.UUIDField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    reason = serializers.ChoiceField(
+        choices=StockMovement.WriteOffReason.choices, default=StockMovement.WriteOffReason.OTHER,
+    )
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BulkWriteOffSerializer(serializers.Serializer):
+    lines = WriteOffLineSerializer(many=True, allow_empty=False)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class AssemblyOverrideSerializer(serializers.Serializer):
+    """Переопределение компонента шаблона: количество на букет и/или склад списания."""
+    nomenclature = serializers.UUIDField()
+    quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    warehouse = serializers.UUIDField(required=False, allow_null=True)
+
+
+class BatchAssemblyItemSerializer(serializers.Serializer):
+    template = serializers.UUIDField()
+    quantity = serializers.IntegerField(min_value=1)
+    components = AssemblyOverrideSerializer(many=True, required=False, default=list)
+    warehouse_from = serializers.UUIDField(required=False, allow_null=True)
+    warehouse_to = serializers.UUIDField(required=False, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BatchAssemblySerializer(serializers.Serializer):
+    warehouse_from = serializers.UUIDField()
+    warehouse_to = serializers.UUIDField()
+    items = BatchAssemblyItemSerializer(many=True, allow_empty=False)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
 class InventoryItemSerializer(serializers.ModelSerializer):
     nomenclature_name = serializers.CharField(source='nomenclature.name', read_only=True)
 
@@ -120,3 +176,118 @@ class ReceiptDocumentSerializer(serializers.ModelSerializer):
             for item_data in items_data:
                 ReceiptDocumentItem.objects.create(document=instance, **item_data)
         return instance
+
+
+class TransferDocumentItemSerializer(serializers.ModelSerializer):
+    nomenclature_name = serializers.CharField(source='nomenclature.name', read_only=True)
+    warehouse_to_name = serializers.CharField(source='warehouse_to.name', read_only=True, default='')
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Количество должно быть больше нуля.')
+        return value
+
+    def validate_nomenclature(self, value):
+        if getattr(value, 'accounting_type', '') == 'service':
+            raise serializers.ValidationError('Услуги не участвуют в складском учёте.')
+        return value
+
+    class Meta:
+        model = TransferDocumentItem
+        fields = '__all__'
+        read_only_fields = ['batch', 'total', 'document']
+
+
+class TransferDocumentSerializer(serializers.ModelSerializer):
+    items = TransferDocumentItemSerializer(many=True, required=False)
+    warehouse_from_name = serializers.CharField(source='warehouse_from.name', read_only=True, default='')
+
+    class Meta:
+        model = TransferDocument
+        fields = '__all__'
+        read_only_fields = ['organization', 'status', 'total_cost', 'created_by', 'posted_by', 'posted_at']
+        extra_kwargs = {
+            'number': {'required': False},
+        }
+
+    def validate(self, attrs):
+        if self.instance is not None and self.instance.status != TransferDocument.Status.DRAFT:
+            raise serializers.ValidationError({'detail': 'Проведённый документ нельзя изменить.'})
+        if self.instance is not None:
+            organization_id = self.instance.organization_id
+        else:
+            from apps.core.mixins import _resolve_org
+            request = self.context.get('request')
+            organization = _resolve_org(request.user) if request else None
+            if organization is None:
+                raise serializers.ValidationError({'detail': 'Не задана организация.'})
+            organization_id = organization.pk
+
+        warehouse_from = attrs.get('warehouse_from') or getattr(self.instance, 'warehouse_from', None)
+        if warehouse_from is not None and warehouse_from.organization_id != organization_id:
+            raise serializers.ValidationError({'warehouse_from': 'Склад принадлежит другой организации.'})
+        for item in attrs.get('items') or []:
+            if item['warehouse_to'].organization_id != organization_id:
+                raise serializers.ValidationError({'items': 'Склад-получатель принадлежит другой организации.'})
+            if item['nomenclature'].organization_id != organization_id:
+                raise serializers.ValidationError({'items': 'Номенклатура принадлежит другой организации.'})
+            if item['warehouse_to'] == warehouse_from:
+                raise serializers.ValidationError(
+                    {'items': f'"{item["nomenclature"].name}": склад-получатель совпадает с отправителем.'},
+                )
+        if 'items' not in attrs and self.instance is not None and 'warehouse_from' in attrs:
+            # Меняется только отправитель — сверяем его с уже сохранёнными строками
+            clash = (
+                self.instance.items.filter(warehouse_to=warehouse_from)
+                .select_related('nomenclature').first()
+            )
+            if clash is not None:
+                raise serializers.ValidationError(
+                    {'warehouse_from': f'"{clash.nomenclature.name}": склад-получатель совпадает с отправителем.'},
+                )
+        return attrs
+
+    def _next_number(self, organization):
+        # Номер — MAX + 1 под блокировкой строки организации, как у чеков и заказов
+        from apps.sales.services import lock_organization_row
+        lock_organization_row(organization.pk)
+        return (TransferDocument.objects.filter(organization=organization).aggregate(mx=Max('number'))['mx'] or 0) + 1
+
+    def _save_items(self, document, items_data):
+        TransferDocumentItem.objects.bulk_create([
+            TransferDocumentItem(document=document, **item_data) for item_data in items_data
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        items_data = validated_data.pop('items', [])
+        if not validated_data.get('number'):
+            validated_data['number'] = self._next_number(validated_data['organization'])
+        doc = TransferDocument.objects.create(**validated_data)
+        self._save_items(doc, items_data)
+        return doc
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        items_data = validated_data.pop('items', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save()
+        if items_data is not None:
+            instance.items.all().delete()
+            self._save_items(instance, items_data)
+        return instance
+
+
+class ExpiryAlertSerializer(serializers.ModelSerializer):
+    nomenclature_name = serializers.CharField(source='nomenclature.name', read_only=True)
+    warehouse_name = serializers.CharField(source='warehouse.name', read_only=True)
+
+    class Meta:
+        model = ExpiryAlert
+        fields = [
+            'id', 'trading_point', 'warehouse', 'warehouse_name',
+            'nomenclature', 'nomenclature_name', 'expiry_date',
+            'quantity', 'total_cost', 'batches_count', 'refreshed_at',
+        ]
+        read_only_fields = fields
@@ -3,10 +3,26 @@
 
 Основные операции:
 - FIFO-списание (fifo_write_off) — списание товара с самых старых партий
+- Пакетное FIFO-списание (fifo_write_off_many) — все строки продажи/сборки за один проход
 - Приход товара (process_batch_receipt) — создание партии + движение + остатки
+- Пакетный приход (process_batch_receipts) — вся поставка через bulk_create
+- Закупочная цена (recompute_purchase_prices) — отложенный групповой пересчёт после коммита
 - Сборка букета (assemble_bouquet) — списание компонентов + оприходование букета
+- Пакетная сборка витрины (assemble_bouquets) — несколько шаблонов одним FIFO-проходом и bulk_create
 - Раскомплектовка букета (disassemble_bouquet) — списание букета + возврат/списание компонентов
 - Списание товара (write_off_stock) — ручное списание с FIFO
+- Пакетное списание (write_off_stock_many) — много строк одним FIFO-проходом и пакетной записью
+- Документ перемещения (post_transfer_document) — все строки одним FIFO-проходом и bulk_create
+- Резервы (reserve_stock_keys / lock_reserve / shift_reserved_qty) — счётчики reserved_qty партий и остатков
+- Доступно к обещанию (available_to_promise) — остаток − резерв − спрос открытых заказов
+- Инвентаризация (seed_inventory_document / apply_inventory_counts / post_inventory_document)
+
+Журнал транзакции (ledger.stock_ledger) копит движения и дельты остатков
+и сбрасывает их пакетом: bulk_create + один upsert на пару склад + номенклатура.
+
+Операции берут блокировки всех своих пар склад + номенклатура заранее и
+в одном порядке (locks.lock_stock) и повторяются при взаимной блокировке
+(locks.retry_on_conflict).
 """
 
 from collections import defaultdict
@@ -14,6 +30,14 @@ from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
 
+from apps.core.on_commit import collect_on_commit
+
+from .batches import bulk_create_batches, create_batch
+from .ledger import get_active_ledger, record_movements, stock_ledger
+from .locks import lock_stock, retry_on_conflict
+from .read_model import mark_stock_read_model_dirty, refresh_stock_read_model_for_nomenclatures
+from .stock_alerts import mark_stock_alerts_dirty
+from .summary_cache import mark_stock_summary_dirty
 from .models import Batch, StockBalance, StockMovement
 
 
@@ -77,10 +101,45 @@ def build_stock_summary(organization, trading_point_id=None, warehouse_id=None):
     } for value in groups.values()]
 
 
-def _update_stock_balance(organization, warehouse, nomenclature, qty_delta: Decimal):
-    """Обновить (или создать) StockBalance по складу + номенклатуре."""
+def _fifo_cost(fifo_result):
+    """Себестоимость списанных партий: Σ qty × price по результату FIFO."""
+    return sum((r['qty'] * r['price'] for r in fifo_result), Decimal('0'))
+
+
+def _batches_cost_aggregate(organization, warehouse, nomenclature):
+    """Эталонная стоимость остатка по живым партиям (используется для сверки)."""
     from django.db.models import Sum, F
 
+    agg = Batch.objects.filter(
+        organization=organization,
+        warehouse=warehouse,
+        nomenclature=nomenclature,
+        remaining__gt=0,
+    ).aggregate(
+        total_remaining=Sum('remaining'),
+        total_cost=Sum(F('remaining') * F('purchase_price')),
+    )
+    return agg['total_remaining'] or Decimal('0'), agg['total_cost'] or Decimal('0')
+
+
+def _update_stock_balance(organization, warehouse, nomenclature, qty_delta: Decimal, cost_delta=None):
+    """
+    Обновить (или создать) StockBalance по складу + номенклатуре.
+
+    cost_delta — изменение стоимости остатка (Σ remaining × purchase_price партий):
+    + стоимость прихода/возврата, − себестоимость списанных по FIFO партий.
+    Средняя закупочная считается за O(1) как total_cost / quantity.
+    Если cost_delta не передан — стоимость пересчитывается агрегатом по партиям.
+
+    Внутри stock_ledger() дельта только копится в журнале и применяется
+    одним upsert при сбросе журнала (возвращается None).
+    """
+    ledger = get_active_ledger()
+    if ledger is not None:
+        ledger.add_balance_delta(organization, warehouse, nomenclature, qty_delta, cost_delta)
+        return None
+
+    lock_stock([(warehouse, nomenclature)])
     # select_for_update предотвращает race condition при параллельных запросах
     # P3-MEDIUM: Обработка race condition при параллельном создании StockBalance
     from django.db import IntegrityError as DjangoIntegrityError
@@ -113,23 +172,124 @@ def _update_stock_balance(organization, warehouse, nomenclature, qty_delta: Deci
             )
     sb.quantity += qty_delta
 
-    # Пересчитываем среднюю закупочную через DB aggregate (вместо Python-loop)
-    agg = Batch.objects.filter(
-        organization=organization,
-        warehouse=warehouse,
-        nomenclature=nomenclature,
-        remaining__gt=0,
-    ).aggregate(
-        total_remaining=Sum('remaining'),
-        total_cost=Sum(F('remaining') * F('purchase_price')),
-    )
-    total_remaining = agg['total_remaining'] or Decimal('0')
-    if total_remaining > 0:
-        sb.avg_purchase_price = (agg['total_cost'] or Decimal('0')) / total_remaining
+    if cost_delta is None:
+        _, sb.total_cost = _batches_cost_aggregate(organization, warehouse, nomenclature)
+    else:
+        sb.total_cost = max(sb.total_cost + Decimal(str(cost_delta)), Decimal('0'))
+
+    # Средняя закупочная — по накопленной стоимости (без агрегата по партиям).
+    # При нулевом/отрицательном остатке сохраняем последнюю известную цену.
+    if sb.quantity > 0 and sb.total_cost > 0:
+        sb.avg_purchase_price = sb.total_cost / sb.quantity
     sb.save()
+    mark_stock_read_model_dirty([(sb.warehouse_id, sb.nomenclature_id)])
+    keys = [(sb.organization_id, sb.warehouse_id, sb.nomenclature_id)]
+    mark_stock_alerts_dirty(keys)
+    mark_stock_summary_dirty(keys)
     return sb
 
 
+def fifo_queue(organization, keys):
+    """
+    Очередь живых партий в порядке FIFO для пар (warehouse_id, nomenclature_id).
+
+    Условие и сортировка совпадают с частичным индексом idx_batch_fifo_live
+    (remaining > 0; organization, warehouse, nomenclature, arrival_date, created_at, id).
+    """
+    from django.db.models import Q
+
+    key_filter = Q()
+    for warehouse_id, nomenclature_id in keys:
+        key_filter |= Q(warehouse_id=warehouse_id, nomenclature_id=nomenclature_id)
+
+    return (
+        Batch.objects.filter(key_filter, organization=organization, remaining__gt=0)
+        .order_by('warehouse_id', 'nomenclature_id', 'arrival_date', 'created_at', 'id')
+    )
+
+
+@retry_on_conflict
+@transaction.atomic
+def fifo_write_off_many(organization, lines, user=None, allow_shortage=False):
+    """
+    Пакетное FIFO-списание по нескольким строкам (продажа, сборка букета).
+
+    lines: [{'warehouse': Warehouse, 'nomenclature': Nomenclature, 'quantity': Decimal}, ...]
+
+    Все партии-кандидаты блокируются одним упорядоченным SELECT ... FOR UPDATE
+    (порядок склад → номенклатура → FIFO детерминирован, что исключает взаимные
+    блокировки между параллельными чеками), распределение идёт в памяти,
+    остатки партий записываются одним bulk_update.
+
+    Возвращает список результатов в порядке строк; каждый результат —
+    [{'batch': Batch, 'qty': Decimal, 'price': Decimal}, ...] (как у fifo_write_off).
+    Несколько строк по одной паре склад + номенклатура списываются последовательно.
+
+    allow_shortage=False — при нехватке бросает InsufficientStockError до любых изменений.
+    allow_shortage=True — строка получает столько, сколько осталось
+    (дефицит = quantity − сумма qty), решение о продаже в минус принимает вызывающий код.
+    """
+    from collections import deque
+
+    demand = {}
+    for line in lines:
+        qty = Decimal(str(line['quantity']))
+        if qty <= 0:
+            continue
+        key = (line['warehouse'].pk, line['nomenclature'].pk)
+        if key in demand:
+            demand[key]['quantity'] += qty
+        else:
+            demand[key] = {'nomenclature': line['nomenclature'], 'quantity': qty}
+
+    if not demand:
+        return [[] for _ in lines]
+
+    lock_stock(demand)
+    batches = fifo_queue(organization, demand).select_for_update()
+    queues = defaultdict(deque)
+    for batch in batches:
+        queues[(batch.warehouse_id, batch.nomenclature_id)].append(batch)
+
+    if not allow_shortage:
+        for key, need in demand.items():
+            total_available = sum((b.remaining for b in queues[key]), Decimal('0'))
+            if total_available < need['quantity']:
+                raise InsufficientStockError(
+                    nomenclature_name=need['nomenclature'].name,
+                    requested=need['quantity'],
+                    available=total_available,
+                )
+
+    results = []
+    touched = {}
+    for line in lines:
+        qty = Decimal(str(line['quantity']))
+        queue = queues[(line['warehouse'].pk, line['nomenclature'].pk)]
+        result = []
+        remaining_to_write_off = qty
+        while queue and remaining_to_write_off > 0:
+            batch = queue[0]
+            take = min(batch.remaining, remaining_to_write_off)
+            batch.remaining -= take
+            touched[batch.pk] = batch
+            result.append({
+                'batch': batch,
+                'qty': take,
+                'price': batch.purchase_price,
+            })
+            remaining_to_write_off -= take
+            if batch.remaining <= 0:
+                queue.popleft()
+        results.append(result)
+
+    if touched:
+        Batch.objects.bulk_update(list(touched.values()), ['remaining'])
+
+    return results
+
+
+@retry_on_conflict
 @transaction.atomic
 def fifo_write_off(organization, warehouse, nomenclature, quantity: Decimal, user=None):
     """
@@ -140,45 +300,80 @@ def fifo_write_off(organization, warehouse, nomenclature, quantity: Decimal, use
     
     ВАЖНО: функция должна вызываться внутри транзакции или сама создаёт атомарную транзакцию.
     select_for_update() блокирует строки до завершения транзакции.
+    Для нескольких позиций используйте fifo_write_off_many.
     """
-    batches = (
-        Batch.objects.filter(
-            organization=organization,
-            warehouse=warehouse,
-            nomenclature=nomenclature,
-            remaining__gt=0,
+    return fifo_write_off_many(
+        organization,
+        [{'warehouse': warehouse, 'nomenclature': nomenclature, 'quantity': quantity}],
+        user=user,
+    )[0]
+
+
+def recompute_purchase_prices(nomenclature_ids):
+    """
+    Пересчитать Nomenclature.purchase_price для набора позиций.
+
+    Цена — средневзвешенная по живым партиям (Σ remaining × price / Σ remaining),
+    считается одним GROUP BY nomenclature_id. Для позиций без остатка берётся
+    цена последней партии; позиции без партий не меняются.
+    Возвращает количество обновлённых позиций.
+    """
+    from django.db.models import Sum, F as DbF
+    from apps.nomenclature.models import Nomenclature
+
+    nomenclature_ids = list(nomenclature_ids)
+    if not nomenclature_ids:
+        return 0
+
+    prices = {
+        row['nomenclature_id']: row['total_cost'] / row['total_remaining']
+        for row in Batch.objects.filter(
+            nomenclature_id__in=nomenclature_ids, remaining__gt=0,
+        ).values('nomenclature_id').annotate(
+            total_remaining=Sum('remaining'),
+            total_cost=Sum(DbF('remaining') * DbF('purchase_price')),
         )
-        .order_by('arrival_date', 'created_at')
-        .select_for_update()
+    }
+
+    missing = [pk for pk in nomenclature_ids if pk not in prices]
+    if missing:
+        last_batches = Batch.objects.filter(
+            nomenclature_id__in=missing,
+        ).order_by(
+            'nomenclature_id', '-arrival_date', '-created_at',
+        ).distinct('nomenclature_id').values_list('nomenclature_id', 'purchase_price')
+        prices.update(last_batches)
+
+    Nomenclature.objects.bulk_update(
+        [Nomenclature(pk=pk, purchase_price=price) for pk, price in prices.items()],
+        ['purchase_price'],
     )
+    refresh_stock_read_model_for_nomenclatures(prices)
+    return len(prices)
 
-    total_available = sum(b.remaining for b in batches)
-    if total_available < quantity:
-        raise InsufficientStockError(
-            nomenclature_name=nomenclature.name,
-            requested=quantity,
-            available=total_available,
-        )
 
-    result = []
-    remaining_to_write_off = quantity
+def mark_purchase_price_dirty(nomenclature_ids):
+    """
+    Отложенный пересчёт закупочной цены: позиции копятся до коммита
+    транзакции и пересчитываются одним запросом (или задачей Celery,
+    если PURCHASE_PRICE_RECOMPUTE_ASYNC).
+    """
+    collect_on_commit(_flush_dirty_purchase_prices, nomenclature_ids)
 
-    for batch in batches:
-        if remaining_to_write_off <= 0:
-            break
-        take = min(batch.remaining, remaining_to_write_off)
-        batch.remaining -= take
-        batch.save(update_fields=['remaining'])
-        result.append({
-            'batch': batch,
-            'qty': take,
-            'price': batch.purchase_price,
-        })
-        remaining_to_write_off -= take
 
-    return result
+def _flush_dirty_purchase_prices(dirty):
+    if not dirty:
+        return
+
+    from django.conf import settings
+    if getattr(settings, 'PURCHASE_PRICE_RECOMPUTE_ASYNC', False):
+        from .tasks import recompute_purchase_prices_task
+        recompute_purchase_prices_task.delay([str(pk) for pk in dirty])
+    else:
+        recompute_purchase_prices(dirty)
 
 
+@retry_on_conflict
 @transaction.atomic
 def process_batch_receipt(
     organization, warehouse, nomenclature, supplier,
@@ -190,95 +385,163 @@ def process_batch_receipt(
     Оприходование партии товара.
     Создаёт Batch + StockMovement(receipt) + обновляет StockBalance.
     """
-    if getattr(nomenclature, 'accounting_type', '') == 'service':
-        raise ValueError('Услуги нельзя проводить через поступления.')
-
-    if arrival_date is None:
-        arrival_date = timezone.now().date()
-
-    batch = Batch.objects.create(
-        organization=organization,
-        nomenclature=nomenclature,
+    return process_batch_receipts(
+        organization,
+        [{
+            'warehouse': warehouse,
+            'nomenclature': nomenclature,
+            'quantity': quantity,
+            'purchase_price': purchase_price,
+            'expiry_date': expiry_date,
+            'notes': notes,
+        }],
         supplier=supplier,
-        warehouse=warehouse,
-        purchase_price=purchase_price,
-        quantity=quantity,
-        remaining=quantity,
         arrival_date=arrival_date,
-        expiry_date=expiry_date,
         invoice_number=invoice_number,
-        notes=notes,
-    )
-
-    StockMovement.objects.create(
-        organization=organization,
-        nomenclature=nomenclature,
-        movement_type=StockMovement.MovementType.RECEIPT,
-        warehouse_to=warehouse,
-        batch=batch,
-        quantity=quantity,
-        price=purchase_price,
         user=user,
-        notes=f'Приход партии: {invoice_number}' if invoice_number else 'Приход партии',
-    )
+        create_debt=create_debt,
+    )[0]
 
-    _update_stock_balance(organization, warehouse, nomenclature, quantity)
 
-    # Обновляем цену в справочнике номенклатуры (средневзвешенная по всем остаткам)
-    from django.db.models import Sum, F as DbF
-    agg = Batch.objects.filter(
-        nomenclature=nomenclature,
-        remaining__gt=0,
-    ).aggregate(
-        total_remaining=Sum('remaining'),
-        total_cost=Sum(DbF('remaining') * DbF('purchase_price')),
-    )
-    total_rem = agg['total_remaining'] or Decimal('0')
-    if total_rem > 0:
-        nomenclature.purchase_price = (agg['total_cost'] or Decimal('0')) / total_rem
-    else:
-        nomenclature.purchase_price = purchase_price
-    nomenclature.save(update_fields=['purchase_price'])
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def process_batch_receipts(
+    organization, lines, supplier=None,
+    arrival_date=None, invoice_number='', user=None,
+    create_debt=True, receipt_document=None,
+):
+    """
+    Пакетное оприходование: одна поставка из многих строк.
+
+    lines = [{
+        'warehouse': Warehouse,
+        'nomenclature': Nomenclature,
+        'quantity': Decimal,
+        'purchase_price': Decimal,
+        'expiry_date': date|None,
+        'notes': str,
+    }]
 
-    # Создаём запись истории закупочных цен
+    Партии, движения, история цен и долги создаются через bulk_create,
+    цены поставщика — одним запросом на чтение + bulk_create/bulk_update,
+    закупочная цена номенклатуры помечается к пересчёту после коммита
+    (mark_purchase_price_dirty). Возвращает список партий в порядке строк.
+    """
     from apps.nomenclature.models import PurchasePriceHistory
-    PurchasePriceHistory.objects.create(
-        nomenclature=nomenclature,
-        purchase_price=purchase_price,
-        source=f'Приход: {invoice_number}' if invoice_number else 'Приход партии',
-    )
 
-    # Обновляем цену у поставщика (если указан)
-    if supplier:
-        from apps.suppliers.models import SupplierNomenclature
-        sn, _ = SupplierNomenclature.objects.get_or_create(
-            supplier=supplier,
+    for line in lines:
+        if getattr(line['nomenclature'], 'accounting_type', '') == 'service':
+            raise ValueError('Услуги нельзя проводить через поступления.')
+
+    if arrival_date is None:
+        arrival_date = timezone.now().date()
+
+    lock_stock((line['warehouse'], line['nomenclature']) for line in lines)
+    batches = []
+    for line in lines:
+        nomenclature = line['nomenclature']
+        batches.append(Batch(
+            organization=organization,
             nomenclature=nomenclature,
-            defaults={'price': purchase_price},
+            supplier=supplier,
+            warehouse=line['warehouse'],
+            receipt_document=receipt_document,
+            purchase_price=line['purchase_price'],
+            quantity=line['quantity'],
+            remaining=line['quantity'],
+            arrival_date=arrival_date,
+            expiry_date=line.get('expiry_date'),
+            invoice_number=invoice_number,
+            notes=line.get('notes', ''),
+        ))
+    bulk_create_batches(batches)
+
+    movement_notes = f'Приход партии: {invoice_number}' if invoice_number else 'Приход партии'
+    record_movements([
+        StockMovement(
+            organization=organization,
+            nomenclature=batch.nomenclature,
+            movement_type=StockMovement.MovementType.RECEIPT,
+            warehouse_to=batch.warehouse,
+            batch=batch,
+            quantity=batch.quantity,
+            price=batch.purchase_price,
+            user=user,
+            notes=movement_notes,
+        )
+        for batch in batches
+    ])
+
+    for batch in batches:
+        _update_stock_balance(
+            organization, batch.warehouse, batch.nomenclature,
+            batch.quantity, batch.quantity * batch.purchase_price,
+        )
+
+    # Последняя цена прихода по каждой позиции (порядок строк сохраняется)
+    last_price = {}
+    for batch in batches:
+        last_price[batch.nomenclature_id] = batch.purchase_price
+
+    # Цена в справочнике номенклатуры пересчитывается после коммита (одним GROUP BY)
+    mark_purchase_price_dirty(last_price)
+
+    # Создаём записи истории закупочных цен
+    PurchasePriceHistory.objects.bulk_create([
+        PurchasePriceHistory(
+            nomenclature=batch.nomenclature,
+            purchase_price=batch.purchase_price,
+            source=f'Приход: {invoice_number}' if invoice_number else 'Приход партии',
         )
-        if not _:
-            sn.price = purchase_price
-            sn.save(update_fields=['price'])
+        for batch in batches
+    ])
+
+    # Обновляем цены у поставщика (если указан)
+    if supplier:
+        from apps.suppliers.models import SupplierNomenclature
+        existing = {
+            sn.nomenclature_id: sn
+            for sn in SupplierNomenclature.objects.filter(
+                supplier=supplier, nomenclature_id__in=list(last_price),
+            )
+        }
+        sn_create, sn_update = [], []
+        for nom_id, price in last_price.items():
+            sn = existing.get(nom_id)
+            if sn is None:
+                sn_create.append(SupplierNomenclature(
+                    supplier=supplier, nomenclature_id=nom_id, price=price,
+                ))
+            else:
+                sn.price = price
+                sn_update.append(sn)
+        SupplierNomenclature.objects.bulk_create(sn_create)
+        SupplierNomenclature.objects.bulk_update(sn_update, ['price'])
 
         # Enterprise Architecture: Автоматическое создание обязательства (Debt) перед поставщиком
         # Приходуя товар, бизнес становится должен поставщику, пока не будет проведена транзакция оплаты.
         if create_debt:
             from apps.finance.models import Debt
-            total_batch_cost = quantity * purchase_price
-            if total_batch_cost > 0:
-                Debt.objects.create(
-                    organization=organization,
-                    debt_type=Debt.DebtType.SUPPLIER,
-                    direction=Debt.Direction.WE_OWE,
-                    counterparty_name=supplier.name,
-                    supplier=supplier,
-                    amount=total_batch_cost,
-                    notes=f'За поставку партии {nomenclature.name} ({quantity} шт). Накладная: {invoice_number}'
-                )
+            debts = []
+            for batch in batches:
+                total_batch_cost = batch.quantity * batch.purchase_price
+                if total_batch_cost > 0:
+                    debts.append(Debt(
+                        organization=organization,
+                        debt_type=Debt.DebtType.SUPPLIER,
+                        direction=Debt.Direction.WE_OWE,
+                        counterparty_name=supplier.name,
+                        supplier=supplier,
+                        amount=total_batch_cost,
+                        notes=f'За поставку партии {batch.nomenclature.name} ({batch.quantity} шт). Накладная: {invoice_number}'
+                    ))
+            Debt.objects.bulk_create(debts)
 
-    return batch
+    return batches
 
 
+@retry_on_conflict
 @transaction.atomic
 def process_sale_items(sale, items_data, user=None):
     """
@@ -293,24 +556,26 @@ def process_sale_items(sale, items_data, user=None):
     organization = sale.organization
     created_items = []
 
-    for item_data in items_data:
-        nomenclature = item_data['nomenclature']
-        quantity = Decimal(str(item_data['quantity']))
+    lines = [{
+        'nomenclature': item_data['nomenclature'],
+        'warehouse': item_data['warehouse'],
+        'quantity': Decimal(str(item_data['quantity'])),
+    } for item_data in items_data]
+
+    # FIFO-списание всех позиций одним проходом
+    lock_stock((line['warehouse'], line['nomenclature']) for line in lines)
+    fifo_results = fifo_write_off_many(organization, lines, user=user)
+
+    movements = []
+    for item_data, line, fifo_result in zip(items_data, lines, fifo_results):
+        nomenclature = line['nomenclature']
+        quantity = line['quantity']
+        warehouse = line['warehouse']
         price = Decimal(str(item_data['price']))
         discount = Decimal(str(item_data.get('discount_percent', 0)))
-        warehouse = item_data['warehouse']
-
-        # FIFO-списание
-        fifo_result = fifo_write_off(
-            organization=organization,
-            warehouse=warehouse,
-            nomenclature=nomenclature,
-            quantity=quantity,
-            user=user,
-        )
 
         # Себестоимость — средневзвешенная по фактически списанным партиям
-        total_cost = sum(r['qty'] * r['price'] for r in fifo_result)
+        total_cost = _fifo_cost(fifo_result)
         cost_price = total_cost / quantity if quantity else Decimal('0')
 
         # Итого позиции
@@ -330,7 +595,7 @@ def process_sale_items(sale, items_data, user=None):
 
         # StockMovement для каждой затронутой партии
         for r in fifo_result:
-            StockMovement.objects.create(
+            movements.append(StockMovement(
                 organization=organization,
                 nomenclature=nomenclature,
                 movement_type=StockMovement.MovementType.SALE,
@@ -341,14 +606,26 @@ def process_sale_items(sale, items_data, user=None):
                 sale=sale,
                 user=user,
                 notes=f'Продажа #{sale.number}',
-            )
+            ))
 
         # Обновить StockBalance
-        _update_stock_balance(organization, warehouse, nomenclature, -quantity)
+        _update_stock_balance(organization, warehouse, nomenclature, -quantity, -total_cost)
+
+    record_movements(movements)
 
     return created_items
 
 
+def _lock_nomenclatures(nomenclature_ids):
+    """Заблокировать строки номенклатуры по id — после lock_stock и до партий (см. locks)."""
+    from apps.nomenclature.models import Nomenclature
+    list(
+        Nomenclature.objects.select_for_update()
+        .filter(pk__in=set(nomenclature_ids)).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+@retry_on_conflict
 @transaction.atomic
 def assemble_bouquet(
     organization, nomenclature_bouquet, warehouse_from, warehouse_to,
@@ -368,49 +645,52 @@ def assemble_bouquet(
     bouquet_qty = Decimal(str(quantity))
 
     # 1. Списать компоненты
-    total_cost = Decimal('0')
-    for comp in components:
-        comp_nomenclature = comp['nomenclature']
-        comp_qty = Decimal(str(comp['quantity'])) * bouquet_qty
-        comp_warehouse = comp.get('warehouse') or warehouse_from
-
-        # Услуги не участвуют в складском учёте — пропускаем FIFO-списание
-        if comp_nomenclature.accounting_type == 'service':
-            continue
-
-        # В ручной сборке мы не разрешаем уход в минус (в отличие от продаж).
-        # fifo_write_off бросит InsufficientStockError при нехватке.
-        fifo_result = fifo_write_off(
-            organization=organization,
-            warehouse=comp_warehouse,
-            nomenclature=comp_nomenclature,
-            quantity=comp_qty,
-            user=user,
-        )
+    # Услуги не участвуют в складском учёте — пропускаем FIFO-списание.
+    # В ручной сборке мы не разрешаем уход в минус (в отличие от продаж):
+    # fifo_write_off_many бросит InsufficientStockError при нехватке.
+    lines = [{
+        'nomenclature': comp['nomenclature'],
+        'warehouse': comp.get('warehouse') or warehouse_from,
+        'quantity': Decimal(str(comp['quantity'])) * bouquet_qty,
+    } for comp in components if comp['nomenclature'].accounting_type != 'service']
+
+    lock_stock(
+        [(line['warehouse'], line['nomenclature']) for line in lines]
+        + [(warehouse_to, nomenclature_bouquet)],
+    )
+    # Строка букета (закупочная цена) — после пар и до партий, как в чеке (locks)
+    _lock_nomenclatures([nomenclature_bouquet.pk])
+    fifo_results = fifo_write_off_many(organization, lines, user=user)
 
+    total_cost = Decimal('0')
+    movements = []
+    for line, fifo_result in zip(lines, fifo_results):
         for r in fifo_result:
-            StockMovement.objects.create(
+            movements.append(StockMovement(
                 organization=organization,
-                nomenclature=comp_nomenclature,
+                nomenclature=line['nomenclature'],
                 movement_type=StockMovement.MovementType.ASSEMBLY,
-                warehouse_from=comp_warehouse,
+                warehouse_from=line['warehouse'],
                 batch=r['batch'],
                 quantity=r['qty'],
                 price=r['price'],
                 user=user,
                 notes=f'Сборка букета: {nomenclature_bouquet.name}',
-            )
+            ))
             # Точный расчёт себестоимости по FIFO-партиям
             total_cost += Decimal(str(r['qty'])) * r['price']
 
         _update_stock_balance(
-            organization, comp_warehouse, comp_nomenclature, -comp_qty
+            organization, line['warehouse'], line['nomenclature'], -line['quantity'],
+            -_fifo_cost(fifo_result),
         )
 
+    record_movements(movements)
+
     cost_per_unit = total_cost if bouquet_qty == 1 else total_cost / bouquet_qty
 
     # 3. Оприходовать букет на склад
-    batch = Batch.objects.create(
+    batch = create_batch(
         organization=organization,
         nomenclature=nomenclature_bouquet,
         warehouse=warehouse_to,
@@ -434,7 +714,7 @@ def assemble_bouquet(
         notes=f'Сборка букета: {nomenclature_bouquet.name}',
     )
 
-    _update_stock_balance(organization, warehouse_to, nomenclature_bouquet, bouquet_qty)
+    _update_stock_balance(organization, warehouse_to, nomenclature_bouquet, bouquet_qty, total_cost)
 
     # Обновить себестоимость букета в номенклатуре
     nomenclature_bouquet.purchase_price = cost_per_unit
@@ -456,10 +736,129 @@ def assemble_bouquet(
             source_mode=snapshot_source_mode,
         )
 
+    # Витрина: себестоимость и состав новой партии букета
+    mark_stock_read_model_dirty([(warehouse_to.pk, nomenclature_bouquet.pk)])
     return batch
 
 
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def assemble_bouquets(organization, plans, user=None):
+    """
+    Пакетная сборка витрины: несколько шаблонов за одну транзакцию.
+
+    plans: [{'nomenclature_bouquet', 'warehouse_from', 'warehouse_to', 'components',
+             'quantity', 'notes'?, 'snapshot_source_mode'?}, ...] — components как у assemble_bouquet.
+
+    Компоненты всех сборок списываются одним проходом fifo_write_off_many
+    (при нехватке — InsufficientStockError до изменений), партии букетов,
+    движения и снимки состава пишутся bulk_create, остатки — пакетом при сбросе
+    журнала. Возвращает партии букетов в порядке plans.
+    """
+    from apps.nomenclature.models import Nomenclature
+    from .models import BouquetBatchComponentSnapshot
+
+    lines, line_plans = [], []
+    for idx, plan in enumerate(plans):
+        bouquet_qty = Decimal(str(plan['quantity']))
+        for comp in plan['components']:
+            if comp['nomenclature'].accounting_type == 'service':
+                continue
+            lines.append({
+                'nomenclature': comp['nomenclature'],
+                'warehouse': comp.get('warehouse') or plan['warehouse_from'],
+                'quantity': Decimal(str(comp['quantity'])) * bouquet_qty,
+            })
+            line_plans.append(idx)
+
+    lock_stock(
+        [(line['warehouse'], line['nomenclature']) for line in lines]
+        + [(plan['warehouse_to'], plan['nomenclature_bouquet']) for plan in plans],
+    )
+    _lock_nomenclatures(plan['nomenclature_bouquet'].pk for plan in plans)
+    fifo_results = fifo_write_off_many(organization, lines, user=user)
+
+    movements = []
+    plan_costs = [Decimal('0')] * len(plans)
+    for line, idx, fifo_result in zip(lines, line_plans, fifo_results):
+        bouquet_name = plans[idx]['nomenclature_bouquet'].name
+        for r in fifo_result:
+            movements.append(StockMovement(
+                organization=organization,
+                nomenclature=line['nomenclature'],
+                movement_type=StockMovement.MovementType.ASSEMBLY,
+                warehouse_from=line['warehouse'],
+                batch=r['batch'],
+                quantity=r['qty'],
+                price=r['price'],
+                user=user,
+                notes=f'Сборка букета: {bouquet_name}',
+            ))
+        cost = _fifo_cost(fifo_result)
+        plan_costs[idx] += cost
+        _update_stock_balance(organization, line['warehouse'], line['nomenclature'], -line['quantity'], -cost)
+
+    today = timezone.now().date()
+    batches = []
+    for plan, total_cost in zip(plans, plan_costs):
+        bouquet = plan['nomenclature_bouquet']
+        bouquet_qty = Decimal(str(plan['quantity']))
+        batches.append(Batch(
+            organization=organization,
+            nomenclature=bouquet,
+            warehouse=plan['warehouse_to'],
+            purchase_price=total_cost / bouquet_qty,
+            quantity=bouquet_qty,
+            remaining=bouquet_qty,
+            arrival_date=today,
+            notes=plan.get('notes') or 'Сборка букета',
+            is_assembly=True,
+        ))
+    bulk_create_batches(batches)
+
+    snapshots = []
+    priced = {}
+    for plan, batch, total_cost in zip(plans, batches, plan_costs):
+        bouquet = plan['nomenclature_bouquet']
+        movements.append(StockMovement(
+            organization=organization,
+            nomenclature=bouquet,
+            movement_type=StockMovement.MovementType.ASSEMBLY,
+            warehouse_to=plan['warehouse_to'],
+            batch=batch,
+            quantity=batch.quantity,
+            price=batch.purchase_price,
+            user=user,
+            notes=f'Сборка букета: {bouquet.name}',
+        ))
+        _update_stock_balance(organization, plan['warehouse_to'], bouquet, batch.quantity, total_cost)
+        bouquet.purchase_price = batch.purchase_price
+        priced[bouquet.pk] = bouquet
+        for idx, comp in enumerate(plan['components']):
+            comp_nom = comp['nomenclature']
+            if comp_nom.accounting_type == 'service':
+                continue
+            snapshots.append(BouquetBatchComponentSnapshot(
+                batch=batch,
+                nomenclature=comp_nom,
+                accounting_type=getattr(comp_nom, 'accounting_type', 'stock_material'),
+                quantity_per_unit=Decimal(str(comp['quantity'])),
+                price_per_unit=comp_nom.retail_price,
+                sort_order=idx,
+                source_mode=plan.get('snapshot_source_mode', 'template'),
+            ))
+
+    record_movements(movements)
+    BouquetBatchComponentSnapshot.objects.bulk_create(snapshots)
+    # Себестоимость букета в номенклатуре — по последней сборке
+    Nomenclature.objects.bulk_update(list(priced.values()), ['purchase_price'])
+    return batches
+
+
+@retry_on_conflict
 @transaction.atomic
+@stock_ledger()
 def disassemble_bouquet(
     organization, nomenclature_bouquet, warehouse,
     return_items, writeoff_items, user=None, notes='',
@@ -478,7 +877,17 @@ def disassemble_bouquet(
     1. FIFO-списание букета со склада (1 шт)
     2. Возврат компонентов → создание Batch + StockMovement(return) + StockBalance
     3. Списание компонентов → StockMovement(write_off)
+
+    Движения и остатки копятся в журнале транзакции (stock_ledger)
+    и записываются одним пакетом в конце.
     """
+    movements = []
+    lock_stock(
+        [(warehouse, nomenclature_bouquet)]
+        + [(item.get('warehouse') or warehouse, item['nomenclature']) for item in return_items]
+        + [(warehouse, item['nomenclature']) for item in writeoff_items],
+    )
+
     # 1. Списать букет
     fifo_result = fifo_write_off(
         organization=organization,
@@ -490,7 +899,7 @@ def disassemble_bouquet(
     bouquet_cost = fifo_result[0]['price']
 
     for r in fifo_result:
-        StockMovement.objects.create(
+        movements.append(StockMovement(
             organization=organization,
             nomenclature=nomenclature_bouquet,
             movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -500,10 +909,10 @@ def disassemble_bouquet(
             price=r['price'],
             user=user,
             notes=f'Раскомплектовка букета: {nomenclature_bouquet.name}',
-        )
+        ))
 
     _update_stock_balance(
-        organization, warehouse, nomenclature_bouquet, Decimal('-1')
+        organization, warehouse, nomenclature_bouquet, Decimal('-1'), -_fifo_cost(fifo_result)
     )
 
     # 2. Возврат компонентов на склад
@@ -516,7 +925,7 @@ def disassemble_bouquet(
         ret_wh = item.get('warehouse') or warehouse
 
         # Создаём новую партию с закупочной ценой компонента
-        batch = Batch.objects.create(
+        batch = create_batch(
             organization=organization,
             nomenclature=comp_nom,
             warehouse=ret_wh,
@@ -526,7 +935,7 @@ def disassemble_bouquet(
             arrival_date=timezone.now().date(),
             notes=f'Раскомплектовка: {nomenclature_bouquet.name}',
         )
-        StockMovement.objects.create(
+        movements.append(StockMovement(
             organization=organization,
             nomenclature=comp_nom,
             movement_type=StockMovement.MovementType.RETURN,
@@ -536,8 +945,8 @@ def disassemble_bouquet(
             price=comp_nom.purchase_price,
             user=user,
             notes=f'Возврат из раскомплектовки: {nomenclature_bouquet.name}',
-        )
-        _update_stock_balance(organization, ret_wh, comp_nom, comp_qty)
+        ))
+        _update_stock_balance(organization, ret_wh, comp_nom, comp_qty, comp_qty * comp_nom.purchase_price)
 
     # 3. Списание компонентов (через FIFO + обновление StockBalance)
     for item in writeoff_items:
@@ -547,6 +956,8 @@ def disassemble_bouquet(
         if comp_qty <= 0:
             continue
 
+        # Без партий (ветка нехватки) стоимость остатка не меняется
+        wo_cost = Decimal('0')
         try:
             wo_result = fifo_write_off(
                 organization=organization,
@@ -556,7 +967,7 @@ def disassemble_bouquet(
                 user=user,
             )
             for r in wo_result:
-                StockMovement.objects.create(
+                movements.append(StockMovement(
                     organization=organization,
                     nomenclature=comp_nom,
                     movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -567,10 +978,11 @@ def disassemble_bouquet(
                     write_off_reason=reason,
                     user=user,
                     notes=f'Списание из раскомплектовки: {nomenclature_bouquet.name}',
-                )
+                ))
+            wo_cost = _fifo_cost(wo_result)
         except InsufficientStockError:
             # Если партий не хватает — списываем без привязки к партии
-            StockMovement.objects.create(
+            movements.append(StockMovement(
                 organization=organization,
                 nomenclature=comp_nom,
                 movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -580,12 +992,14 @@ def disassemble_bouquet(
                 write_off_reason=reason,
                 user=user,
                 notes=f'Списание из раскомплектовки: {nomenclature_bouquet.name}',
-            )
-        _update_stock_balance(organization, warehouse, comp_nom, -comp_qty)
+            ))
+        _update_stock_balance(organization, warehouse, comp_nom, -comp_qty, -wo_cost)
 
+    record_movements(movements)
     return True
 
 
+@retry_on_conflict
 @transaction.atomic
 def write_off_stock(
     organization, warehouse, nomenclature,
@@ -595,6 +1009,7 @@ def write_off_stock(
     """
     Ручное списание товара со склада (FIFO).
     """
+    movements = []
     fifo_result = fifo_write_off(
         organization=organization,
         warehouse=warehouse,
@@ -604,7 +1019,7 @@ def write_off_stock(
     )
 
     for r in fifo_result:
-        StockMovement.objects.create(
+        movements.append(StockMovement(
             organization=organization,
             nomenclature=nomenclature,
             movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -615,14 +1030,210 @@ def write_off_stock(
             write_off_reason=reason,
             user=user,
             notes=notes or 'Списание',
-        )
+        ))
 
-    _update_stock_balance(organization, warehouse, nomenclature, -quantity)
+    record_movements(movements)
+
+    total_cost = _fifo_cost(fifo_result)
+    _update_stock_balance(organization, warehouse, nomenclature, -quantity, -total_cost)
 
-    total_cost = sum(r['qty'] * r['price'] for r in fifo_result)
     return {'items': fifo_result, 'total_cost': total_cost}
 
 
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def write_off_stock_many(organization, lines, user=None, notes=''):
+    """
+    Пакетное ручное списание (порча в конце дня): все строки в одной транзакции.
+
+    lines: [{'warehouse', 'nomenclature', 'quantity', 'reason'?, 'notes'?}, ...]
+
+    Партии всех строк списываются одним проходом fifo_write_off_many,
+    движения и остатки пишутся пакетом при сбросе журнала. При нехватке
+    любой позиции бросает InsufficientStockError до изменений.
+    Возвращает [{'items': [...], 'total_cost': Decimal}, ...] в порядке строк.
+    """
+    fifo_results = fifo_write_off_many(organization, lines, user=user)
+
+    movements = []
+    results = []
+    for line, fifo_result in zip(lines, fifo_results):
+        reason = line.get('reason') or StockMovement.WriteOffReason.OTHER
+        for r in fifo_result:
+            movements.append(StockMovement(
+                organization=organization,
+                nomenclature=line['nomenclature'],
+                movement_type=StockMovement.MovementType.WRITE_OFF,
+                warehouse_from=line['warehouse'],
+                batch=r['batch'],
+                quantity=r['qty'],
+                price=r['price'],
+                write_off_reason=reason,
+                user=user,
+                notes=line.get('notes') or notes or 'Списание',
+            ))
+        total_cost = _fifo_cost(fifo_result)
+        _update_stock_balance(
+            organization, line['warehouse'], line['nomenclature'],
+            -Decimal(str(line['quantity'])), -total_cost,
+        )
+        results.append({'items': fifo_result, 'total_cost': total_cost})
+
+    record_movements(movements)
+    return results
+
+
+def reserve_stock_keys(reserve=None, changes=None):
+    """
+    Пары (склад, букет) резерва для lock_stock. Берутся вызывающим в начале
+    транзакции, до lock_reserve и shift_reserved_qty (порядок — см. locks):
+    текущая пара резерва и, если передан changes (validated_data), новая.
+    """
+    keys = []
+    if reserve is not None and reserve.bouquet_nomenclature_id:
+        keys.append((reserve.warehouse_id, reserve.bouquet_nomenclature_id))
+    if changes is not None:
+        warehouse = changes['warehouse'] if 'warehouse' in changes else getattr(reserve, 'warehouse_id', None)
+        bouquet = (
+            changes['bouquet_nomenclature'] if 'bouquet_nomenclature' in changes
+            else getattr(reserve, 'bouquet_nomenclature_id', None)
+        )
+        if warehouse and bouquet:
+            keys.append((warehouse, bouquet))
+    return keys
+
+
+def shift_reserved_qty(reserve, sign):
+    """
+    Учесть активный резерв в счётчиках reserved_qty партии и остатка (sign=1)
+    или снять его оттуда (sign=-1). Неактивный резерв счётчики не меняет.
+
+    Вызывать в транзакции, меняющей резерв: +1 — после создания или изменения,
+    −1 — пока резерв ещё активен, перед продажей, отменой, истечением,
+    изменением или удалением. Пару склад + букет вызывающий блокирует
+    заранее (reserve_stock_keys → lock_stock).
+    """
+    from django.db.models import F, Value
+    from django.db.models.functions import Greatest
+    from .models import Reserve
+
+    if reserve.status != Reserve.Status.ACTIVE or not reserve.quantity:
+        return
+    delta = Decimal(str(reserve.quantity)) * sign
+    counter = Greatest(F('reserved_qty') + delta, Value(Decimal('0')))
+    if reserve.batch_id:
+        Batch.objects.filter(pk=reserve.batch_id).update(reserved_qty=counter)
+    if reserve.bouquet_nomenclature_id:
+        StockBalance.objects.filter(
+            organization_id=reserve.organization_id,
+            warehouse_id=reserve.warehouse_id,
+            nomenclature_id=reserve.bouquet_nomenclature_id,
+        ).update(reserved_qty=counter)
+        mark_stock_read_model_dirty([(reserve.warehouse_id, reserve.bouquet_nomenclature_id)])
+        # Свободный остаток входит в матрицу сборки (buildable), адресуемую версией остатков
+        mark_stock_summary_dirty([(reserve.organization_id, reserve.warehouse_id, reserve.bouquet_nomenclature_id)])
+
+
+def lock_reserve(reserve):
+    """
+    Заблокировать строку резерва (после lock_stock на его пару склад + букет)
+    и перечитать поля счётчиков — два параллельных снятия не вычтут его дважды.
+    """
+    from .models import Reserve
+
+    locked = Reserve.objects.select_for_update().get(pk=reserve.pk)
+    for field in ('status', 'quantity', 'batch_id', 'warehouse_id', 'bouquet_nomenclature_id'):
+        setattr(reserve, field, getattr(locked, field))
+    return reserve
+
+
+# Заказы, товар по которым обещан клиенту, но ещё не списан продажей
+ATP_ORDER_STATUSES = ('new', 'confirmed', 'in_assembly', 'assembled', 'on_delivery', 'delivered')
+
+
+def committed_order_demand(organization, trading_point_id=None):
+    """
+    Спрос открытых заказов: {(trading_point_id, nomenclature_id): количество}.
+
+    Позиции раскладываются так же, как их спишет продажа по заказу
+    (do_sale_fifo_write_off): авторский букет — по составу позиции,
+    букет с шаблоном — по компонентам шаблона, услуги не учитываются.
+    """
+    from apps.sales.models import OrderItem
+
+    items = OrderItem.objects.filter(
+        order__organization=organization,
+        order__status__in=ATP_ORDER_STATUSES,
+        order__sales__isnull=True,
+    )
+    if trading_point_id:
+        items = items.filter(order__trading_point_id=trading_point_id)
+    items = items.select_related('order', 'nomenclature').prefetch_related(
+        'components', 'nomenclature__bouquet_template__components',
+    )
+
+    demand = defaultdict(Decimal)
+    for item in items:
+        nom = item.nomenclature
+        if nom.accounting_type == 'service':
+            continue
+        tp_id = item.order.trading_point_id
+        item_qty = Decimal(str(item.quantity))
+        if item.is_custom_bouquet:
+            lines = [(comp.nomenclature_id, comp.quantity) for comp in item.components.all()]
+        elif nom.accounting_type == 'finished_bouquet' and hasattr(nom, 'bouquet_template'):
+            lines = [(comp.nomenclature_id, comp.quantity) for comp in nom.bouquet_template.components.all()]
+        else:
+            lines = [(nom.id, 1)]
+        for nomenclature_id, qty in lines:
+            demand[(tp_id, nomenclature_id)] += Decimal(str(qty)) * item_qty
+    return demand
+
+
+def available_to_promise(organization, trading_point_id=None, nomenclature_ids=None):
+    """
+    Доступно к обещанию (ATP) по позициям и торговым точкам:
+    остаток − резерв − спрос открытых заказов.
+
+    Остаток и резерв берутся из счётчиков StockBalance (quantity, reserved_qty)
+    по складам точки, спрос — committed_order_demand. Возвращает список строк
+    {trading_point_id, nomenclature_id, on_hand, reserved, committed, atp}.
+    """
+    from django.db.models import Sum
+
+    balances = StockBalance.objects.filter(organization=organization)
+    if trading_point_id:
+        balances = balances.filter(warehouse__trading_point_id=trading_point_id)
+    if nomenclature_ids:
+        balances = balances.filter(nomenclature_id__in=nomenclature_ids)
+
+    rows = {}
+    for row in balances.values('warehouse__trading_point_id', 'nomenclature_id').annotate(
+        on_hand=Sum('quantity'), reserved=Sum('reserved_qty'),
+    ):
+        key = (row['warehouse__trading_point_id'], row['nomenclature_id'])
+        rows[key] = {'on_hand': row['on_hand'], 'reserved': row['reserved'], 'committed': Decimal('0')}
+
+    wanted = {str(pk) for pk in nomenclature_ids} if nomenclature_ids else None
+    for key, qty in committed_order_demand(organization, trading_point_id).items():
+        if wanted is not None and str(key[1]) not in wanted:
+            continue
+        row = rows.setdefault(key, {'on_hand': Decimal('0'), 'reserved': Decimal('0'), 'committed': Decimal('0')})
+        row['committed'] += qty
+
+    return [
+        {
+            'trading_point_id': tp_id,
+            'nomenclature_id': nomenclature_id,
+            **row,
+            'atp': row['on_hand'] - row['reserved'] - row['committed'],
+        }
+        for (tp_id, nomenclature_id), row in rows.items()
+    ]
+
+
+@retry_on_conflict
 @transaction.atomic
 def transfer_stock(
     organization, warehouse_from, warehouse_to,
@@ -632,6 +1243,7 @@ def transfer_stock(
     """
     Перемещение товара между складами (FIFO с исходного склада).
     """
+    lock_stock([(warehouse_from, nomenclature), (warehouse_to, nomenclature)])
     fifo_result = fifo_write_off(
         organization=organization,
         warehouse=warehouse_from,
@@ -641,11 +1253,11 @@ def transfer_stock(
     )
 
     # Средневзвешенная цена перемещаемого товара
-    total_cost = sum(r['qty'] * r['price'] for r in fifo_result)
+    total_cost = _fifo_cost(fifo_result)
     avg_price = total_cost / quantity if quantity else Decimal('0')
 
     # Создаём партию на целевом складе
-    batch = Batch.objects.create(
+    batch = create_batch(
         organization=organization,
         nomenclature=nomenclature,
         warehouse=warehouse_to,
@@ -669,13 +1281,111 @@ def transfer_stock(
         notes=notes or f'Перемещение: {warehouse_from.name} → {warehouse_to.name}',
     )
 
-    _update_stock_balance(organization, warehouse_from, nomenclature, -quantity)
-    _update_stock_balance(organization, warehouse_to, nomenclature, quantity)
+    _update_stock_balance(organization, warehouse_from, nomenclature, -quantity, -total_cost)
+    _update_stock_balance(organization, warehouse_to, nomenclature, quantity, total_cost)
 
     return batch
 
 
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def post_transfer_document(document, user=None):
+    """
+    Провести документ перемещения: все строки за один проход.
+
+    Порядок блокировок детерминирован: строка документа → партии склада-отправителя
+    одним SELECT ... FOR UPDATE (fifo_write_off_many, порядок склад → номенклатура → FIFO)
+    → остатки при сбросе журнала (отсортированный upsert). При нехватке любой позиции
+    бросает InsufficientStockError до изменений.
+
+    На складе-получателе каждая строка даёт партию по средней цене списанных партий
+    (срок годности — ближайший из них), партии, движения и строки документа пишутся
+    через bulk_create / bulk_update. Строка со складом-получателем, равным
+    отправителю, — ValueError.
+    """
+    from .models import TransferDocument, TransferDocumentItem
+
+    document = TransferDocument.objects.select_for_update().get(pk=document.pk)
+    if document.status != TransferDocument.Status.DRAFT:
+        raise ValueError('Документ уже проведён.')
+
+    items = list(
+        TransferDocumentItem.objects.filter(document=document)
+        .select_related('nomenclature', 'warehouse_to')
+        .order_by('id')
+    )
+    organization = document.organization
+    warehouse_from = document.warehouse_from
+    notes = f'Перемещение №{document.number}'
+
+    same = [item.nomenclature.name for item in items if item.warehouse_to_id == warehouse_from.pk]
+    if same:
+        raise ValueError(f'Склад-получатель совпадает с отправителем: {", ".join(same)}.')
+
+    lock_stock(
+        [(warehouse_from, item.nomenclature) for item in items]
+        + [(item.warehouse_to, item.nomenclature) for item in items],
+    )
+    fifo_results = fifo_write_off_many(
+        organization,
+        [{'warehouse': warehouse_from, 'nomenclature': item.nomenclature, 'quantity': item.quantity}
+         for item in items],
+        user=user,
+    )
+
+    batches = []
+    total = Decimal('0')
+    for item, fifo_result in zip(items, fifo_results):
+        nom = item.nomenclature
+        item.total = _fifo_cost(fifo_result)
+        total += item.total
+        expiry_dates = [r['batch'].expiry_date for r in fifo_result if r['batch'].expiry_date]
+        expiry_date = min(expiry_dates) if expiry_dates else None
+        batches.append(Batch(
+            organization=organization,
+            nomenclature=nom,
+            warehouse=item.warehouse_to,
+            purchase_price=item.total / item.quantity,
+            quantity=item.quantity,
+            remaining=item.quantity,
+            arrival_date=document.date,
+            expiry_date=expiry_date,
+            notes=f'{notes} с {warehouse_from.name}',
+        ))
+    bulk_create_batches(batches)
+
+    movements = []
+    for item, batch in zip(items, batches):
+        item.batch = batch
+        movements.append(StockMovement(
+            organization=organization,
+            nomenclature=item.nomenclature,
+            movement_type=StockMovement.MovementType.TRANSFER,
+            warehouse_from=warehouse_from,
+            warehouse_to=item.warehouse_to,
+            batch=batch,
+            quantity=item.quantity,
+            price=batch.purchase_price,
+            user=user,
+            notes=f'{notes}: {warehouse_from.name} → {item.warehouse_to.name}',
+        ))
+        _update_stock_balance(organization, warehouse_from, item.nomenclature, -item.quantity, -item.total)
+        _update_stock_balance(organization, item.warehouse_to, item.nomenclature, item.quantity, item.total)
+    record_movements(movements)
+    TransferDocumentItem.objects.bulk_update(items, ['batch', 'total'])
+
+    document.status = TransferDocument.Status.POSTED
+    document.total_cost = total
+    document.posted_by = user
+    document.posted_at = timezone.now()
+    document.save(update_fields=['status', 'total_cost', 'posted_by', 'posted_at', 'updated_at'])
+    return document
+
+
+@retry_on_conflict
 @transaction.atomic
+@stock_ledger()
 def correct_bouquet_stock(
     organization,
     bouquet_nomenclature,
@@ -695,7 +1405,20 @@ def correct_bouquet_stock(
         'return_warehouse': Warehouse|None,
         'add_warehouse': Warehouse|None,
     }]
+
+    Движения и остатки копятся в журнале транзакции (stock_ledger):
+    несколько строк по одной паре склад + номенклатура дают один upsert остатка.
     """
+    movements = []
+    keys = [(warehouse, bouquet_nomenclature)]
+    for row in rows:
+        keys += [
+            (warehouse, row['nomenclature']),
+            (row.get('return_warehouse') or warehouse, row['nomenclature']),
+            (row.get('add_warehouse') or warehouse, row['nomenclature']),
+        ]
+    lock_stock(keys)
+
     fifo_result = fifo_write_off(
         organization=organization,
         warehouse=warehouse,
@@ -707,7 +1430,7 @@ def correct_bouquet_stock(
     bouquet_cost = fifo_result[0]['price'] if fifo_result else bouquet_nomenclature.purchase_price
 
     for row in fifo_result:
-        StockMovement.objects.create(
+        movements.append(StockMovement(
             organization=organization,
             nomenclature=bouquet_nomenclature,
             movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -717,8 +1440,8 @@ def correct_bouquet_stock(
             price=row['price'],
             user=user,
             notes=f'Коррекция букета: {bouquet_nomenclature.name}',
-        )
-    _update_stock_balance(organization, warehouse, bouquet_nomenclature, Decimal('-1'))
+        ))
+    _update_stock_balance(organization, warehouse, bouquet_nomenclature, Decimal('-1'), -_fifo_cost(fifo_result))
 
     for row in rows:
         nomenclature = row['nomenclature']
@@ -732,7 +1455,7 @@ def correct_bouquet_stock(
 
         if return_qty > 0:
             return_wh = row.get('return_warehouse') or warehouse
-            batch = Batch.objects.create(
+            batch = create_batch(
                 organization=organization,
                 nomenclature=nomenclature,
                 warehouse=return_wh,
@@ -742,7 +1465,7 @@ def correct_bouquet_stock(
                 arrival_date=timezone.now().date(),
                 notes=f'Возврат из коррекции: {bouquet_nomenclature.name}',
             )
-            StockMovement.objects.create(
+            movements.append(StockMovement(
                 organization=organization,
                 nomenclature=nomenclature,
                 movement_type=StockMovement.MovementType.RETURN,
@@ -752,8 +1475,11 @@ def correct_bouquet_stock(
                 price=nomenclature.purchase_price,
                 user=user,
                 notes=f'Возврат из коррекции: {bouquet_nomenclature.name}',
+            ))
+            _update_stock_balance(
+                organization, return_wh, nomenclature, return_qty,
+                return_qty * nomenclature.purchase_price,
             )
-            _update_stock_balance(organization, return_wh, nomenclature, return_qty)
 
         if writeoff_qty > 0:
             try:
@@ -765,7 +1491,7 @@ def correct_bouquet_stock(
                     user=user,
                 )
                 for write_off_row in write_off_result:
-                    StockMovement.objects.create(
+                    movements.append(StockMovement(
                         organization=organization,
                         nomenclature=nomenclature,
                         movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -776,10 +1502,12 @@ def correct_bouquet_stock(
                         write_off_reason=reason,
                         user=user,
                         notes=f'Списание из коррекции: {bouquet_nomenclature.name}',
-                    )
-                _update_stock_balance(organization, warehouse, nomenclature, -writeoff_qty)
+                    ))
+                _update_stock_balance(
+                    organization, warehouse, nomenclature, -writeoff_qty, -_fifo_cost(write_off_result),
+                )
             except InsufficientStockError:
-                StockMovement.objects.create(
+                movements.append(StockMovement(
                     organization=organization,
                     nomenclature=nomenclature,
                     movement_type=StockMovement.MovementType.WRITE_OFF,
@@ -789,8 +1517,8 @@ def correct_bouquet_stock(
                     write_off_reason=reason,
                     user=user,
                     notes=f'Списание из коррекции: {bouquet_nomenclature.name}',
-                )
-                _update_stock_balance(organization, warehouse, nomenclature, -writeoff_qty)
+                ))
+                _update_stock_balance(organization, warehouse, nomenclature, -writeoff_qty, Decimal('0'))
 
         if add_qty > 0:
             add_wh = row.get('add_warehouse') or warehouse
@@ -802,7 +1530,7 @@ def correct_bouquet_stock(
                 user=user,
             )
             for add_row in add_fifo:
-                StockMovement.objects.create(
+                movements.append(StockMovement(
                     organization=organization,
                     nomenclature=nomenclature,
                     movement_type=StockMovement.MovementType.ASSEMBLY,
@@ -812,10 +1540,10 @@ def correct_bouquet_stock(
                     price=add_row['price'],
                     user=user,
                     notes=f'Добавление в коррекцию: {bouquet_nomenclature.name}',
-                )
-            _update_stock_balance(organization, add_wh, nomenclature, -add_qty)
+                ))
+            _update_stock_balance(organization, add_wh, nomenclature, -add_qty, -_fifo_cost(add_fifo))
 
-    corrected_batch = Batch.objects.create(
+    corrected_batch = create_batch(
         organization=organization,
         nomenclature=bouquet_nomenclature,
         warehouse=warehouse,
@@ -825,7 +1553,7 @@ def correct_bouquet_stock(
         arrival_date=timezone.now().date(),
         notes=f'Скорректированный букет: {bouquet_nomenclature.name}',
     )
-    StockMovement.objects.create(
+    movements.append(StockMovement(
         organization=organization,
         nomenclature=bouquet_nomenclature,
         movement_type=StockMovement.MovementType.RECEIPT,
@@ -835,47 +1563,58 @@ def correct_bouquet_stock(
         price=bouquet_cost,
         user=user,
         notes=f'Коррекция букета: {bouquet_nomenclature.name}',
-    )
-    _update_stock_balance(organization, warehouse, bouquet_nomenclature, Decimal('1'))
+    ))
+    _update_stock_balance(organization, warehouse, bouquet_nomenclature, Decimal('1'), bouquet_cost)
 
+    record_movements(movements)
     return corrected_batch
 
 
+@retry_on_conflict
 @transaction.atomic
 def process_receipt_document(document, user=None):
     """
-    Провести документ приёмки: для каждой позиции ReceiptDocumentItem
-    вызываем process_batch_receipt, привязываем batch к позиции.
+    Провести документ приёмки: все позиции ReceiptDocumentItem оприходуются
+    одним пакетом (process_batch_receipts), batch привязывается к позиции.
     """
+    from apps.nomenclature.models import Nomenclature
     from .models import ReceiptDocumentItem
-    items = ReceiptDocumentItem.objects.filter(document=document).select_related(
+    items = list(ReceiptDocumentItem.objects.filter(document=document).select_related(
         'nomenclature', 'warehouse',
+    ))
+    batches = process_batch_receipts(
+        document.organization,
+        [{
+            'warehouse': item.warehouse,
+            'nomenclature': item.nomenclature,
+            'quantity': item.quantity,
+            'purchase_price': item.purchase_price,
+        } for item in items],
+        supplier=document.supplier,
+        arrival_date=document.date,
+        invoice_number=document.number,
+        user=user,
+        create_debt=False,
+        receipt_document=document,
     )
+
     total = Decimal('0')
-    for item in items:
-        batch = process_batch_receipt(
-            organization=document.organization,
-            warehouse=item.warehouse,
-            nomenclature=item.nomenclature,
-            supplier=document.supplier,
-            quantity=item.quantity,
-            purchase_price=item.purchase_price,
-            arrival_date=document.date,
-            invoice_number=document.number,
-            user=user,
-            create_debt=False,
-        )
-        batch.receipt_document = document
-        batch.save(update_fields=['receipt_document'])
+    retail_prices = {}
+    for item, batch in zip(items, batches):
         item.batch = batch
         item.total = item.quantity * item.purchase_price
-        item.save(update_fields=['batch', 'total'])
         total += item.total
 
         # Update retail price on nomenclature if provided
         if item.retail_price and item.retail_price > 0:
             item.nomenclature.retail_price = item.retail_price
-            item.nomenclature.save(update_fields=['retail_price'])
+            retail_prices[item.nomenclature_id] = item.retail_price
+    ReceiptDocumentItem.objects.bulk_update(items, ['batch', 'total'])
+    Nomenclature.objects.bulk_update(
+        [Nomenclature(pk=pk, retail_price=price) for pk, price in retail_prices.items()],
+        ['retail_price'],
+    )
+    refresh_stock_read_model_for_nomenclatures(retail_prices)
 
     document.total_cost = total
     document.save(update_fields=['total_cost'])
@@ -894,3 +1633,263 @@ def process_receipt_document(document, user=None):
         )
 
     return document
+
+
+# ─── Инвентаризация ──────────────────────────────────────────
+
+@retry_on_conflict
+@transaction.atomic
+def seed_inventory_document(document):
+    """
+    Заполнить документ инвентаризации позициями склада одним INSERT ... SELECT
+    из StockBalance (ожидаемое = учётный остаток). Уже добавленные позиции
+    не трогаются. Возвращает число добавленных позиций.
+    """
+    from django.db import connection
+    from apps.nomenclature.models import Nomenclature
+    from .models import InventoryDocument, InventoryItem
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {InventoryItem._meta.db_table} (
+                id, document_id, nomenclature_id, expected_quantity, actual_quantity, difference
+            )
+            SELECT gen_random_uuid(), %s, sb.nomenclature_id, sb.quantity, NULL, NULL
+            FROM {StockBalance._meta.db_table} sb
+            JOIN {Nomenclature._meta.db_table} n ON n.id = sb.nomenclature_id
+            WHERE sb.organization_id = %s
+              AND sb.warehouse_id = %s
+              AND n.accounting_type <> 'service'
+            ON CONFLICT (document_id, nomenclature_id) DO NOTHING
+            """,
+            [document.pk, document.organization_id, document.warehouse_id],
+        )
+        created = cursor.rowcount
+
+    if document.status == InventoryDocument.Status.DRAFT:
+        document.status = InventoryDocument.Status.IN_PROGRESS
+        document.started_at = timezone.now()
+        document.save(update_fields=['status', 'started_at'])
+    return created
+
+
+@retry_on_conflict
+@transaction.atomic
+def apply_inventory_counts(document, counts, accumulate=False):
+    """
+    Записать фактические количества пачкой (сканер / импорт).
+
+    counts = [{'nomenclature': UUID} или {'barcode': str}, 'actual_quantity': Decimal]
+    accumulate=False — значение заменяет факт, True — прибавляется (поштучное сканирование).
+    Позиции, которых нет в документе, добавляются с ожидаемым = текущий остаток.
+    Всё пишется одним INSERT ... SELECT FROM unnest ... ON CONFLICT DO UPDATE.
+
+    Возвращает (принято, [нераспознанные идентификаторы]).
+    """
+    import uuid
+    from django.db import connection
+    from apps.nomenclature.models import Nomenclature
+    from .models import InventoryItem
+
+    barcodes = {str(c['barcode']) for c in counts if c.get('barcode') and not c.get('nomenclature')}
+    by_barcode = dict(
+        Nomenclature.objects.filter(
+            organization_id=document.organization_id, barcode__in=barcodes,
+        ).values_list('barcode', 'id')
+    ) if barcodes else {}
+
+    quantities = {}
+    unknown = []
+    for count in counts:
+        nomenclature_id = count.get('nomenclature') or by_barcode.get(str(count.get('barcode', '')))
+        try:
+            key = str(uuid.UUID(str(nomenclature_id)))
+        except ValueError:
+            unknown.append(count.get('barcode') or count.get('nomenclature'))
+            continue
+        qty = Decimal(str(count.get('actual_quantity', 0)))
+        quantities[key] = (quantities.get(key, Decimal('0')) + qty) if accumulate else qty
+
+    if not quantities:
+        return 0, unknown
+
+    if accumulate:
+        actual_sql = 'COALESCE(ii.actual_quantity, 0) + EXCLUDED.actual_quantity'
+    else:
+        actual_sql = 'EXCLUDED.actual_quantity'
+    table = InventoryItem._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS ii (
+                id, document_id, nomenclature_id, expected_quantity, actual_quantity, difference
+            )
+            SELECT gen_random_uuid(), %s, c.nomenclature_id,
+                   COALESCE(sb.quantity, 0), c.qty, c.qty - COALESCE(sb.quantity, 0)
+            FROM unnest(%s::uuid[], %s::numeric[]) AS c(nomenclature_id, qty)
+            JOIN {Nomenclature._meta.db_table} n
+              ON n.id = c.nomenclature_id AND n.organization_id = %s
+            LEFT JOIN {StockBalance._meta.db_table} sb
+              ON sb.nomenclature_id = c.nomenclature_id
+             AND sb.warehouse_id = %s AND sb.organization_id = %s
+            ON CONFLICT (document_id, nomenclature_id) DO UPDATE SET
+                actual_quantity = {actual_sql},
+                difference = {actual_sql} - ii.expected_quantity
+            """,
+            [
+                document.pk, list(quantities), list(quantities.values()),
+                document.organization_id, document.warehouse_id, document.organization_id,
+            ],
+        )
+        accepted = cursor.rowcount
+
+    if accepted < len(quantities):
+        known = {
+            str(pk) for pk in Nomenclature.objects.filter(
+                organization_id=document.organization_id, pk__in=list(quantities),
+            ).values_list('pk', flat=True)
+        }
+        unknown.extend(pk for pk in quantities if pk not in known)
+    return accepted, unknown
+
+
+@retry_on_conflict
+@transaction.atomic
+@stock_ledger()
+def post_inventory_document(document, user=None):
+    """
+    Провести инвентаризацию: расхождения факт − ожидаемое превращаются
+    в корректировки (StockMovement adjustment) пакетом.
+
+    - излишек — новая партия по средней цене остатка (или закупочной цене);
+    - недостача — FIFO-списание всех позиций одним fifo_write_off_many;
+      то, что не покрыто партиями, уходит в минус движением без партии.
+    Движения и остатки копятся в stock_ledger и пишутся в конце.
+    Документ блокируется первым: повторное проведение бросает ValueError.
+
+    Ожидаемое количество снято при seed_inventory_document и к проведению
+    могло устареть (продажи во время пересчёта). Поэтому после lock_stock
+    разница пересчитывается от текущего остатка: факт − StockBalance.quantity,
+    и записывается обратно в позиции документа.
+    """
+    from .models import InventoryDocument, InventoryItem
+
+    document = InventoryDocument.objects.select_for_update().get(pk=document.pk)
+    if document.status == InventoryDocument.Status.COMPLETED:
+        raise ValueError('Инвентаризация уже проведена.')
+
+    items = list(
+        InventoryItem.objects.filter(document=document, actual_quantity__isnull=False)
+        .select_related('nomenclature')
+    )
+    organization = document.organization
+    warehouse = document.warehouse
+    today = timezone.now().date()
+    notes = f'Инвентаризация №{document.number}'
+
+    lock_stock((warehouse, item.nomenclature_id) for item in items)
+    current = dict(
+        StockBalance.objects.filter(
+            organization=organization, warehouse=warehouse,
+            nomenclature_id__in=[item.nomenclature_id for item in items],
+        ).values_list('nomenclature_id', 'quantity')
+    )
+    changed = []
+    for item in items:
+        expected = current.get(item.nomenclature_id, Decimal('0'))
+        if (item.expected_quantity, item.difference) != (expected, item.actual_quantity - expected):
+            item.expected_quantity = expected
+            item.difference = item.actual_quantity - expected
+            changed.append(item)
+    if changed:
+        InventoryItem.objects.bulk_update(changed, ['expected_quantity', 'difference'])
+    items = [item for item in items if item.difference != 0]
+
+    surplus = [item for item in items if item.difference > 0]
+    shortage = [item for item in items if item.difference < 0]
+    movements = []
+
+    if surplus:
+        avg_prices = dict(
+            StockBalance.objects.filter(
+                organization=organization, warehouse=warehouse,
+                nomenclature_id__in=[item.nomenclature_id for item in surplus],
+            ).values_list('nomenclature_id', 'avg_purchase_price')
+        )
+        batches = []
+        for item in surplus:
+            nom = item.nomenclature
+            price = avg_prices.get(item.nomenclature_id) or nom.purchase_price or Decimal('0')
+            batches.append(Batch(
+                organization=organization,
+                nomenclature=nom,
+                warehouse=warehouse,
+                purchase_price=price,
+                quantity=item.difference,
+                remaining=item.difference,
+                arrival_date=today,
+                notes=f'{notes}: излишек',
+            ))
+        bulk_create_batches(batches)
+        for batch in batches:
+            movements.append(StockMovement(
+                organization=organization,
+                nomenclature=batch.nomenclature,
+                movement_type=StockMovement.MovementType.ADJUSTMENT,
+                warehouse_to=warehouse,
+                batch=batch,
+                quantity=batch.quantity,
+                price=batch.purchase_price,
+                user=user,
+                notes=f'{notes}: излишек',
+            ))
+            _update_stock_balance(
+                organization, warehouse, batch.nomenclature,
+                batch.quantity, batch.quantity * batch.purchase_price,
+            )
+        mark_purchase_price_dirty({batch.nomenclature_id for batch in batches})
+
+    if shortage:
+        fifo_results = fifo_write_off_many(
+            organization,
+            [{'warehouse': warehouse, 'nomenclature': item.nomenclature, 'quantity': -item.difference}
+             for item in shortage],
+            user=user,
+            allow_shortage=True,
+        )
+        for item, fifo_result in zip(shortage, fifo_results):
+            need = -item.difference
+            for r in fifo_result:
+                movements.append(StockMovement(
+                    organization=organization,
+                    nomenclature=item.nomenclature,
+                    movement_type=StockMovement.MovementType.ADJUSTMENT,
+                    warehouse_from=warehouse,
+                    batch=r['batch'],
+                    quantity=r['qty'],
+                    price=r['price'],
+                    user=user,
+                    notes=f'{notes}: недостача',
+                ))
+            uncovered = need - sum((r['qty'] for r in fifo_result), Decimal('0'))
+            if uncovered > 0:
+                movements.append(StockMovement(
+                    organization=organization,
+                    nomenclature=item.nomenclature,
+                    movement_type=StockMovement.MovementType.ADJUSTMENT,
+                    warehouse_from=warehouse,
+                    quantity=uncovered,
+                    price=item.nomenclature.purchase_price,
+                    user=user,
+                    notes=f'{notes}: недостача (без партии)',
+                ))
+            _update_stock_balance(organization, warehouse, item.nomenclature, -need, -_fifo_cost(fifo_result))
+
+    record_movements(movements)
+
+    document.status = InventoryDocument.Status.COMPLETED
+    document.completed_at = timezone.now()
+    document.conducted_by = user
+    document.save(update_fields=['status', 'completed_at', 'conducted_by'])
+    return {'surplus': len(surplus), 'shortage': len(shortage)}
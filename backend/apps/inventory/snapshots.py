@@ -0,0 +1,160 @@
+"""
+Снимки остатков и «остаток на дату».
+
+Ночная задача копирует StockBalance в StockSnapshot одним INSERT ... SELECT.
+Запрос «остаток на момент T» берёт ближайшую к T опорную точку — снимок
+или текущие остатки — и досчитывает только движения между ней и T:
+вперёд от более раннего снимка или назад от более позднего. Объём
+сканирования ограничен интервалом между снимками (сутки), а не всей историей:
+если ближайшая опорная точка дальше MAX_REPLAY (снимков за тот период нет),
+запрос отклоняется SnapshotUnavailable, а не досчитывается по всему журналу.
+
+Количество досчитывается точно. Стоимость — приближённо: к стоимости опорной
+точки прибавляется Σ quantity × price движений интервала, тогда как
+StockBalance.total_cost ведётся по себестоимости списанных партий.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import StockBalance, StockMovement, StockSnapshot
+
+# Дальше этого от опорной точки движения не досчитываются (снимки — ночные)
+MAX_REPLAY = timedelta(days=2)
+
+TOTAL_COST_NOTE = (
+    'Стоимость приближённая: стоимость опорной точки плюс Σ количество × цена '
+    'движений до запрошенного момента.'
+)
+
+
+class SnapshotUnavailable(ValueError):
+    """Ни снимок, ни текущие остатки не ближе MAX_REPLAY к запрошенному моменту."""
+
+
+@transaction.atomic
+def build_stock_snapshots(snapshot_date=None, organization=None):
+    """
+    Снять остатки (ненулевые) на текущий момент под датой snapshot_date.
+    Повторный запуск за ту же дату перезаписывает снимок. Возвращает число строк.
+    """
+    taken_at = timezone.now()
+    if snapshot_date is None:
+        snapshot_date = timezone.localdate(taken_at)
+
+    existing = StockSnapshot.objects.filter(snapshot_date=snapshot_date)
+    org_filter = ''
+    params = [snapshot_date, taken_at]
+    if organization is not None:
+        existing = existing.filter(organization=organization)
+        org_filter = 'AND organization_id = %s'
+        params.append(getattr(organization, 'pk', organization))
+    existing.delete()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {StockSnapshot._meta.db_table} (
+                id, organization_id, warehouse_id, nomenclature_id,
+                snapshot_date, taken_at, quantity, total_cost
+            )
+            SELECT gen_random_uuid(), organization_id, warehouse_id, nomenclature_id,
+                   %s, %s, quantity, total_cost
+            FROM {StockBalance._meta.db_table}
+            WHERE quantity <> 0 {org_filter}
+            """,
+            params,
+        )
+        return cursor.rowcount
+
+
+def _movement_deltas(organization, start, end, warehouse_ids, nomenclature_id=None):
+    """Σ движений (кол-во, стоимость) по складу + номенклатуре в интервале (start, end]."""
+    movements = StockMovement.objects.filter(
+        organization=organization, created_at__gt=start, created_at__lte=end,
+    )
+    if nomenclature_id:
+        movements = movements.filter(nomenclature_id=nomenclature_id)
+
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for field, sign in (('warehouse_to_id', 1), ('warehouse_from_id', -1)):
+        rows = movements.filter(**{f'{field}__in': warehouse_ids}).values(
+            field, 'nomenclature_id',
+        ).annotate(
+            qty=Sum('quantity'),
+            value=Sum(F('quantity') * F('price')),
+        )
+        for row in rows:
+            delta = deltas[(row[field], row['nomenclature_id'])]
+            delta[0] += sign * (row['qty'] or 0)
+            delta[1] += sign * (row['value'] or 0)
+    return deltas
+
+
+def stock_as_of(organization, at, warehouses, nomenclature_id=None):
+    """
+    Остатки организации на момент `at` по складам `warehouses` (queryset/список).
+
+    Возвращает (rows, source): rows = [{warehouse, nomenclature, quantity, total_cost}],
+    source — опорная точка ('snapshot:<дата>' или 'current').
+    Бросает SnapshotUnavailable, если ближайшая опорная точка дальше MAX_REPLAY.
+    """
+    warehouse_ids = [getattr(w, 'pk', w) for w in warehouses]
+    snapshots = StockSnapshot.objects.filter(organization=organization)
+    current = StockBalance.objects.filter(organization=organization)
+    now = timezone.now()
+
+    if at >= now:
+        base, source, deltas, sign = current, 'current', {}, 1
+    else:
+        bounds = snapshots.aggregate(
+            before=Max('taken_at', filter=Q(taken_at__lte=at)),
+            after=Min('taken_at', filter=Q(taken_at__gt=at)),
+        )
+        before = bounds['before']
+        # Более поздняя опорная точка: следующий снимок или текущие остатки
+        after = bounds['after'] or now
+
+        nearest = after - at if before is None else min(at - before, after - at)
+        if nearest > MAX_REPLAY:
+            raise SnapshotUnavailable(f'Нет снимка остатков на {timezone.localdate(at):%d.%m.%Y}.')
+
+        if before is not None and at - before <= after - at:
+            base = snapshots.filter(taken_at=before)
+            deltas, sign = _movement_deltas(organization, before, at, warehouse_ids, nomenclature_id), 1
+        else:
+            base = snapshots.filter(taken_at=after) if bounds['after'] else current
+            deltas, sign = _movement_deltas(organization, at, after, warehouse_ids, nomenclature_id), -1
+
+        source = 'current'
+        if base is not current:
+            source = f'snapshot:{base.values_list("snapshot_date", flat=True).first()}'
+
+    base = base.filter(warehouse_id__in=warehouse_ids)
+    if nomenclature_id:
+        base = base.filter(nomenclature_id=nomenclature_id)
+
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for warehouse_id, nom_id, quantity, total_cost in base.values_list(
+        'warehouse_id', 'nomenclature_id', 'quantity', 'total_cost',
+    ):
+        totals[(warehouse_id, nom_id)] = [quantity, total_cost]
+
+    for key, (qty, value) in deltas.items():
+        totals[key][0] += sign * qty
+        totals[key][1] += sign * value
+
+    return [
+        {
+            'warehouse': warehouse_id,
+            'nomenclature': nom_id,
+            'quantity': quantity,
+            'total_cost': max(total_cost, Decimal('0')).quantize(Decimal('0.01')),
+        }
+        for (warehouse_id, nom_id), (quantity, total_cost) in totals.items()
+        if quantity != 0
+    ], source
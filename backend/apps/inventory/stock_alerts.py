@@ -0,0 +1,236 @@
+"""
+Кэш минусовых и низких остатков в Redis для опроса из UI.
+
+Эндпоинты negative-alerts и low-stock опрашиваются фронтендом постоянно,
+поэтому отвечают из отсортированных множеств Redis, а не из БД:
+
+    stock_alerts:<org>:<scope>:negative  ZSET  member = <склад>:<номенклатура>, score = остаток
+    stock_alerts:<org>:<scope>:low       ZSET  то же для остатков ниже min_stock
+    stock_alerts:<org>:items             HASH  member → JSON строки ответа
+    stock_alerts:<org>:ready             признак построенного кэша (с TTL)
+
+scope — id торговой точки склада или 'all' (вся организация).
+
+Запись сквозная: изменения остатков (_update_stock_balance,
+apply_stock_balance_deltas) отмечают пары склад + номенклатура, после коммита
+транзакции они перечитываются из БД одним запросом и обновляются в Redis.
+Если признака ready нет (первый запрос, истёк TTL, изменился min_stock) —
+кэш организации перестраивается целиком. При недоступном Redis эндпоинты
+работают по БД.
+"""
+import json
+import logging
+from decimal import Decimal
+
+from django.db.models import F, Q
+
+from apps.core.on_commit import collect_on_commit
+
+from .models import StockBalance
+
+logger = logging.getLogger(__name__)
+
+# Как долго доверять кэшу без полной перестройки (страховка от пропущенных записей)
+STOCK_ALERTS_READY_TTL = 60 * 60
+
+ALL_SCOPE = 'all'
+
+
+def _redis():
+    """Соединение django-redis или None (другой бэкенд кэша / Redis недоступен)."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception:  # без Redis работаем по БД
+        return None
+
+
+def _key(organization_id, *parts):
+    return ':'.join(['stock_alerts', str(organization_id), *map(str, parts)])
+
+
+def _alert_rows(balances):
+    return balances.filter(
+        Q(quantity__lt=0)
+        | Q(nomenclature__min_stock__gt=0, quantity__lte=F('nomenclature__min_stock')),
+    ).values(
+        'id', 'organization_id', 'warehouse_id', 'nomenclature_id', 'quantity',
+        'warehouse__name', 'warehouse__trading_point_id',
+        'nomenclature__name', 'nomenclature__min_stock',
+        'nomenclature__is_active', 'nomenclature__accounting_type',
+    )
+
+
+def _classify(row):
+    """(negative, low) для строки _alert_rows — те же условия, что у эндпоинтов по БД."""
+    quantity = row['quantity']
+    negative = quantity < 0
+    min_stock = row['nomenclature__min_stock'] or 0
+    low = (
+        row['nomenclature__is_active']
+        and row['nomenclature__accounting_type'] != 'service'
+        and not (quantity == 0 and row['nomenclature__accounting_type'] == 'finished_bouquet')
+        and (negative or (min_stock > 0 and quantity <= min_stock))
+    )
+    return negative, low
+
+
+def _payload(row):
+    return json.dumps({
+        'id': str(row['id']),
+        'nomenclature': str(row['nomenclature_id']),
+        'nomenclature_name': row['nomenclature__name'],
+        'warehouse': str(row['warehouse_id']),
+        'warehouse_name': row['warehouse__name'],
+        'quantity': str(row['quantity']),
+        'min_stock': str(row['nomenclature__min_stock'] or 0),
+    }, ensure_ascii=False)
+
+
+def _scopes(trading_point_id):
+    return [ALL_SCOPE] + ([trading_point_id] if trading_point_id else [])
+
+
+def _write_row(pipe, row):
+    organization_id = row['organization_id']
+    member = f'{row["warehouse_id"]}:{row["nomenclature_id"]}'
+    negative, low = _classify(row)
+    score = float(row['quantity'])
+    for scope in _scopes(row['warehouse__trading_point_id']):
+        for kind, flag in (('negative', negative), ('low', low)):
+            if flag:
+                pipe.zadd(_key(organization_id, scope, kind), {member: score})
+            else:
+                pipe.zrem(_key(organization_id, scope, kind), member)
+    if negative or low:
+        pipe.hset(_key(organization_id, 'items'), member, _payload(row))
+    else:
+        pipe.hdel(_key(organization_id, 'items'), member)
+
+
+# ─── Перестройка ─────────────────────────────────────────────
+
+def rebuild_stock_alerts(organization_id):
+    """Перестроить кэш организации одним запросом к БД. Возвращает число позиций."""
+    redis = _redis()
+    if redis is None:
+        return 0
+    rows = list(_alert_rows(StockBalance.objects.filter(organization_id=organization_id)))
+
+    pipe = redis.pipeline(transaction=True)
+    for key in redis.scan_iter(match=_key(organization_id, '*')):
+        pipe.delete(key)
+    for row in rows:
+        _write_row(pipe, row)
+    pipe.set(_key(organization_id, 'ready'), 1, ex=STOCK_ALERTS_READY_TTL)
+    pipe.execute()
+    return len(rows)
+
+
+def invalidate_stock_alerts(organization_id):
+    """Сбросить признак готовности — следующий запрос перестроит кэш организации."""
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        redis.delete(_key(organization_id, 'ready'))
+    except Exception:
+        logger.exception('Не удалось сбросить кэш остатков организации %s', organization_id)
+
+
+# ─── Сквозная запись ─────────────────────────────────────────
+
+def mark_stock_alerts_dirty(keys):
+    """
+    Отметить пары (организация, склад, номенклатура) с изменившимся остатком.
+    Кэш обновляется после коммита транзакции.
+    """
+    collect_on_commit(_flush_dirty_stock_alerts, ((str(o), str(w), str(n)) for o, w, n in keys))
+
+
+def _flush_dirty_stock_alerts(dirty):
+    if not dirty:
+        return
+    try:
+        sync_stock_alerts(dirty)
+    except Exception:  # кэш не должен ломать складские операции
+        logger.exception('Не удалось обновить кэш остатков в Redis')
+        for organization_id in {key[0] for key in dirty}:
+            invalidate_stock_alerts(organization_id)
+
+
+def sync_stock_alerts(keys):
+    """Перечитать из БД указанные остатки и обновить их в Redis."""
+    redis = _redis()
+    if redis is None:
+        return
+    from apps.core.models import Warehouse
+
+    keys = set(keys)
+    # Надмножество по трём IN: в выборку попадают только строки-тревоги, их немного
+    candidates = StockBalance.objects.filter(
+        organization_id__in={key[0] for key in keys},
+        warehouse_id__in={key[1] for key in keys},
+        nomenclature_id__in={key[2] for key in keys},
+    )
+    rows = {
+        (str(row['organization_id']), str(row['warehouse_id']), str(row['nomenclature_id'])): row
+        for row in _alert_rows(candidates)
+    }
+    trading_points = {
+        str(warehouse_id): trading_point_id
+        for warehouse_id, trading_point_id in Warehouse.objects.filter(
+            pk__in={key[1] for key in keys},
+        ).values_list('id', 'trading_point_id')
+    }
+
+    pipe = redis.pipeline(transaction=False)
+    for organization_id, warehouse_id, nomenclature_id in keys:
+        row = rows.get((organization_id, warehouse_id, nomenclature_id))
+        if row is not None:
+            _write_row(pipe, row)
+            continue
+        # Остаток больше не попадает ни в один список (или строка удалена)
+        member = f'{warehouse_id}:{nomenclature_id}'
+        for scope in _scopes(trading_points.get(warehouse_id)):
+            pipe.zrem(_key(organization_id, scope, 'negative'), member)
+            pipe.zrem(_key(organization_id, scope, 'low'), member)
+        pipe.hdel(_key(organization_id, 'items'), member)
+    pipe.execute()
+
+
+# ─── Чтение ──────────────────────────────────────────────────
+
+def read_stock_alerts(organization_id, trading_point_id, kind, limit):
+    """
+    (count, [payload]) первых `limit` позиций по возрастанию остатка, при равном
+    остатке — по названию (как в БД), или None, если отвечать нужно из БД.
+    """
+    redis = _redis()
+    if redis is None:
+        return None
+    scope = trading_point_id or ALL_SCOPE
+    zset = _key(organization_id, scope, kind)
+    try:
+        if not redis.exists(_key(organization_id, 'ready')):
+            rebuild_stock_alerts(organization_id)
+        pipe = redis.pipeline(transaction=False)
+        pipe.zcard(zset)
+        pipe.zrange(zset, 0, limit - 1, withscores=True)
+        count, head = pipe.execute()
+        members = [member for member, _ in head]
+        if head:
+            # ZSET упорядочивает равные остатки по member (id) — добираем всю границу,
+            # чтобы отсортировать по названию
+            boundary = head[-1][1]
+            members = [member for member, score in head if score < boundary]
+            members += redis.zrangebyscore(zset, boundary, boundary)
+        payloads = redis.hmget(_key(organization_id, 'items'), members) if members else []
+    except Exception:
+        logger.exception('Кэш остатков недоступен, ответ из БД')
+        return None
+    items = sorted(
+        (json.loads(payload) for payload in payloads if payload),
+        key=lambda item: (Decimal(item['quantity']), item['nomenclature_name']),
+    )
+    return count, items[:limit]
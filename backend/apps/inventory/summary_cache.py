@@ -0,0 +1,119 @@
+"""
+Кэш сводки остатков (build_stock_summary) для экрана продаж.
+
+Сводка кэшируется на пару (организация, торговая точка) уже отрендеренным
+JSON и адресуется номером версии остатков:
+
+    stock_summary:ver:<org>:<scope>  счётчик изменений остатков точки ('all' — вся организация)
+    stock_summary:ver:<org>:epoch    счётчик изменений справочников (название, тип учёта)
+    stock_summary:<org>:<scope>:<warehouse>:<epoch>.<версия>  JSON сводки
+
+Изменение остатка (те же места, что и stock_alerts) после коммита
+увеличивает версию точки склада и 'all'; старые сводки больше не читаются
+и истекают по TTL. Версия же служит ETag: повторный запрос с If-None-Match
+получает 304, не трогая ни БД, ни сериализацию.
+
+Той же версией адресуется матрица «сколько букетов можно собрать» (buildable).
+"""
+import json
+import logging
+import time
+
+from django.core.cache import cache
+
+from apps.core.on_commit import collect_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Страховка от изменений в обход сервисов (например, переименование склада)
+STOCK_SUMMARY_TTL = 10 * 60
+
+ALL_SCOPE = 'all'
+EPOCH = 'epoch'
+
+
+def _version_key(organization_id, scope):
+    return f'stock_summary:ver:{organization_id}:{scope}'
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счётчика нет (первое изменение или вытеснен) — стартуем с момента времени,
+            # чтобы не повторить уже выданную версию
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def stock_summary_version(organization_id, trading_point_id=None):
+    """Текущая версия сводки (строка) — одним чтением из кэша."""
+    keys = [_version_key(organization_id, EPOCH), _version_key(organization_id, trading_point_id or ALL_SCOPE)]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        _bump([key for key in keys if key not in values])
+        values = cache.get_many(keys)
+    return f'{values.get(keys[0], 0)}.{values.get(keys[1], 0)}'
+
+
+def get_stock_summary(organization, trading_point_id=None, warehouse_id=None):
+    """
+    (json_bytes, etag) сводки остатков. При промахе сводка строится
+    build_stock_summary и сохраняется под текущей версией.
+    """
+    from .services import build_stock_summary
+
+    version = stock_summary_version(organization.pk, trading_point_id)
+    scope = trading_point_id or ALL_SCOPE
+    etag = f'"{organization.pk}:{scope}:{warehouse_id or ""}:{version}"'
+    key = f'stock_summary:{organization.pk}:{scope}:{warehouse_id or ""}:{version}'
+
+    payload = cache.get(key)
+    if payload is None:
+        payload = json.dumps(
+            build_stock_summary(organization, trading_point_id=trading_point_id, warehouse_id=warehouse_id),
+            ensure_ascii=False,
+        ).encode()
+        cache.set(key, payload, timeout=STOCK_SUMMARY_TTL)
+    return payload, etag
+
+
+def mark_stock_summary_dirty(keys):
+    """
+    Отметить пары (организация, склад, номенклатура) с изменившимся остатком;
+    версии сводок их точек увеличиваются после коммита.
+    """
+    collect_on_commit(
+        _flush_dirty_stock_summary,
+        ((str(organization_id), str(warehouse_id)) for organization_id, warehouse_id, _ in keys),
+    )
+
+
+def _flush_dirty_stock_summary(dirty):
+    if not dirty:
+        return
+    from apps.core.models import Warehouse
+
+    trading_points = {
+        str(warehouse_id): trading_point_id
+        for warehouse_id, trading_point_id in Warehouse.objects.filter(
+            pk__in={warehouse_id for _, warehouse_id in dirty},
+        ).values_list('id', 'trading_point_id')
+    }
+    keys = set()
+    for organization_id, warehouse_id in dirty:
+        keys.add(_version_key(organization_id, ALL_SCOPE))
+        if trading_points.get(warehouse_id):
+            keys.add(_version_key(organization_id, trading_points[warehouse_id]))
+    try:
+        _bump(keys)
+    except Exception:  # кэш не должен ломать складские операции
+        logger.exception('Не удалось обновить версии сводки остатков')
+
+
+def invalidate_stock_summary(organization_id):
+    """Сбросить все сводки организации (изменились названия или тип учёта позиций)."""
+    try:
+        _bump([_version_key(organization_id, EPOCH)])
+    except Exception:
+        logger.exception('Не удалось сбросить сводки остатков организации %s', organization_id)
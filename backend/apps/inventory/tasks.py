@@ -1,30 +1,199 @@
 from celery import shared_task
 from datetime import timedelta
 from django.utils import timezone
+import logging
 
 from apps.inventory.models import Batch
 
+logger = logging.getLogger(__name__)
+
+
+# За сколько дней до истечения срока годности поднимать предупреждение
+EXPIRY_WARNING_DAYS = 2
+
 
 @shared_task
 def check_expiring_batches():
     """
     Ежедневная проверка скоропортящихся партий.
     В цветочном бизнесе критично знать какие цветы портятся завтра/послезавтра, чтобы пустить их в распродажу (акции) или списание.
+
+    Раздаёт по подзадаче на организацию — крупный тенант не задерживает остальных.
+    Организации с уже сохранёнными предупреждениями тоже обходятся, чтобы снять неактуальные.
     """
+    from apps.inventory.models import ExpiryAlert
+
     today = timezone.now().date()
-    warning_date = today + timedelta(days=2)
-    
-    expiring_batches = Batch.objects.filter(
+    organization_ids = set(
+        Batch.objects.filter(
+            remaining__gt=0,
+            expiry_date__gte=today,
+            expiry_date__lte=today + timedelta(days=EXPIRY_WARNING_DAYS),
+        ).values_list('organization_id', flat=True).distinct()
+    )
+    organization_ids.update(ExpiryAlert.objects.values_list('organization_id', flat=True).distinct())
+
+    for organization_id in organization_ids:
+        refresh_expiry_alerts.delay(str(organization_id))
+    return len(organization_ids)
+
+
+@shared_task
+def refresh_expiry_alerts(organization_id, chunk_size=1000):
+    """
+    Пересобрать ExpiryAlert организации: партии агрегируются в БД
+    (склад + номенклатура + срок годности), читаются потоком и
+    записываются пачками через upsert; исчезнувшие предупреждения удаляются.
+    """
+    from django.db.models import Count, F, Sum
+    from apps.inventory.models import ExpiryAlert
+
+    started = timezone.now()
+    today = started.date()
+    rows = Batch.objects.filter(
+        organization_id=organization_id,
         remaining__gt=0,
-        expiry_date__lte=warning_date,
-        expiry_date__gte=today
-    ).select_related('nomenclature', 'warehouse__trading_point', 'organization')
-    
-    # В реальной Enterprise системе здесь шла бы отправка WebSocket/Push уведомлений или email
-    # агрегируя по organization и trading_point.
-    # Для MVP мы можем логировать или создавать внутренние уведомления (Notification).
-    
-    print(f"[*] Found {expiring_batches.count()} batches expiring soon.")
-    for b in expiring_batches:
-        print(f"Org: {b.organization.name} | Point: {b.warehouse.trading_point.name} | Batch: {b.nomenclature.name} expires on {b.expiry_date} (Remaining: {b.remaining})")
+        expiry_date__gte=today,
+        expiry_date__lte=today + timedelta(days=EXPIRY_WARNING_DAYS),
+    ).values(
+        'warehouse_id', 'warehouse__trading_point_id', 'nomenclature_id', 'expiry_date',
+    ).annotate(
+        quantity=Sum('remaining'),
+        total_cost=Sum(F('remaining') * F('purchase_price')),
+        batches_count=Count('id'),
+    ).order_by()
+
+    alerts = 0
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(ExpiryAlert(
+            organization_id=organization_id,
+            trading_point_id=row['warehouse__trading_point_id'],
+            warehouse_id=row['warehouse_id'],
+            nomenclature_id=row['nomenclature_id'],
+            expiry_date=row['expiry_date'],
+            quantity=row['quantity'],
+            total_cost=row['total_cost'] or 0,
+            batches_count=row['batches_count'],
+            refreshed_at=started,
+        ))
+        if len(chunk) >= chunk_size:
+            alerts += _upsert_expiry_alerts(chunk)
+    if chunk:
+        alerts += _upsert_expiry_alerts(chunk)
+
+    resolved, _ = ExpiryAlert.objects.filter(
+        organization_id=organization_id, refreshed_at__lt=started,
+    ).delete()
+
+    logger.info(
+        'Expiry alerts for org %s: %s active, %s resolved', organization_id, alerts, resolved,
+    )
+    return alerts
+
+
+def _upsert_expiry_alerts(chunk):
+    from apps.inventory.models import ExpiryAlert
+
+    ExpiryAlert.objects.bulk_create(
+        chunk,
+        update_conflicts=True,
+        unique_fields=['warehouse', 'nomenclature', 'expiry_date'],
+        update_fields=['trading_point', 'quantity', 'total_cost', 'batches_count', 'refreshed_at'],
+    )
+    count = len(chunk)
+    chunk.clear()
+    return count
+
+
+@shared_task
+def recompute_purchase_prices_task(nomenclature_ids):
+    """Отложенный пересчёт закупочной цены номенклатуры после прихода."""
+    from apps.inventory.services import recompute_purchase_prices
+    return recompute_purchase_prices(nomenclature_ids)
+
+
+@shared_task
+def reconcile_stock(organization_id=None, repair=False):
+    """
+    Сверка остатков: по подзадаче на склад (параллелизм — воркеры Celery).
+    """
+    from apps.core.models import Warehouse
+
+    warehouses = Warehouse.objects.all()
+    if organization_id:
+        warehouses = warehouses.filter(organization_id=organization_id)
+    for warehouse_id in warehouses.values_list('id', flat=True):
+        reconcile_warehouse_stock.delay(str(warehouse_id), repair)
+
+
+@shared_task
+def reconcile_warehouse_stock(warehouse_id, repair=False):
+    """Сверка одного склада; расхождения пишутся в лог."""
+    from apps.inventory.reconciliation import reconcile_warehouse
+
+    diffs = reconcile_warehouse(warehouse_id, repair=repair)
+    for row in diffs:
+        logger.warning('Stock drift: %s', row)
+    return len(diffs)
+
+
+@shared_task
+def build_stock_snapshots():
+    """Ночной снимок остатков для запросов «остаток на дату»."""
+    from apps.inventory.snapshots import build_stock_snapshots as build
+
+    rows = build()
+    logger.info('Stock snapshot built: %s rows', rows)
+    return rows
+
+
+@shared_task
+def archive_depleted_batches(older_than_days=None, chunk_size=1000):
+    """Перенос давно истощённых партий и их снимков в архивные таблицы."""
+    from apps.inventory.archive import archive_depleted_batches as archive
+
+    moved = archive(older_than_days=older_than_days, chunk_size=chunk_size)
+    logger.info('В архив перенесено партий: %s', moved)
+    return moved
+
+
+@shared_task
+def auto_write_off_expired():
+    """Автосписание просроченных партий: по подзадаче на организацию с включённой политикой."""
+    from apps.core.models import Organization
+
+    organization_ids = Organization.objects.filter(
+        is_active=True, auto_write_off_expired=True,
+    ).values_list('id', flat=True)
+    count = 0
+    for organization_id in organization_ids:
+        write_off_expired_for_organization.delay(str(organization_id))
+        count += 1
+    return count
+
+
+@shared_task
+def write_off_expired_for_organization(organization_id, chunk_size=500):
+    """Списать просроченные партии организации; сводка по складам — в лог и результат задачи."""
+    from apps.core.models import Organization
+    from apps.inventory.expiry import write_off_expired_batches
 
+    organization = Organization.objects.get(pk=organization_id)
+    if not organization.auto_write_off_expired:
+        return {}
+    summary = write_off_expired_batches(organization, chunk_size=chunk_size)
+    for row in summary.values():
+        logger.info(
+            'Автосписание просрочки, org %s, склад «%s»: партий %s, количество %s, себестоимость %s',
+            organization_id, row['warehouse'], row['batches'], row['quantity'], row['total_cost'],
+        )
+    return {
+        str(warehouse_id): {
+            'warehouse': row['warehouse'],
+            'batches': row['batches'],
+            'quantity': str(row['quantity']),
+            'total_cost': str(row['total_cost']),
+        }
+        for warehouse_id, row in summary.items()
+    }
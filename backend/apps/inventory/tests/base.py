@@ -0,0 +1,38 @@
+"""Общие данные тестов склада: организация, точка, два склада и позиции."""
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from apps.core.models import Organization, TradingPoint, Warehouse
+from apps.inventory import services
+from apps.inventory.models import StockBalance
+from apps.nomenclature.models import Nomenclature
+
+
+class StockTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name='Цветочная лавка')
+        cls.tp = TradingPoint.objects.create(organization=cls.org, name='Центр')
+        cls.warehouse = Warehouse.objects.create(organization=cls.org, trading_point=cls.tp, name='Склад')
+        cls.showcase = Warehouse.objects.create(organization=cls.org, trading_point=cls.tp, name='Витрина')
+        cls.rose = Nomenclature.objects.create(organization=cls.org, name='Роза')
+        cls.eucalyptus = Nomenclature.objects.create(organization=cls.org, name='Эвкалипт')
+        cls.bouquet = Nomenclature.objects.create(
+            organization=cls.org, name='Букет «Утро»', accounting_type='finished_bouquet',
+        )
+
+    def receive(self, nomenclature, quantity, price, warehouse=None, arrival_date=date(2026, 1, 1), **kwargs):
+        """Оприходовать партию через сервис (движение, остаток, цена)."""
+        return services.process_batch_receipt(
+            self.org, warehouse or self.warehouse, nomenclature, None,
+            Decimal(str(quantity)), Decimal(str(price)), arrival_date=arrival_date, **kwargs,
+        )
+
+    def balance(self, nomenclature, warehouse=None):
+        """(количество, стоимость) остатка пары склад + номенклатура; (0, 0) без строки."""
+        row = StockBalance.objects.filter(
+            organization=self.org, warehouse=warehouse or self.warehouse, nomenclature=nomenclature,
+        ).values_list('quantity', 'total_cost').first()
+        return row or (Decimal('0'), Decimal('0'))
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.models import Warehouse
+from apps.inventory import services
+from apps.inventory.archive import archive_depleted_batches, get_batch, get_batch_for_update
+from apps.inventory.models import (
+    ArchivedBatch, ArchivedBouquetBatchComponentSnapshot, Batch,
+    BouquetBatchComponentSnapshot, StockMovement,
+)
+from apps.sales.models import Sale, SaleItem
+from apps.sales.services import _rollback_sale_fifo, do_sale_fifo_write_off
+
+from .base import StockTestCase
+
+
+class ArchiveDepletedBatchesTests(StockTestCase):
+    def setUp(self):
+        Warehouse.objects.filter(pk=self.warehouse.pk).update(is_default_for_sales=True)
+        self.sold = self.receive(self.bouquet, 2, 300)
+        BouquetBatchComponentSnapshot.objects.create(
+            batch=self.sold, nomenclature=self.rose, quantity_per_unit=Decimal('5'),
+        )
+        self.sale = Sale.objects.create(organization=self.org, trading_point=self.tp, number='1')
+        SaleItem.objects.create(
+            sale=self.sale, nomenclature=self.bouquet, batch=self.sold,
+            quantity=Decimal('2'), price=Decimal('500'),
+        )
+        do_sale_fifo_write_off(self.sale)
+
+        self.live = self.receive(self.rose, 3, 10)
+        self.reserved = self.receive(self.eucalyptus, 1, 20)
+        services.write_off_stock(self.org, self.warehouse, self.eucalyptus, Decimal('1'))
+        Batch.objects.filter(pk=self.reserved.pk).update(reserved_qty=1)
+
+        # Вся история — полгода назад
+        past = timezone.now() - timedelta(days=180)
+        Batch.objects.update(created_at=past)
+        StockMovement.objects.update(created_at=past)
+
+    def test_only_depleted_unreserved_batches_are_archived(self):
+        self.assertEqual(archive_depleted_batches(older_than_days=30, organization=self.org), 1)
+
+        self.assertEqual(list(ArchivedBatch.objects.values_list('pk', flat=True)), [self.sold.pk])
+        self.assertEqual(
+            list(ArchivedBouquetBatchComponentSnapshot.objects.values_list('batch_id', 'nomenclature_id')),
+            [(self.sold.pk, self.rose.pk)],
+        )
+        self.assertFalse(BouquetBatchComponentSnapshot.objects.exists())
+        self.assertEqual(set(Batch.objects.values_list('pk', flat=True)), {self.live.pk, self.reserved.pk})
+
+    def test_recent_movement_keeps_batch_hot(self):
+        StockMovement.objects.filter(batch=self.sold).update(created_at=timezone.now())
+
+        self.assertEqual(archive_depleted_batches(older_than_days=30, organization=self.org), 0)
+
+    def test_archived_batch_is_resolved_and_restored_by_sale_rollback(self):
+        archive_depleted_batches(older_than_days=30, organization=self.org)
+        self.assertIsInstance(get_batch(self.sold.pk), ArchivedBatch)
+
+        with transaction.atomic():
+            _rollback_sale_fifo(self.sale)
+
+        batch = Batch.objects.get(pk=self.sold.pk)
+        self.assertEqual(batch.remaining, Decimal('2'))
+        self.assertFalse(ArchivedBatch.objects.exists())
+        self.assertEqual(BouquetBatchComponentSnapshot.objects.get().batch_id, self.sold.pk)
+        self.assertEqual(self.balance(self.bouquet), (Decimal('2'), Decimal('600')))
+
+    def test_get_batch_for_update_of_unknown_id(self):
+        with transaction.atomic():
+            self.assertIsNone(get_batch_for_update(self.org.pk))
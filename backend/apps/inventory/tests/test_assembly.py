@@ -0,0 +1,126 @@
+from datetime import date
+from decimal import Decimal
+
+from rest_framework.test import APIClient
+
+from apps.core.models import User
+from apps.inventory import services
+from apps.inventory.models import Batch, BouquetBatchComponentSnapshot, StockMovement
+from apps.nomenclature.models import BouquetComponent, BouquetTemplate, Nomenclature
+
+from .base import StockTestCase
+
+
+class AssembleBouquetsTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.mono = Nomenclature.objects.create(
+            organization=cls.org, name='Моно-букет', accounting_type='finished_bouquet',
+        )
+
+    def setUp(self):
+        self.receive(self.rose, 10, 10, arrival_date=date(2026, 1, 1))
+        self.receive(self.rose, 10, 20, arrival_date=date(2026, 1, 2))
+        self.receive(self.eucalyptus, 6, 5)
+
+    def plan(self, bouquet, quantity, *components):
+        return {
+            'nomenclature_bouquet': bouquet,
+            'warehouse_from': self.warehouse,
+            'warehouse_to': self.showcase,
+            'quantity': quantity,
+            'components': [{'nomenclature': nom, 'quantity': Decimal(qty)} for nom, qty in components],
+        }
+
+    def test_plans_share_one_fifo_pass(self):
+        batches = services.assemble_bouquets(self.org, [
+            self.plan(self.bouquet, 2, (self.rose, '3'), (self.eucalyptus, '1')),
+            self.plan(self.mono, 1, (self.rose, '7')),
+        ])
+
+        # Первый план забирает 6 роз по 10, второй — 4 по 10 и 3 по 20
+        self.assertEqual([b.purchase_price for b in batches], [Decimal('35'), Decimal('100')])
+        self.assertEqual([b.warehouse for b in batches], [self.showcase, self.showcase])
+        self.assertTrue(all(b.is_assembly for b in batches))
+        self.assertEqual(self.balance(self.rose), (Decimal('7'), Decimal('140')))
+        self.assertEqual(self.balance(self.eucalyptus), (Decimal('4'), Decimal('20')))
+        self.assertEqual(self.balance(self.bouquet, self.showcase), (Decimal('2'), Decimal('70')))
+        self.assertEqual(self.balance(self.mono, self.showcase), (Decimal('1'), Decimal('100')))
+
+        self.bouquet.refresh_from_db()
+        self.assertEqual(self.bouquet.purchase_price, Decimal('35'))
+        self.assertEqual(
+            list(BouquetBatchComponentSnapshot.objects.filter(batch=batches[0]).order_by('sort_order')
+                 .values_list('nomenclature', 'quantity_per_unit', 'source_mode')),
+            [(self.rose.pk, Decimal('3'), 'template'), (self.eucalyptus.pk, Decimal('1'), 'template')],
+        )
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type=StockMovement.MovementType.ASSEMBLY).count(),
+            # первый план: роза и эвкалипт, второй: роза из двух партий; плюс два букета
+            2 + 2 + 2,
+        )
+
+    def test_shortage_in_any_plan_changes_nothing(self):
+        with self.assertRaises(services.InsufficientStockError):
+            services.assemble_bouquets(self.org, [
+                self.plan(self.bouquet, 1, (self.rose, '3')),
+                self.plan(self.mono, 1, (self.eucalyptus, '7')),
+            ])
+
+        self.assertEqual(self.balance(self.rose), (Decimal('20'), Decimal('300')))
+        self.assertFalse(Batch.objects.filter(is_assembly=True).exists())
+
+
+class AssembleBouquetsEndpointTests(StockTestCase):
+    URL = '/api/inventory/movements/assemble-bouquets/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='florist', organization=cls.org, role='owner')
+        cls.template = BouquetTemplate.objects.create(organization=cls.org, nomenclature=cls.bouquet)
+        BouquetComponent.objects.create(template=cls.template, nomenclature=cls.rose, quantity=Decimal('5'))
+        BouquetComponent.objects.create(template=cls.template, nomenclature=cls.eucalyptus, quantity=Decimal('2'))
+
+    def setUp(self):
+        self.receive(self.rose, 20, 10)
+        self.receive(self.eucalyptus, 10, 5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, components=()):
+        return self.client.post(self.URL, {
+            'warehouse_from': str(self.warehouse.pk),
+            'warehouse_to': str(self.showcase.pk),
+            'items': [{'template': str(self.template.pk), 'quantity': 2, 'components': list(components)}],
+        }, format='json')
+
+    def snapshot_modes(self, response):
+        return set(BouquetBatchComponentSnapshot.objects.filter(
+            batch_id=response.data['batches'][0]['batch_id'],
+        ).values_list('source_mode', flat=True))
+
+    def test_template_composition(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['batches'][0]['cost_price']), Decimal('60'))
+        self.assertEqual(self.snapshot_modes(response), {'template'})
+
+    def test_overrides_change_composition_and_mark_snapshot_manual(self):
+        response = self.post([
+            {'nomenclature': str(self.rose.pk), 'quantity': '7'},
+            {'nomenclature': str(self.eucalyptus.pk), 'quantity': '0'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['batches'][0]['cost_price']), Decimal('70'))
+        self.assertEqual(self.snapshot_modes(response), {'manual'})
+        self.assertEqual(self.balance(self.eucalyptus)[0], Decimal('10'))
+
+    def test_override_outside_template_is_rejected(self):
+        response = self.post([{'nomenclature': str(self.bouquet.pk), 'quantity': '1'}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Batch.objects.filter(is_assembly=True).exists())
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from apps.inventory.batches import bulk_create_batches, create_batch
+from apps.inventory.models import Batch
+from apps.nomenclature.models import Nomenclature
+
+from .base import StockTestCase
+
+ARRIVAL = date(2026, 3, 1)
+
+
+class DefaultExpiryTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Nomenclature.objects.filter(pk=cls.rose.pk).update(default_shelf_life_days=5)
+        Nomenclature.objects.filter(pk=cls.eucalyptus.pk).update(default_shelf_life_days=10)
+
+    def batch(self, expiry_date=None, **fields):
+        if 'nomenclature' not in fields:
+            fields.setdefault('nomenclature_id', self.rose.pk)
+        return Batch(
+            organization=self.org, warehouse=self.warehouse, purchase_price=Decimal('10'),
+            quantity=Decimal('1'), remaining=Decimal('1'), arrival_date=ARRIVAL,
+            expiry_date=expiry_date, **fields,
+        )
+
+    def test_remaining_save_does_not_read_nomenclature(self):
+        batch = Batch.objects.get(pk=self.receive(self.rose, 5, 10).pk)
+
+        with self.assertNumQueries(1):
+            batch.remaining -= 1
+            batch.save(update_fields=['remaining'])
+
+    def test_bulk_create_reads_shelf_life_once_for_mixed_batches(self):
+        explicit = date(2026, 3, 3)
+        batches = [
+            self.batch(expiry_date=explicit),
+            self.batch(),
+            self.batch(nomenclature_id=self.eucalyptus.pk),
+            self.batch(nomenclature_id=self.eucalyptus.pk),
+        ]
+
+        with self.assertNumQueries(2):
+            bulk_create_batches(batches)
+
+        self.assertEqual(
+            [batch.expiry_date for batch in Batch.objects.filter(pk__in=[b.pk for b in batches]).order_by('expiry_date')],
+            [explicit, ARRIVAL + timedelta(days=5), ARRIVAL + timedelta(days=10), ARRIVAL + timedelta(days=10)],
+        )
+
+    def test_loaded_nomenclature_needs_no_lookup(self):
+        rose = Nomenclature.objects.get(pk=self.rose.pk)
+        batches = [self.batch(nomenclature=rose), self.batch(expiry_date=ARRIVAL)]
+
+        with self.assertNumQueries(1):
+            bulk_create_batches(batches)
+
+        self.assertEqual(batches[0].expiry_date, ARRIVAL + timedelta(days=5))
+
+    def test_create_batch_with_prepared_shelf_life(self):
+        with self.assertNumQueries(1):
+            batch = create_batch(
+                shelf_life={self.eucalyptus.pk: 10}, organization=self.org, warehouse=self.warehouse,
+                nomenclature_id=self.eucalyptus.pk, purchase_price=Decimal('20'),
+                quantity=Decimal('2'), remaining=Decimal('2'), arrival_date=ARRIVAL,
+            )
+
+        self.assertEqual(batch.expiry_date, ARRIVAL + timedelta(days=10))
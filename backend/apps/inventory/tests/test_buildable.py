@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.core.models import User
+from apps.inventory.buildable import build_buildable_matrix
+from apps.inventory.models import StockBalance
+from apps.nomenclature.models import BouquetComponent, BouquetTemplate, Nomenclature
+
+from .base import StockTestCase
+
+URL = '/api/nomenclature/bouquet-templates/buildable/'
+
+
+class BuildableMatrixTests(StockTestCase):
+    """Шаблон «Утро»: 3 розы, 1 эвкалипт и необязательная лента (её нет на складе)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ribbon = Nomenclature.objects.create(organization=cls.org, name='Лента')
+        cls.template = BouquetTemplate.objects.create(organization=cls.org, nomenclature=cls.bouquet)
+        cls.roses = BouquetComponent.objects.create(template=cls.template, nomenclature=cls.rose, quantity=3)
+        BouquetComponent.objects.create(template=cls.template, nomenclature=cls.eucalyptus, quantity=1)
+        BouquetComponent.objects.create(
+            template=cls.template, nomenclature=cls.ribbon, quantity=1, is_required=False,
+        )
+        cls.user = User.objects.create(username='florist', organization=cls.org, role='owner')
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 10, 10)
+            self.receive(self.eucalyptus, 5, 20, warehouse=self.showcase)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def matrix(self):
+        return [
+            (row['name'], row['buildable'], row['limiting_component']['name'])
+            for row in build_buildable_matrix(self.org.pk, self.tp.pk)
+        ]
+
+    def fetch(self):
+        response = self.client.get(URL, {'trading_point': str(self.tp.pk)})
+        self.assertEqual(response.status_code, 200)
+        return [(row['name'], row['buildable']) for row in response.data]
+
+    def test_limiting_component_ignores_optional_ones(self):
+        self.assertEqual(self.matrix(), [('Букет «Утро»', 3, 'Роза')])
+
+    def test_reserved_stock_is_not_available(self):
+        StockBalance.objects.filter(nomenclature=self.rose).update(reserved_qty=Decimal('4'))
+
+        self.assertEqual(self.matrix(), [('Букет «Утро»', 2, 'Роза')])
+
+    def test_missing_component_gives_zero(self):
+        StockBalance.objects.filter(nomenclature=self.eucalyptus).delete()
+
+        self.assertEqual(self.matrix(), [('Букет «Утро»', 0, 'Эвкалипт')])
+
+    def test_matrix_is_cached_until_stock_changes(self):
+        self.assertEqual(self.fetch(), [('Букет «Утро»', 3)])
+        # Изменение в обход сервисов версию не поднимает — ответ из кэша
+        StockBalance.objects.filter(nomenclature=self.rose).update(quantity=Decimal('30'))
+        self.assertEqual(self.fetch(), [('Букет «Утро»', 3)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.eucalyptus, 10, 20, warehouse=self.showcase)
+
+        self.assertEqual(self.fetch(), [('Букет «Утро»', 10)])
+
+    def test_component_and_template_edits_invalidate_the_cache(self):
+        self.assertEqual(self.fetch(), [('Букет «Утро»', 3)])
+
+        response = self.client.patch(
+            f'/api/nomenclature/bouquet-components/{self.roses.pk}/', {'quantity': '5'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fetch(), [('Букет «Утро»', 2)])
+
+        response = self.client.delete(f'/api/nomenclature/bouquet-templates/{self.template.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.fetch(), [])
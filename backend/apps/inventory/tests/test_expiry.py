@@ -0,0 +1,62 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from apps.inventory.expiry import AUTO_WRITE_OFF_NOTES, write_off_expired_batches
+from apps.inventory.models import Batch, StockMovement
+
+from .base import StockTestCase
+
+
+class WriteOffExpiredBatchesTests(StockTestCase):
+    def setUp(self):
+        today = timezone.localdate()
+        self.expired = self.receive(self.rose, 4, 10, arrival_date=today - timedelta(days=20),
+                                    expiry_date=today - timedelta(days=5))
+        self.recent = self.receive(self.rose, 3, 12, arrival_date=today - timedelta(days=10),
+                                   expiry_date=today - timedelta(days=1))
+        self.fresh = self.receive(self.rose, 2, 15, arrival_date=today, expiry_date=today + timedelta(days=7))
+        self.showcase_expired = self.receive(self.eucalyptus, 5, 20, warehouse=self.showcase,
+                                             arrival_date=today - timedelta(days=20),
+                                             expiry_date=today - timedelta(days=3))
+
+    def remaining(self, batch):
+        return Batch.objects.get(pk=batch.pk).remaining
+
+    def test_batches_past_grace_period_are_written_off(self):
+        summary = write_off_expired_batches(self.org, grace_days=2)
+
+        self.assertEqual(self.remaining(self.expired), 0)
+        self.assertEqual(self.remaining(self.showcase_expired), 0)
+        self.assertEqual(self.remaining(self.recent), 3)
+        self.assertEqual(self.remaining(self.fresh), 2)
+        self.assertEqual(self.balance(self.rose), (Decimal('5'), Decimal('66')))
+        self.assertEqual(self.balance(self.eucalyptus, self.showcase), (Decimal('0'), Decimal('0')))
+        self.assertEqual(summary, {
+            self.warehouse.pk: {'warehouse': 'Склад', 'batches': 1, 'quantity': Decimal('4'), 'total_cost': Decimal('40')},
+            self.showcase.pk: {'warehouse': 'Витрина', 'batches': 1, 'quantity': Decimal('5'), 'total_cost': Decimal('100')},
+        })
+        movement = StockMovement.objects.get(batch=self.expired, movement_type=StockMovement.MovementType.WRITE_OFF)
+        self.assertEqual(movement.write_off_reason, StockMovement.WriteOffReason.EXPIRED)
+        self.assertEqual(movement.notes, AUTO_WRITE_OFF_NOTES)
+
+    def test_reserved_batches_are_kept(self):
+        Batch.objects.filter(pk=self.expired.pk).update(reserved_qty=1)
+
+        write_off_expired_batches(self.org, grace_days=0)
+
+        self.assertEqual(self.remaining(self.expired), 4)
+        self.assertEqual(self.remaining(self.recent), 0)
+
+    def test_small_chunks_give_the_same_summary(self):
+        summary = write_off_expired_batches(self.org, grace_days=0, chunk_size=1)
+
+        self.assertEqual(summary[self.warehouse.pk]['batches'], 2)
+        self.assertEqual(summary[self.warehouse.pk]['total_cost'], Decimal('76'))
+        self.assertEqual(self.balance(self.rose), (Decimal('2'), Decimal('30')))
+
+    def test_second_run_finds_nothing(self):
+        write_off_expired_batches(self.org, grace_days=0)
+
+        self.assertEqual(write_off_expired_batches(self.org, grace_days=0), {})
@@ -0,0 +1,67 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.models import User
+from apps.inventory.models import Batch, ExpiryAlert
+from apps.inventory.tasks import check_expiring_batches, refresh_expiry_alerts
+
+from .base import StockTestCase
+
+
+class ExpiryAlertsTests(StockTestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.tomorrow = self.today + timedelta(days=1)
+        self.first = self.receive(self.rose, 4, 10, expiry_date=self.tomorrow)
+        self.receive(self.rose, 6, 12, expiry_date=self.tomorrow)
+        self.receive(self.eucalyptus, 3, 20, warehouse=self.showcase, expiry_date=self.today)
+        # Не попадают: срок не скоро, срок уже прошёл
+        self.receive(self.rose, 5, 10, expiry_date=self.today + timedelta(days=10))
+        self.receive(self.eucalyptus, 2, 20, expiry_date=self.today - timedelta(days=1))
+
+    def alerts(self):
+        return {
+            (row.warehouse_id, row.nomenclature_id, row.expiry_date): (
+                row.quantity, row.total_cost, row.batches_count,
+            )
+            for row in ExpiryAlert.objects.filter(organization=self.org)
+        }
+
+    def test_batches_are_aggregated_per_warehouse_item_and_date(self):
+        self.assertEqual(refresh_expiry_alerts(str(self.org.pk), chunk_size=1), 2)
+
+        self.assertEqual(self.alerts(), {
+            (self.warehouse.pk, self.rose.pk, self.tomorrow): (Decimal('10'), Decimal('112'), 2),
+            (self.showcase.pk, self.eucalyptus.pk, self.today): (Decimal('3'), Decimal('60'), 1),
+        })
+        alert = ExpiryAlert.objects.get(nomenclature=self.rose)
+        self.assertEqual(alert.trading_point, self.tp)
+
+    def test_refresh_updates_and_resolves_alerts(self):
+        refresh_expiry_alerts(str(self.org.pk))
+        Batch.objects.filter(pk=self.first.pk).update(remaining=1)
+        Batch.objects.filter(nomenclature=self.eucalyptus, warehouse=self.showcase).update(remaining=0)
+
+        refresh_expiry_alerts(str(self.org.pk))
+
+        self.assertEqual(self.alerts(), {
+            (self.warehouse.pk, self.rose.pk, self.tomorrow): (Decimal('7'), Decimal('82'), 2),
+        })
+
+    def test_daily_check_refreshes_each_organization(self):
+        self.assertEqual(check_expiring_batches(), 1)
+        self.assertEqual(len(self.alerts()), 2)
+
+    def test_endpoint_lists_persisted_alerts(self):
+        refresh_expiry_alerts(str(self.org.pk))
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='keeper', organization=self.org, role='owner'))
+
+        response = client.get('/api/inventory/expiry-alerts/')
+
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual({row['nomenclature_name'] for row in rows}, {'Роза', 'Эвкалипт'})
@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+
+from apps.inventory.services import InsufficientStockError, fifo_write_off_many
+
+from .base import StockTestCase
+
+
+class FifoWriteOffManyTests(StockTestCase):
+    def setUp(self):
+        self.old = self.receive(self.rose, 5, 10, arrival_date=date(2026, 1, 1))
+        self.new = self.receive(self.rose, 5, 20, arrival_date=date(2026, 1, 2))
+        self.green = self.receive(self.eucalyptus, 2, 3)
+
+    def line(self, nomenclature, quantity):
+        return {'warehouse': self.warehouse, 'nomenclature': nomenclature, 'quantity': Decimal(quantity)}
+
+    def test_lines_of_one_pair_consume_batches_in_fifo_order(self):
+        first, second = fifo_write_off_many(self.org, [self.line(self.rose, '3'), self.line(self.rose, '4')])
+
+        self.assertEqual([(r['batch'].pk, r['qty']) for r in first], [(self.old.pk, Decimal('3'))])
+        self.assertEqual(
+            [(r['batch'].pk, r['qty'], r['price']) for r in second],
+            [(self.old.pk, Decimal('2'), Decimal('10')), (self.new.pk, Decimal('2'), Decimal('20'))],
+        )
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertEqual((self.old.remaining, self.new.remaining), (Decimal('0'), Decimal('3')))
+
+    def test_shortage_raises_before_any_batch_changes(self):
+        with self.assertRaises(InsufficientStockError):
+            fifo_write_off_many(self.org, [self.line(self.rose, '3'), self.line(self.eucalyptus, '5')])
+
+        self.old.refresh_from_db()
+        self.green.refresh_from_db()
+        self.assertEqual((self.old.remaining, self.green.remaining), (Decimal('5'), Decimal('2')))
+
+    def test_allow_shortage_returns_what_is_left(self):
+        roses, greens = fifo_write_off_many(
+            self.org, [self.line(self.rose, '12'), self.line(self.eucalyptus, '1')], allow_shortage=True,
+        )
+
+        self.assertEqual(sum(r['qty'] for r in roses), Decimal('10'))
+        self.assertEqual(sum(r['qty'] for r in greens), Decimal('1'))
+        self.new.refresh_from_db()
+        self.assertEqual(self.new.remaining, Decimal('0'))
+
+    def test_non_positive_lines_get_empty_results(self):
+        result = fifo_write_off_many(self.org, [self.line(self.rose, '0')])
+
+        self.assertEqual(result, [[]])
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.db import connection
+
+from apps.inventory.models import Batch
+from apps.inventory.services import fifo_queue
+
+from .base import StockTestCase
+
+
+class FifoQueueTests(StockTestCase):
+    def setUp(self):
+        self.late = self.receive(self.rose, 1, 10, arrival_date=date(2026, 1, 3))
+        self.early = self.receive(self.rose, 1, 10, arrival_date=date(2026, 1, 1))
+        self.same_day = self.receive(self.rose, 1, 10, arrival_date=date(2026, 1, 1))
+        self.depleted = self.receive(self.rose, 1, 10, arrival_date=date(2025, 12, 1))
+        Batch.objects.filter(pk=self.depleted.pk).update(remaining=0)
+        self.other_pair = self.receive(self.rose, 1, 10, warehouse=self.showcase)
+
+    def test_queue_holds_live_batches_of_the_pair_in_write_off_order(self):
+        queue = fifo_queue(self.org, [(self.warehouse.pk, self.rose.pk)])
+
+        self.assertEqual(list(queue.values_list('pk', flat=True)), [self.early.pk, self.same_day.pk, self.late.pk])
+
+    def test_queue_is_read_from_the_partial_index_without_sorting(self):
+        queue = fifo_queue(self.org, [(self.warehouse.pk, self.rose.pk)]).values_list(
+            'remaining', 'purchase_price',
+        )
+        sql, params = queue.query.sql_with_params()
+        with connection.cursor() as cursor:
+            # На нескольких строках планировщик предпочёл бы seq scan
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('idx_batch_fifo_live', plan)
+        self.assertNotIn('Sort', plan)
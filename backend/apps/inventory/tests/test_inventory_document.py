@@ -0,0 +1,100 @@
+from datetime import date
+from decimal import Decimal
+
+from apps.core.models import Warehouse
+from apps.inventory import services
+from apps.inventory.models import Batch, InventoryDocument, InventoryItem, StockMovement
+from apps.sales.models import Sale, SaleItem
+from apps.sales.services import do_sale_fifo_write_off
+
+from .base import StockTestCase
+
+
+class PostInventoryDocumentTests(StockTestCase):
+    def setUp(self):
+        self.receive(self.rose, 10, 10, arrival_date=date(2026, 1, 1))
+        self.receive(self.rose, 5, 20, arrival_date=date(2026, 1, 2))
+        self.receive(self.eucalyptus, 4, 30)
+        self.document = InventoryDocument.objects.create(
+            organization=self.org, warehouse=self.warehouse, number='И-1',
+        )
+        services.seed_inventory_document(self.document)
+
+    def count(self, *counts):
+        services.apply_inventory_counts(self.document, [
+            {'nomenclature': nomenclature.pk, 'actual_quantity': Decimal(quantity)}
+            for nomenclature, quantity in counts
+        ])
+
+    def test_seed_takes_expected_quantities_from_balances(self):
+        expected = dict(
+            InventoryItem.objects.filter(document=self.document)
+            .values_list('nomenclature_id', 'expected_quantity')
+        )
+        self.assertEqual(expected, {self.rose.pk: Decimal('15'), self.eucalyptus.pk: Decimal('4')})
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, InventoryDocument.Status.IN_PROGRESS)
+
+    def test_shortage_is_written_off_fifo(self):
+        self.count((self.rose, '3'))
+
+        result = services.post_inventory_document(self.document)
+
+        self.assertEqual(result, {'surplus': 0, 'shortage': 1})
+        # 12 шт.: 10 из первой партии по 10 и 2 из второй по 20
+        self.assertEqual(self.balance(self.rose), (Decimal('3'), Decimal('60')))
+        remaining = list(
+            Batch.objects.filter(nomenclature=self.rose).order_by('arrival_date').values_list('remaining', flat=True)
+        )
+        self.assertEqual(remaining, [Decimal('0'), Decimal('3')])
+        self.assertEqual(self.balance(self.eucalyptus), (Decimal('4'), Decimal('120')))
+
+    def test_surplus_creates_batch_at_average_price(self):
+        self.count((self.eucalyptus, '6'))
+
+        services.post_inventory_document(self.document)
+
+        surplus = Batch.objects.get(nomenclature=self.eucalyptus, notes__endswith='излишек')
+        self.assertEqual((surplus.quantity, surplus.purchase_price), (Decimal('2'), Decimal('30')))
+        self.assertEqual(self.balance(self.eucalyptus), (Decimal('6'), Decimal('180')))
+        self.assertTrue(StockMovement.objects.filter(
+            batch=surplus, movement_type=StockMovement.MovementType.ADJUSTMENT,
+        ).exists())
+
+    def test_uncovered_shortage_goes_negative_without_batch(self):
+        self.count((self.eucalyptus, '0'))
+        Batch.objects.filter(nomenclature=self.eucalyptus).update(remaining=1)
+
+        services.post_inventory_document(self.document)
+
+        self.assertEqual(self.balance(self.eucalyptus)[0], Decimal('0'))
+        self.assertTrue(StockMovement.objects.filter(
+            nomenclature=self.eucalyptus, batch__isnull=True, notes__endswith='(без партии)',
+            quantity=Decimal('3'),
+        ).exists())
+
+    def test_difference_is_recomputed_from_current_balance(self):
+        self.count((self.rose, '12'))
+        # Пока шёл пересчёт, продали 5 шт.: остаток 10, на полке насчитали 12
+        Warehouse.objects.filter(pk=self.warehouse.pk).update(is_default_for_sales=True)
+        sale = Sale.objects.create(organization=self.org, trading_point=self.tp, number='1')
+        SaleItem.objects.create(sale=sale, nomenclature=self.rose, quantity=Decimal('5'), price=Decimal('50'))
+        do_sale_fifo_write_off(sale)
+
+        result = services.post_inventory_document(self.document)
+
+        self.assertEqual(result, {'surplus': 1, 'shortage': 0})
+        self.assertEqual(self.balance(self.rose)[0], Decimal('12'))
+        item = InventoryItem.objects.get(document=self.document, nomenclature=self.rose)
+        self.assertEqual((item.expected_quantity, item.difference), (Decimal('10'), Decimal('2')))
+
+    def test_document_cannot_be_posted_twice(self):
+        self.count((self.rose, '14'))
+        services.post_inventory_document(self.document)
+
+        with self.assertRaisesMessage(ValueError, 'Инвентаризация уже проведена.'):
+            services.post_inventory_document(self.document)
+
+        self.assertEqual(self.balance(self.rose)[0], Decimal('14'))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, InventoryDocument.Status.COMPLETED)
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from apps.inventory.ledger import get_active_ledger, record_movements, stock_ledger
+from apps.inventory.models import StockBalance, StockMovement
+from apps.inventory.services import _update_stock_balance
+
+from .base import StockTestCase
+
+
+class StockLedgerTests(StockTestCase):
+    def movement(self, quantity):
+        return StockMovement(
+            organization=self.org, nomenclature=self.rose,
+            movement_type=StockMovement.MovementType.ADJUSTMENT,
+            warehouse_to=self.warehouse, quantity=Decimal(quantity), price=Decimal('10'),
+        )
+
+    def test_deltas_of_one_pair_are_coalesced_into_one_balance_update(self):
+        with stock_ledger() as ledger:
+            _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('5'), Decimal('50'))
+            _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('-2'), Decimal('-20'))
+            _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('1'), Decimal('12'))
+            _update_stock_balance(self.org, self.showcase, self.rose, Decimal('3'), Decimal('30'))
+
+            self.assertEqual(len(ledger.balance_deltas), 2)
+            self.assertFalse(StockBalance.objects.filter(organization=self.org).exists())
+
+        self.assertEqual(self.balance(self.rose), (Decimal('4'), Decimal('42')))
+        self.assertEqual(self.balance(self.rose, self.showcase), (Decimal('3'), Decimal('30')))
+        sb = StockBalance.objects.get(warehouse=self.warehouse, nomenclature=self.rose)
+        self.assertEqual(sb.avg_purchase_price, Decimal('10.50'))
+
+    def test_movements_are_written_when_the_block_exits(self):
+        with stock_ledger():
+            record_movements([self.movement('1'), self.movement('2')])
+            self.assertEqual(StockMovement.objects.filter(organization=self.org).count(), 0)
+
+        self.assertEqual(StockMovement.objects.filter(organization=self.org).count(), 2)
+
+    def test_nested_block_joins_the_outer_ledger(self):
+        with stock_ledger() as outer:
+            with stock_ledger() as inner:
+                self.assertIs(inner, outer)
+                _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('1'), Decimal('10'))
+            self.assertEqual(self.balance(self.rose), (Decimal('0'), Decimal('0')))
+
+        self.assertIsNone(get_active_ledger())
+        self.assertEqual(self.balance(self.rose), (Decimal('1'), Decimal('10')))
+
+    def test_exception_discards_the_ledger(self):
+        with self.assertRaises(RuntimeError):
+            with stock_ledger():
+                record_movements([self.movement('1')])
+                _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('1'), Decimal('10'))
+                raise RuntimeError
+
+        self.assertIsNone(get_active_ledger())
+        self.assertFalse(StockMovement.objects.filter(organization=self.org).exists())
+        self.assertFalse(StockBalance.objects.filter(organization=self.org).exists())
+
+    def test_delta_without_cost_recomputes_cost_from_batches(self):
+        self.receive(self.rose, 4, 10)
+        self.receive(self.rose, 2, 25)
+
+        with stock_ledger():
+            _update_stock_balance(self.org, self.warehouse, self.rose, Decimal('0'))
+
+        self.assertEqual(self.balance(self.rose), (Decimal('6'), Decimal('90')))
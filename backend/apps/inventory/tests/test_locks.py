@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+
+from apps.inventory import locks
+from apps.inventory.locks import retry_on_conflict
+
+
+def db_error(pgcode):
+    error = DatabaseError('conflict')
+    error.__cause__ = type('PgError', (Exception,), {'pgcode': pgcode})()
+    return error
+
+
+@mock.patch.object(locks.time, 'sleep')
+class RetryOnConflictTests(TestCase):
+    def flaky(self, *errors):
+        calls = []
+
+        @retry_on_conflict
+        def operation():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'ok'
+
+        return operation, calls
+
+    def test_deadlock_and_serialization_failure_are_retried(self, sleep):
+        operation, calls = self.flaky(db_error('40P01'), db_error('40001'))
+
+        with self.assertLogs('apps.inventory.locks', 'WARNING'):
+            self.assertEqual(self.run_outside_atomic(operation), 'ok')
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_gives_up_after_the_last_attempt(self, sleep):
+        operation, calls = self.flaky(*[db_error('40P01')] * locks.DB_CONFLICT_ATTEMPTS)
+
+        with self.assertLogs('apps.inventory.locks', 'WARNING'), self.assertRaises(DatabaseError):
+            self.run_outside_atomic(operation)
+
+        self.assertEqual(len(calls), locks.DB_CONFLICT_ATTEMPTS)
+
+    def test_other_errors_are_not_retried(self, sleep):
+        operation, calls = self.flaky(db_error('23505'))
+
+        with self.assertRaises(DatabaseError):
+            self.run_outside_atomic(operation)
+
+        self.assertEqual(len(calls), 1)
+
+    def test_inside_outer_transaction_the_error_goes_to_its_owner(self, sleep):
+        operation, calls = self.flaky(db_error('40P01'))
+
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            operation()
+
+        self.assertEqual(len(calls), 1)
+
+    def run_outside_atomic(self, operation):
+        # TestCase держит транзакцию теста — изображаем вызов верхнего уровня
+        with mock.patch.object(locks.connection, 'in_atomic_block', False):
+            return operation()
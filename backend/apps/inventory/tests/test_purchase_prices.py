@@ -0,0 +1,64 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.db import transaction
+from django.test import override_settings
+
+from apps.inventory import services
+from apps.inventory.models import Batch
+
+from .base import StockTestCase
+
+
+class DeferredPurchasePriceTests(StockTestCase):
+    def price(self, nomenclature):
+        nomenclature.refresh_from_db(fields=['purchase_price'])
+        return nomenclature.purchase_price
+
+    def test_price_is_recomputed_once_after_commit(self):
+        with mock.patch.object(
+            services, 'recompute_purchase_prices', wraps=services.recompute_purchase_prices,
+        ) as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.receive(self.rose, 10, 10, arrival_date=date(2026, 1, 1))
+                self.receive(self.rose, 10, 20, arrival_date=date(2026, 1, 2))
+                self.receive(self.eucalyptus, 5, 30)
+                self.assertEqual(self.price(self.rose), Decimal('0'))
+
+        recompute.assert_called_once()
+        self.assertEqual(set(recompute.call_args.args[0]), {self.rose.pk, self.eucalyptus.pk})
+        self.assertEqual(self.price(self.rose), Decimal('15'))
+        self.assertEqual(self.price(self.eucalyptus), Decimal('30'))
+
+    def test_rolled_back_marks_are_dropped(self):
+        with mock.patch.object(services, 'recompute_purchase_prices') as recompute:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        services.mark_purchase_price_dirty([self.rose.pk])
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                services.mark_purchase_price_dirty([self.eucalyptus.pk])
+
+        recompute.assert_called_once_with({self.eucalyptus.pk})
+
+    @override_settings(PURCHASE_PRICE_RECOMPUTE_ASYNC=True)
+    def test_async_mode_queues_one_task(self):
+        with mock.patch('apps.inventory.tasks.recompute_purchase_prices_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                services.mark_purchase_price_dirty([self.rose.pk])
+                services.mark_purchase_price_dirty([self.rose.pk, self.eucalyptus.pk])
+
+        delay.assert_called_once()
+        self.assertEqual(set(delay.call_args.args[0]), {str(self.rose.pk), str(self.eucalyptus.pk)})
+
+    def test_depleted_item_takes_last_batch_price(self):
+        self.receive(self.rose, 2, 10, arrival_date=date(2026, 1, 1))
+        self.receive(self.rose, 2, 14, arrival_date=date(2026, 1, 5))
+        Batch.objects.filter(nomenclature=self.rose).update(remaining=0)
+
+        self.assertEqual(services.recompute_purchase_prices([self.rose.pk, self.bouquet.pk]), 1)
+        self.assertEqual(self.price(self.rose), Decimal('14'))
+        self.assertEqual(self.price(self.bouquet), Decimal('0'))
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from unittest import mock
+
+from apps.inventory import read_model
+from apps.inventory.models import StockReadModel
+
+from .base import StockTestCase
+
+
+class StockReadModelRefreshTests(StockTestCase):
+    def rows(self):
+        return set(StockReadModel.objects.values_list('warehouse_id', 'nomenclature_id', 'quantity'))
+
+    def test_pairs_of_a_transaction_are_refreshed_once_after_commit(self):
+        with mock.patch.object(
+            read_model, 'refresh_stock_read_model', wraps=read_model.refresh_stock_read_model,
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.receive(self.rose, 5, 10)
+                self.receive(self.rose, 2, 10)
+                self.receive(self.eucalyptus, 3, 20, warehouse=self.showcase)
+
+            refresh.assert_not_called()
+            self.assertEqual(self.rows(), set())
+
+            for callback in callbacks:
+                callback()
+
+        refresh.assert_called_once_with({
+            (str(self.warehouse.pk), str(self.rose.pk)),
+            (str(self.showcase.pk), str(self.eucalyptus.pk)),
+        })
+        self.assertEqual(self.rows(), {
+            (self.warehouse.pk, self.rose.pk, Decimal('7')),
+            (self.showcase.pk, self.eucalyptus.pk, Decimal('3')),
+        })
+
+    def test_failed_refresh_does_not_break_the_operation(self):
+        with mock.patch.object(read_model, 'refresh_stock_read_model', side_effect=RuntimeError), \
+                self.assertLogs('apps.inventory.read_model', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.receive(self.rose, 5, 10)
+
+        self.assertEqual(self.balance(self.rose), (Decimal('5'), Decimal('50')))
@@ -0,0 +1,95 @@
+from datetime import date
+from decimal import Decimal
+
+from apps.finance.models import Debt
+from apps.inventory import services
+from apps.inventory.models import Batch, ReceiptDocument, ReceiptDocumentItem, StockMovement
+from apps.nomenclature.models import Nomenclature, PurchasePriceHistory
+from apps.suppliers.models import Supplier, SupplierNomenclature
+
+from .base import StockTestCase
+
+
+class ProcessBatchReceiptsTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.supplier = Supplier.objects.create(organization=cls.org, name='Голландия')
+        SupplierNomenclature.objects.create(supplier=cls.supplier, nomenclature=cls.rose, price=Decimal('8'))
+
+    def line(self, nomenclature, quantity, price, warehouse=None, **kwargs):
+        return {
+            'warehouse': warehouse or self.warehouse, 'nomenclature': nomenclature,
+            'quantity': Decimal(quantity), 'purchase_price': Decimal(price), **kwargs,
+        }
+
+    def test_delivery_is_posted_in_one_call(self):
+        batches = services.process_batch_receipts(self.org, [
+            self.line(self.rose, '10', '9'),
+            self.line(self.eucalyptus, '5', '20', notes='Свежий'),
+            self.line(self.rose, '6', '11', warehouse=self.showcase),
+            self.line(self.rose, '4', '12'),
+        ], supplier=self.supplier, arrival_date=date(2026, 2, 1), invoice_number='Н-7')
+
+        self.assertEqual([b.quantity for b in batches], [Decimal('10'), Decimal('5'), Decimal('6'), Decimal('4')])
+        self.assertEqual(Batch.objects.filter(invoice_number='Н-7', arrival_date=date(2026, 2, 1)).count(), 4)
+        self.assertEqual(self.balance(self.rose), (Decimal('14'), Decimal('138')))
+        self.assertEqual(self.balance(self.rose, self.showcase), (Decimal('6'), Decimal('66')))
+        self.assertEqual(self.balance(self.eucalyptus), (Decimal('5'), Decimal('100')))
+
+        movements = StockMovement.objects.filter(movement_type=StockMovement.MovementType.RECEIPT)
+        self.assertEqual(movements.count(), 4)
+        self.assertEqual(set(movements.values_list('notes', flat=True)), {'Приход партии: Н-7'})
+        self.assertEqual(PurchasePriceHistory.objects.filter(nomenclature__organization=self.org).count(), 4)
+
+        # Цена поставщика — последняя цена прихода позиции; новая позиция добавляется
+        self.assertEqual(
+            dict(SupplierNomenclature.objects.filter(supplier=self.supplier).values_list('nomenclature', 'price')),
+            {self.rose.pk: Decimal('12'), self.eucalyptus.pk: Decimal('20')},
+        )
+        self.assertEqual(
+            sorted(Debt.objects.filter(supplier=self.supplier).values_list('amount', flat=True)),
+            [Decimal('48'), Decimal('66'), Decimal('90'), Decimal('100')],
+        )
+
+    def test_without_debt(self):
+        services.process_batch_receipts(
+            self.org, [self.line(self.rose, '1', '10')], supplier=self.supplier, create_debt=False,
+        )
+
+        self.assertFalse(Debt.objects.filter(supplier=self.supplier).exists())
+
+    def test_service_lines_are_rejected_before_any_write(self):
+        delivery = Nomenclature.objects.create(organization=self.org, name='Доставка', accounting_type='service')
+
+        with self.assertRaisesMessage(ValueError, 'Услуги нельзя проводить через поступления.'):
+            services.process_batch_receipts(self.org, [
+                self.line(self.rose, '1', '10'),
+                self.line(delivery, '1', '300'),
+            ])
+
+        self.assertFalse(Batch.objects.filter(organization=self.org).exists())
+
+    def test_receipt_document_posts_items_with_one_supplier_debt(self):
+        document = ReceiptDocument.objects.create(
+            organization=self.org, number=12, date=date(2026, 2, 3), supplier=self.supplier,
+        )
+        roses = ReceiptDocumentItem.objects.create(
+            document=document, nomenclature=self.rose, warehouse=self.warehouse,
+            quantity=Decimal('10'), purchase_price=Decimal('9'), retail_price=Decimal('25'),
+        )
+        ReceiptDocumentItem.objects.create(
+            document=document, nomenclature=self.eucalyptus, warehouse=self.showcase,
+            quantity=Decimal('3'), purchase_price=Decimal('20'),
+        )
+
+        services.process_receipt_document(document)
+
+        roses.refresh_from_db()
+        self.assertEqual((roses.batch.receipt_document, roses.total), (document, Decimal('90')))
+        self.assertEqual(self.balance(self.eucalyptus, self.showcase), (Decimal('3'), Decimal('60')))
+        self.assertEqual(document.total_cost, Decimal('150'))
+        self.rose.refresh_from_db()
+        self.assertEqual(self.rose.retail_price, Decimal('25'))
+        self.assertEqual(list(Debt.objects.filter(supplier=self.supplier).values_list('amount', flat=True)),
+                         [Decimal('150')])
@@ -0,0 +1,79 @@
+import csv
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from apps.core.models import Organization, TradingPoint, Warehouse
+from apps.inventory import services
+from apps.inventory.models import Batch, StockBalance, StockMovement
+from apps.inventory.reconciliation import reconcile_warehouse
+from apps.nomenclature.models import Nomenclature
+
+
+class ReconcileWarehouseTests(TransactionTestCase):
+    # Сверка выставляет REPEATABLE READ в начале собственной транзакции
+    def setUp(self):
+        self.org = Organization.objects.create(name='Букетная')
+        tp = TradingPoint.objects.create(organization=self.org, name='Мост')
+        self.warehouse = Warehouse.objects.create(organization=self.org, trading_point=tp, name='Склад')
+        self.tulip = Nomenclature.objects.create(organization=self.org, name='Тюльпан')
+        self.mimosa = Nomenclature.objects.create(organization=self.org, name='Мимоза')
+        for nomenclature in (self.tulip, self.mimosa):
+            services.process_batch_receipt(
+                self.org, self.warehouse, nomenclature, None, Decimal('5'), Decimal('10'),
+            )
+
+    def quantity(self, nomenclature):
+        return StockBalance.objects.get(warehouse=self.warehouse, nomenclature=nomenclature).quantity
+
+    def test_consistent_warehouse_has_no_diffs(self):
+        self.assertEqual(reconcile_warehouse(self.warehouse.pk), [])
+
+    def test_sale_into_negative_is_not_a_diff(self):
+        StockMovement.objects.create(
+            organization=self.org, nomenclature=self.mimosa,
+            movement_type=StockMovement.MovementType.SALE, warehouse_from=self.warehouse,
+            quantity=Decimal('7'), price=Decimal('10'),
+        )
+        Batch.objects.filter(nomenclature=self.mimosa).update(remaining=0)
+        StockBalance.objects.filter(nomenclature=self.mimosa).update(quantity=Decimal('-2'))
+
+        self.assertEqual(reconcile_warehouse(self.warehouse.pk), [])
+
+    def test_mismatch_is_reported_and_repaired_from_the_ledger(self):
+        StockBalance.objects.filter(nomenclature=self.tulip).update(quantity=Decimal('8'))
+
+        diffs = reconcile_warehouse(self.warehouse.pk)
+
+        self.assertEqual(len(diffs), 1)
+        self.assertEqual(diffs[0]['nomenclature_id'], str(self.tulip.pk))
+        self.assertEqual(
+            (diffs[0]['balance_qty'], diffs[0]['movements_qty'], diffs[0]['batches_qty'], diffs[0]['ledger_delta']),
+            ('8.00', '5.00', '5.00', '-3.00'),
+        )
+        self.assertEqual(self.quantity(self.tulip), Decimal('8'))
+
+        reconcile_warehouse(self.warehouse.pk, repair=True)
+
+        self.assertEqual(self.quantity(self.tulip), Decimal('5'))
+        self.assertEqual(self.quantity(self.mimosa), Decimal('5'))
+        self.assertEqual(reconcile_warehouse(self.warehouse.pk), [])
+
+    def test_command_writes_csv_report(self):
+        StockBalance.objects.filter(nomenclature=self.mimosa).update(quantity=Decimal('1'))
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        out = StringIO()
+        call_command('reconcile_stock', '--organization', str(self.org.pk), '--report', path, stdout=out)
+
+        self.assertIn('расхождений: 1.', out.getvalue())
+        with open(path, newline='') as report:
+            rows = list(csv.DictReader(report))
+        self.assertEqual([row['nomenclature_id'] for row in rows], [str(self.mimosa.pk)])
+        self.assertEqual(rows[0]['ledger_delta'], '4.00')
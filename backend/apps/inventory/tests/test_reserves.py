@@ -0,0 +1,218 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.cashier import views as cashier_views
+from apps.core.models import User, Warehouse
+from apps.inventory import services
+from apps.inventory import views as inventory_views
+from apps.inventory.ledger import stock_ledger
+from apps.inventory.locks import lock_stock
+from apps.inventory.models import Batch, Reserve, StockBalance
+from apps.sales.models import Sale
+
+from .base import StockTestCase
+
+
+class ReservedQtyTests(StockTestCase):
+    def setUp(self):
+        self.batch = self.receive(self.bouquet, 5, 1500)
+
+    def reserve(self, quantity='1'):
+        reserve = Reserve.objects.create(
+            organization=self.org, trading_point=self.tp, warehouse=self.warehouse,
+            bouquet_nomenclature=self.bouquet, batch=self.batch, quantity=Decimal(quantity),
+        )
+        services.shift_reserved_qty(reserve, 1)
+        return reserve
+
+    def reserved(self):
+        batch = Batch.objects.get(pk=self.batch.pk).reserved_qty
+        balance = StockBalance.objects.get(warehouse=self.warehouse, nomenclature=self.bouquet).reserved_qty
+        return batch, balance
+
+    def test_created_reserves_add_up(self):
+        self.reserve('2')
+        self.reserve('1')
+
+        self.assertEqual(self.reserved(), (Decimal('3'), Decimal('3')))
+
+    def test_cancel_releases_the_reserve(self):
+        reserve = self.reserve('2')
+        self.reserve('1')
+
+        services.shift_reserved_qty(services.lock_reserve(reserve), -1)
+        reserve.status = Reserve.Status.CANCELLED
+        reserve.cancelled_at = timezone.now()
+        reserve.save(update_fields=['status', 'cancelled_at', 'updated_at'])
+
+        self.assertEqual(self.reserved(), (Decimal('1'), Decimal('1')))
+
+    def test_sell_releases_the_reserve_once(self):
+        reserve = self.reserve('2')
+        stale = Reserve.objects.get(pk=reserve.pk)
+
+        services.shift_reserved_qty(services.lock_reserve(reserve), -1)
+        reserve.status = Reserve.Status.SOLD
+        reserve.save(update_fields=['status', 'updated_at'])
+        # Второе снятие по устаревшей копии перечитывает статус и ничего не вычитает
+        services.shift_reserved_qty(services.lock_reserve(stale), -1)
+
+        self.assertEqual(stale.status, Reserve.Status.SOLD)
+        self.assertEqual(self.reserved(), (Decimal('0'), Decimal('0')))
+
+    def test_inactive_reserve_does_not_touch_counters(self):
+        reserve = Reserve(
+            organization=self.org, warehouse=self.warehouse, bouquet_nomenclature=self.bouquet,
+            batch=self.batch, quantity=Decimal('2'), status=Reserve.Status.EXPIRED,
+        )
+        services.shift_reserved_qty(reserve, 1)
+
+        self.assertEqual(self.reserved(), (Decimal('0'), Decimal('0')))
+
+    def test_counter_helpers_take_no_stock_locks(self):
+        with mock.patch.object(services, 'lock_stock') as lock_stock:
+            reserve = self.reserve('1')
+            services.shift_reserved_qty(services.lock_reserve(reserve), -1)
+
+        lock_stock.assert_not_called()
+
+    def test_stock_keys_cover_old_and_new_pair(self):
+        reserve = self.reserve('1')
+
+        self.assertEqual(services.reserve_stock_keys(reserve), [(self.warehouse.pk, self.bouquet.pk)])
+        self.assertEqual(
+            services.reserve_stock_keys(reserve, {'warehouse': self.showcase}),
+            [(self.warehouse.pk, self.bouquet.pk), (self.showcase, self.bouquet.pk)],
+        )
+        self.assertEqual(services.reserve_stock_keys(changes={'warehouse': self.showcase}), [])
+
+    def test_counters_do_not_go_negative(self):
+        reserve = self.reserve('1')
+        Batch.objects.filter(pk=self.batch.pk).update(reserved_qty=0)
+        StockBalance.objects.filter(nomenclature=self.bouquet).update(reserved_qty=0)
+
+        services.shift_reserved_qty(reserve, -1)
+
+        self.assertEqual(self.reserved(), (Decimal('0'), Decimal('0')))
+
+
+class ReserveViewSetTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='seller', organization=cls.org, role='owner')
+
+    def setUp(self):
+        self.batch = self.receive(self.bouquet, 5, 1500)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def reserved_qty(self):
+        return StockBalance.objects.get(warehouse=self.warehouse, nomenclature=self.bouquet).reserved_qty
+
+    def test_create_update_delete_keep_counters_in_step(self):
+        response = self.client.post('/api/inventory/reserves/', {
+            'warehouse': str(self.warehouse.pk), 'bouquet_nomenclature': str(self.bouquet.pk),
+            'batch': str(self.batch.pk), 'quantity': '2',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.reserved_qty(), Decimal('2'))
+
+        url = f'/api/inventory/reserves/{response.data["id"]}/'
+        self.assertEqual(self.client.patch(url, {'quantity': '3'}, format='json').status_code, 200)
+        self.assertEqual(self.reserved_qty(), Decimal('3'))
+
+        self.assertEqual(self.client.patch(url, {'status': 'cancelled'}, format='json').status_code, 200)
+        self.assertEqual(self.reserved_qty(), Decimal('0'))
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.reserved_qty(), Decimal('0'))
+        self.assertEqual(Batch.objects.get(pk=self.batch.pk).reserved_qty, Decimal('0'))
+
+    def test_moving_a_reserve_locks_both_pairs_first(self):
+        reserve = Reserve.objects.create(
+            organization=self.org, trading_point=self.tp, warehouse=self.warehouse,
+            bouquet_nomenclature=self.bouquet, batch=self.batch, quantity=Decimal('1'),
+        )
+        services.shift_reserved_qty(reserve, 1)
+
+        with mock.patch.object(inventory_views, 'lock_stock', wraps=inventory_views.lock_stock) as lock_stock:
+            response = self.client.patch(
+                f'/api/inventory/reserves/{reserve.pk}/', {'warehouse': str(self.showcase.pk)}, format='json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        (keys,), _ = lock_stock.call_args
+        self.assertEqual(
+            {(str(getattr(w, 'pk', w)), str(getattr(n, 'pk', n))) for w, n in keys},
+            {(str(self.warehouse.pk), str(self.bouquet.pk)), (str(self.showcase.pk), str(self.bouquet.pk))},
+        )
+        self.assertEqual(self.reserved_qty(), Decimal('0'))
+
+
+class CheckoutReserveLockTests(StockTestCase):
+    """Резерв на партию витрины при складе продаж точки — основном складе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Warehouse.objects.filter(pk=cls.warehouse.pk).update(is_default_for_sales=True)
+        cls.user = User.objects.create(username='cashier', organization=cls.org, role='owner')
+
+    def setUp(self):
+        self.batch = self.receive(self.bouquet, 2, 1500, warehouse=self.showcase)
+        self.reserve = Reserve.objects.create(
+            organization=self.org, trading_point=self.tp, warehouse=self.showcase,
+            bouquet_nomenclature=self.bouquet, batch=self.batch, quantity=Decimal('1'),
+        )
+        services.shift_reserved_qty(self.reserve, 1)
+
+    def line(self, **extra):
+        return {
+            'source_mode': 'reserve', 'nomenclature': self.bouquet.pk, 'reserve': self.reserve.pk,
+            'quantity': Decimal('1'), 'price': Decimal('2500'), **extra,
+        }
+
+    def test_reserve_line_locks_the_reserved_batch_pair(self):
+        # В строке — партия основного склада, продаётся же партия резерва с витрины
+        other = self.receive(self.bouquet, 1, 1500)
+
+        keys = cashier_views.CheckoutView()._stock_keys(self.org, self.tp, [
+            self.line(batch=other.pk),
+            {'source_mode': 'catalog', 'nomenclature': self.rose.pk, 'quantity': Decimal('1'), 'price': Decimal('1')},
+        ])
+
+        self.assertEqual(keys, [
+            (self.showcase.pk, self.bouquet.pk),
+            (self.showcase.pk, self.bouquet.pk),
+            (self.warehouse.pk, self.rose.pk),
+        ])
+
+    def test_selling_a_reserve_takes_no_new_stock_locks(self):
+        sale = Sale.objects.create(organization=self.org, trading_point=self.tp, number='1')
+        view = cashier_views.CheckoutView()
+        lock_stock(view._stock_keys(self.org, self.tp, [self.line(batch=self.batch.pk)]))
+
+        with mock.patch.object(services, 'lock_stock', wraps=services.lock_stock) as nested, stock_ledger():
+            view._sell_reserve(
+                self.org, self.bouquet, Decimal('1'), Decimal('2500'), Decimal('0'),
+                self.line(batch=self.batch.pk), sale, self.user,
+            )
+
+        # Вложенные блокировки (остаток) — только уже удерживаемая пара витрины
+        for (keys, *_), _ in nested.call_args_list:
+            self.assertEqual(
+                {(str(getattr(w, 'pk', w)), str(getattr(n, 'pk', n))) for w, n in keys},
+                {(str(self.showcase.pk), str(self.bouquet.pk))},
+            )
+        self.reserve.refresh_from_db()
+        self.assertEqual(self.reserve.status, Reserve.Status.SOLD)
+        self.assertEqual(
+            StockBalance.objects.values_list('quantity', 'reserved_qty').get(
+                warehouse=self.showcase, nomenclature=self.bouquet,
+            ),
+            (Decimal('1'), Decimal('0')),
+        )
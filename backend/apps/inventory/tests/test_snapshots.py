@@ -0,0 +1,115 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.models import User
+from apps.inventory.models import StockBalance, StockMovement, StockSnapshot
+from apps.inventory.snapshots import (
+    MAX_REPLAY, SnapshotUnavailable, TOTAL_COST_NOTE, build_stock_snapshots, stock_as_of,
+)
+
+from .base import StockTestCase
+
+
+class StockAsOfTests(StockTestCase):
+    """
+    Роза: снимок A — 10 шт., через 3 ч списание 4 шт., снимок B через сутки
+    после A — 6 шт.; после B приход 2 шт. (сейчас 8 шт.).
+    """
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.a = self.now - timedelta(days=10)
+        self.b = self.a + timedelta(days=1)
+        self.snapshot(self.a, '10', '100')
+        self.snapshot(self.b, '6', '60')
+        self.movement(self.a + timedelta(hours=3), '4', warehouse_from=self.warehouse)
+        self.movement(self.now - timedelta(hours=1), '2', warehouse_to=self.warehouse)
+        StockBalance.objects.create(
+            organization=self.org, warehouse=self.warehouse, nomenclature=self.rose,
+            quantity=Decimal('8'), total_cost=Decimal('80'),
+        )
+
+    def snapshot(self, taken_at, quantity, total_cost):
+        StockSnapshot.objects.create(
+            organization=self.org, warehouse=self.warehouse, nomenclature=self.rose,
+            snapshot_date=timezone.localdate(taken_at), taken_at=taken_at,
+            quantity=Decimal(quantity), total_cost=Decimal(total_cost),
+        )
+
+    def movement(self, created_at, quantity, **warehouses):
+        movement = StockMovement.objects.create(
+            organization=self.org, nomenclature=self.rose,
+            movement_type=StockMovement.MovementType.ADJUSTMENT,
+            quantity=Decimal(quantity), price=Decimal('10'), **warehouses,
+        )
+        StockMovement.objects.filter(pk=movement.pk).update(created_at=created_at)
+
+    def as_of(self, at):
+        rows, source = stock_as_of(self.org, at, [self.warehouse])
+        return [(row['quantity'], row['total_cost']) for row in rows], source
+
+    def test_moment_before_a_movement_keeps_the_snapshot_quantity(self):
+        self.assertEqual(self.as_of(self.a + timedelta(hours=2))[0], [(Decimal('10'), Decimal('100.00'))])
+
+    def test_replays_forward_from_the_earlier_snapshot(self):
+        rows, source = self.as_of(self.a + timedelta(hours=5))
+
+        self.assertEqual(rows, [(Decimal('6'), Decimal('60.00'))])
+        self.assertEqual(source, f'snapshot:{timezone.localdate(self.a)}')
+
+    def test_moment_closer_to_the_later_snapshot_starts_from_it(self):
+        rows, source = self.as_of(self.b - timedelta(hours=2))
+
+        self.assertEqual(rows, [(Decimal('6'), Decimal('60.00'))])
+        self.assertEqual(source, f'snapshot:{timezone.localdate(self.b)}')
+
+    def test_recent_moment_replays_backward_from_current_balance(self):
+        rows, source = self.as_of(self.now - timedelta(hours=2))
+
+        self.assertEqual(rows, [(Decimal('6'), Decimal('60.00'))])
+        self.assertEqual(source, 'current')
+
+    def test_moment_far_from_any_snapshot_is_rejected(self):
+        with self.assertRaises(SnapshotUnavailable):
+            stock_as_of(self.org, self.b + MAX_REPLAY + timedelta(hours=1), [self.warehouse])
+        with self.assertRaises(SnapshotUnavailable):
+            stock_as_of(self.org, self.a - MAX_REPLAY - timedelta(hours=1), [self.warehouse])
+
+    def test_build_stock_snapshots_copies_non_zero_balances(self):
+        StockBalance.objects.create(organization=self.org, warehouse=self.warehouse, nomenclature=self.eucalyptus)
+        day = timezone.localdate()
+
+        self.assertEqual(build_stock_snapshots(day, organization=self.org), 1)
+        self.assertEqual(build_stock_snapshots(day, organization=self.org), 1)
+        self.assertEqual(
+            list(StockSnapshot.objects.filter(snapshot_date=day).values_list('nomenclature', 'quantity')),
+            [(self.rose.pk, Decimal('8'))],
+        )
+
+
+class StockAsOfEndpointTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='accountant', organization=cls.org, role='owner')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.receive(self.rose, 3, 10)
+
+    def test_response_carries_the_cost_note(self):
+        response = self.client.get('/api/inventory/stock/as-of/', {'at': timezone.now().isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_cost_note'], TOTAL_COST_NOTE)
+        self.assertEqual([item['quantity'] for item in response.data['items']], ['3.00'])
+
+    def test_date_without_snapshot_is_bad_request(self):
+        response = self.client.get('/api/inventory/stock/as-of/', {'at': '2020-01-01'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Нет снимка остатков', response.data['detail'])
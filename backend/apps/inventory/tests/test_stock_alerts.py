@@ -0,0 +1,72 @@
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from apps.core.models import Warehouse
+from apps.inventory import stock_alerts
+from apps.inventory.stock_alerts import read_stock_alerts
+from apps.nomenclature.models import Nomenclature
+from apps.sales.models import Sale, SaleItem
+from apps.sales.services import do_sale_fifo_write_off
+
+from .base import StockTestCase
+
+try:
+    import fakeredis
+except ImportError:  # тестовая зависимость, в requirements.txt её нет
+    fakeredis = None
+
+
+@unittest.skipIf(fakeredis is None, 'нужен fakeredis')
+class StockAlertsCacheTests(StockTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(stock_alerts, '_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Nomenclature.objects.filter(pk__in=[self.rose.pk, self.eucalyptus.pk]).update(min_stock=Decimal('5'))
+        Warehouse.objects.filter(pk=self.warehouse.pk).update(is_default_for_sales=True)
+        self.member = f'{self.warehouse.pk}:{self.rose.pk}'.encode()
+
+    def zset(self, scope, kind):
+        return dict(self.redis.zrange(stock_alerts._key(self.org.pk, scope, kind), 0, -1, withscores=True))
+
+    def sell(self, nomenclature, quantity):
+        sale = Sale.objects.create(organization=self.org, trading_point=self.tp, number=str(Sale.objects.count() + 1))
+        SaleItem.objects.create(sale=sale, nomenclature=nomenclature, quantity=Decimal(quantity), price=Decimal('50'))
+        do_sale_fifo_write_off(sale)
+
+    def test_stock_changes_are_written_through_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 2, 10)
+        for scope in (stock_alerts.ALL_SCOPE, self.tp.pk):
+            self.assertEqual(self.zset(scope, 'low'), {self.member: 2.0})
+            self.assertEqual(self.zset(scope, 'negative'), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sell(self.rose, '3')
+        self.assertEqual(self.zset(self.tp.pk, 'negative'), {self.member: -1.0})
+        self.assertEqual(self.zset(self.tp.pk, 'low'), {self.member: -1.0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 10, 10)
+        self.assertEqual(self.zset(self.tp.pk, 'negative'), {})
+        self.assertEqual(self.zset(self.tp.pk, 'low'), {})
+        self.assertIsNone(self.redis.hget(stock_alerts._key(self.org.pk, 'items'), self.member))
+
+    def test_cache_is_not_touched_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.receive(self.rose, 2, 10)
+
+        self.assertEqual(self.zset(stock_alerts.ALL_SCOPE, 'low'), {})
+
+    def test_read_rebuilds_cache_and_orders_by_quantity_then_name(self):
+        self.receive(self.rose, 3, 10)
+        self.receive(self.eucalyptus, 3, 10)
+        self.receive(self.bouquet, 1, 100)
+
+        count, items = read_stock_alerts(self.org.pk, self.tp.pk, 'low', 10)
+
+        self.assertEqual(count, 2)
+        self.assertEqual([item['nomenclature_name'] for item in items], ['Роза', 'Эвкалипт'])
+        self.assertTrue(self.redis.exists(stock_alerts._key(self.org.pk, 'ready')))
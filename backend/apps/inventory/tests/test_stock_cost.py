@@ -0,0 +1,59 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+
+from apps.inventory import services
+from apps.inventory.models import StockBalance, StockReadModel
+from apps.sales.models import Sale, SaleItem
+from apps.sales.services import do_sale_fifo_write_off
+
+from .base import StockTestCase
+
+
+class RunningStockCostTests(StockTestCase):
+    def test_total_cost_follows_receipt_sale_and_write_off(self):
+        self.receive(self.rose, 10, 10, arrival_date=date(2026, 1, 1))
+        self.receive(self.rose, 10, 16, arrival_date=date(2026, 1, 2))
+        self.assertEqual(self.balance(self.rose), (Decimal('20'), Decimal('260')))
+
+        sale = Sale.objects.create(organization=self.org, trading_point=self.tp, number='1')
+        SaleItem.objects.create(sale=sale, nomenclature=self.rose, quantity=Decimal('12'), price=Decimal('50'))
+        do_sale_fifo_write_off(sale)
+        # 10 × 10 + 2 × 16
+        self.assertEqual(self.balance(self.rose), (Decimal('8'), Decimal('128')))
+
+        services.write_off_stock(self.org, self.warehouse, self.rose, Decimal('3'))
+        self.assertEqual(self.balance(self.rose), (Decimal('5'), Decimal('80')))
+        sb = StockBalance.objects.get(warehouse=self.warehouse, nomenclature=self.rose)
+        self.assertEqual(sb.avg_purchase_price, Decimal('16'))
+
+
+class VerifyStockCostCommandTests(StockTestCase):
+    def setUp(self):
+        self.receive(self.rose, 4, 10)
+        self.receive(self.eucalyptus, 2, 30)
+        StockBalance.objects.filter(nomenclature=self.rose).update(total_cost=Decimal('55'), avg_purchase_price=0)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('verify_stock_cost', '--organization', str(self.org.pk), *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_mismatch_without_fixing(self):
+        out = self.run_command()
+
+        self.assertIn('расхождений: 1.', out)
+        self.assertEqual(self.balance(self.rose)[1], Decimal('55'))
+
+    def test_fix_recomputes_cost_from_batches_and_refreshes_read_model(self):
+        out = self.run_command('--fix')
+
+        self.assertIn('исправлено: 1.', out)
+        sb = StockBalance.objects.get(warehouse=self.warehouse, nomenclature=self.rose)
+        self.assertEqual((sb.total_cost, sb.avg_purchase_price), (Decimal('40'), Decimal('10')))
+        row = StockReadModel.objects.get(pk=sb.pk)
+        self.assertEqual((row.total_cost, row.avg_purchase_price), (Decimal('40'), Decimal('10')))
+        self.assertEqual(self.balance(self.eucalyptus)[1], Decimal('60'))
+        self.assertIn('расхождений: 0.', self.run_command())
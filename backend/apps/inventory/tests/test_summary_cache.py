@@ -0,0 +1,62 @@
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.core.models import TradingPoint, User, Warehouse
+
+from .base import StockTestCase
+
+URL = '/api/inventory/stock/summary/'
+
+
+class StockSummaryCacheTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='cashier', organization=cls.org, role='owner')
+        other_tp = TradingPoint.objects.create(organization=cls.org, name='Рынок')
+        cls.other_warehouse = Warehouse.objects.create(organization=cls.org, trading_point=other_tp, name='Ларёк')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 5, 10)
+
+    def get(self, **headers):
+        return self.client.get(URL, {'trading_point': str(self.tp.pk)}, headers=headers)
+
+    def total(self, response):
+        return {row['nomenclature_name']: Decimal(str(row['total_qty'])) for row in json.loads(response.content)}
+
+    def test_matching_etag_gets_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.total(first), {'Роза': Decimal('5')})
+
+        second = self.get(**{'If-None-Match': first['ETag']})
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_stock_change_bumps_the_point_version(self):
+        etag = self.get()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 2, 10)
+        response = self.get(**{'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.total(response), {'Роза': Decimal('7')})
+
+    def test_change_at_another_point_keeps_the_version(self):
+        etag = self.get()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receive(self.rose, 2, 10, warehouse=self.other_warehouse)
+
+        self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 304)
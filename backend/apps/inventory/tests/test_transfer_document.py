@@ -0,0 +1,144 @@
+from datetime import date
+from decimal import Decimal
+
+from rest_framework.test import APIClient
+
+from apps.core.models import Organization, TradingPoint, User, Warehouse
+from apps.inventory import services
+from apps.inventory.models import Batch, StockMovement, TransferDocument, TransferDocumentItem
+
+from .base import StockTestCase
+
+
+class PostTransferDocumentTests(StockTestCase):
+    def setUp(self):
+        self.receive(self.rose, 10, 10, arrival_date=date(2026, 1, 1), expiry_date=date(2026, 1, 20))
+        self.receive(self.rose, 10, 20, arrival_date=date(2026, 1, 2), expiry_date=date(2026, 1, 10))
+        self.receive(self.eucalyptus, 5, 30)
+        self.document = TransferDocument.objects.create(
+            organization=self.org, number=1, date=date(2026, 2, 1), warehouse_from=self.warehouse,
+        )
+
+    def add_item(self, nomenclature, quantity):
+        return TransferDocumentItem.objects.create(
+            document=self.document, nomenclature=nomenclature,
+            warehouse_to=self.showcase, quantity=Decimal(quantity),
+        )
+
+    def test_lines_move_fifo_cost_to_receiving_warehouse(self):
+        roses = self.add_item(self.rose, '15')
+        eucalyptus = self.add_item(self.eucalyptus, '2')
+
+        document = services.post_transfer_document(self.document)
+
+        # 10 × 10 + 5 × 20 = 200
+        self.assertEqual(self.balance(self.rose), (Decimal('5'), Decimal('100')))
+        self.assertEqual(self.balance(self.rose, self.showcase), (Decimal('15'), Decimal('200')))
+        self.assertEqual(self.balance(self.eucalyptus, self.showcase), (Decimal('2'), Decimal('60')))
+        self.assertEqual(document.status, TransferDocument.Status.POSTED)
+        self.assertEqual(document.total_cost, Decimal('260'))
+
+        roses.refresh_from_db()
+        self.assertEqual(roses.total, Decimal('200'))
+        self.assertEqual(roses.batch.warehouse, self.showcase)
+        self.assertEqual(roses.batch.purchase_price.quantize(Decimal('0.01')), Decimal('13.33'))
+        # Срок годности — ближайший из списанных партий
+        self.assertEqual(roses.batch.expiry_date, date(2026, 1, 10))
+        eucalyptus.refresh_from_db()
+        self.assertEqual(
+            StockMovement.objects.filter(
+                movement_type=StockMovement.MovementType.TRANSFER, batch__in=[roses.batch, eucalyptus.batch],
+            ).count(),
+            2,
+        )
+
+    def test_shortage_in_any_line_changes_nothing(self):
+        self.add_item(self.rose, '5')
+        self.add_item(self.eucalyptus, '6')
+
+        with self.assertRaises(services.InsufficientStockError):
+            services.post_transfer_document(self.document)
+
+        self.assertEqual(self.balance(self.rose), (Decimal('20'), Decimal('300')))
+        self.assertFalse(Batch.objects.filter(warehouse=self.showcase).exists())
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, TransferDocument.Status.DRAFT)
+
+    def test_line_to_the_sending_warehouse_is_rejected(self):
+        self.add_item(self.rose, '1')
+        TransferDocumentItem.objects.create(
+            document=self.document, nomenclature=self.eucalyptus,
+            warehouse_to=self.warehouse, quantity=Decimal('1'),
+        )
+
+        with self.assertRaisesMessage(ValueError, 'Склад-получатель совпадает с отправителем: Эвкалипт.'):
+            services.post_transfer_document(self.document)
+
+        self.assertFalse(Batch.objects.filter(warehouse=self.showcase).exists())
+
+    def test_posted_document_cannot_be_posted_again(self):
+        self.add_item(self.rose, '1')
+        services.post_transfer_document(self.document)
+
+        with self.assertRaisesMessage(ValueError, 'Документ уже проведён.'):
+            services.post_transfer_document(self.document)
+
+        self.assertEqual(self.balance(self.rose, self.showcase)[0], Decimal('1'))
+
+
+class TransferDocumentTenantTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='florist', organization=cls.org, role='owner')
+        other = Organization.objects.create(name='Соседи')
+        other_tp = TradingPoint.objects.create(organization=other, name='Рынок')
+        cls.foreign_warehouse = Warehouse.objects.create(organization=other, trading_point=other_tp, name='Чужой')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, warehouse_from, warehouse_to):
+        return {
+            'date': '2026-02-01',
+            'warehouse_from': str(warehouse_from.pk),
+            'items': [{
+                'nomenclature': str(self.rose.pk), 'warehouse_to': str(warehouse_to.pk), 'quantity': '1',
+            }],
+        }
+
+    def test_foreign_warehouses_are_rejected(self):
+        for warehouse_from, warehouse_to, field in [
+            (self.foreign_warehouse, self.showcase, 'warehouse_from'),
+            (self.warehouse, self.foreign_warehouse, 'items'),
+        ]:
+            with self.subTest(field=field):
+                response = self.client.post(
+                    '/api/inventory/transfer-documents/', self.payload(warehouse_from, warehouse_to), format='json',
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
+        self.assertFalse(TransferDocument.objects.exists())
+
+    def test_documents_are_numbered_per_organization(self):
+        for _ in range(2):
+            response = self.client.post(
+                '/api/inventory/transfer-documents/', self.payload(self.warehouse, self.showcase), format='json',
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(TransferDocument.objects.order_by('number').values_list('number', flat=True)), [1, 2],
+        )
+
+    def test_patch_of_sender_is_checked_against_saved_lines(self):
+        response = self.client.post(
+            '/api/inventory/transfer-documents/', self.payload(self.warehouse, self.showcase), format='json',
+        )
+        url = f'/api/inventory/transfer-documents/{response.data["id"]}/'
+
+        response = self.client.patch(url, {'warehouse_from': str(self.showcase.pk)}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('warehouse_from', response.data)
+        self.assertEqual(TransferDocument.objects.get().warehouse_from, self.warehouse)
@@ -0,0 +1,80 @@
+from datetime import date
+from decimal import Decimal
+
+from rest_framework.test import APIClient
+
+from apps.core.models import User
+from apps.inventory import services
+from apps.inventory.models import StockMovement
+
+from .base import StockTestCase
+
+
+class WriteOffStockManyTests(StockTestCase):
+    def setUp(self):
+        self.receive(self.rose, 4, 10, arrival_date=date(2026, 1, 1))
+        self.receive(self.rose, 4, 15, arrival_date=date(2026, 1, 2))
+        self.receive(self.eucalyptus, 3, 20, warehouse=self.showcase)
+
+    def test_lines_are_written_off_in_one_pass(self):
+        results = services.write_off_stock_many(self.org, [
+            {'warehouse': self.warehouse, 'nomenclature': self.rose, 'quantity': Decimal('3'),
+             'reason': StockMovement.WriteOffReason.DAMAGED},
+            {'warehouse': self.warehouse, 'nomenclature': self.rose, 'quantity': Decimal('2')},
+            {'warehouse': self.showcase, 'nomenclature': self.eucalyptus, 'quantity': Decimal('1'),
+             'notes': 'Сломан'},
+        ], notes='Конец дня')
+
+        # Вторая строка по той же паре продолжает FIFO с места первой
+        self.assertEqual([r['total_cost'] for r in results], [Decimal('30'), Decimal('25'), Decimal('20')])
+        self.assertEqual(self.balance(self.rose), (Decimal('3'), Decimal('45')))
+        self.assertEqual(self.balance(self.eucalyptus, self.showcase), (Decimal('2'), Decimal('40')))
+
+        movements = StockMovement.objects.filter(movement_type=StockMovement.MovementType.WRITE_OFF)
+        self.assertEqual(movements.count(), 4)
+        self.assertEqual(
+            set(movements.values_list('write_off_reason', 'notes')),
+            {
+                (StockMovement.WriteOffReason.DAMAGED, 'Конец дня'),
+                (StockMovement.WriteOffReason.OTHER, 'Конец дня'),
+                (StockMovement.WriteOffReason.OTHER, 'Сломан'),
+            },
+        )
+
+    def test_shortage_in_any_line_changes_nothing(self):
+        with self.assertRaises(services.InsufficientStockError):
+            services.write_off_stock_many(self.org, [
+                {'warehouse': self.warehouse, 'nomenclature': self.rose, 'quantity': Decimal('1')},
+                {'warehouse': self.showcase, 'nomenclature': self.eucalyptus, 'quantity': Decimal('4')},
+            ])
+
+        self.assertEqual(self.balance(self.rose), (Decimal('8'), Decimal('100')))
+        self.assertFalse(StockMovement.objects.filter(movement_type=StockMovement.MovementType.WRITE_OFF).exists())
+
+
+class WriteOffBulkEndpointTests(StockTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create(username='manager', organization=cls.org, role='owner')
+
+    def setUp(self):
+        self.receive(self.rose, 5, 10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, quantity):
+        return self.client.post('/api/inventory/movements/write-off-bulk/', {
+            'lines': [{'warehouse': str(self.warehouse.pk), 'nomenclature': str(self.rose.pk), 'quantity': quantity}],
+        }, format='json')
+
+    def test_returns_cost_per_line_and_total(self):
+        response = self.post('2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_cost']), Decimal('20'))
+        self.assertEqual(response.data['lines'][0]['batches_affected'], 1)
+
+    def test_shortage_is_bad_request(self):
+        self.assertEqual(self.post('6').status_code, 400)
+        self.assertEqual(self.balance(self.rose)[0], Decimal('5'))
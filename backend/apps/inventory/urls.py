@@ -9,6 +9,8 @@ router.register('movements', views.StockMovementViewSet)
 router.register('inventory-docs', views.InventoryDocumentViewSet)
 router.register('reserves', views.ReserveViewSet)
 router.register('receipt-documents', views.ReceiptDocumentViewSet)
+router.register('transfer-documents', views.TransferDocumentViewSet)
+router.register('expiry-alerts', views.ExpiryAlertViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,27 +1,41 @@
 from decimal import Decimal
 from django.db import transaction as db_transaction
 from django.db.models import F, Q
+from django.http import HttpResponse, HttpResponseNotModified
 from django.utils import timezone
 import datetime
 import json
+import logging
 
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import Batch, StockBalance, StockMovement, InventoryDocument, Reserve, ReceiptDocument
+from .models import (
+    Batch, StockBalance, StockMovement, InventoryDocument, Reserve, ReceiptDocument, ExpiryAlert,
+    StockReadModel, TransferDocument,
+)
 from .serializers import (
-    BatchSerializer, StockBalanceSerializer, StockMovementSerializer,
-    InventoryDocumentSerializer, ReserveSerializer,
+    BatchSerializer, StockMovementSerializer,
+    InventoryDocumentSerializer, ReserveSerializer, ExpiryAlertSerializer, StockReadModelSerializer,
+    TransferDocumentSerializer,
 )
 from .services import (
     process_batch_receipt, assemble_bouquet, disassemble_bouquet,
     write_off_stock, transfer_stock, InsufficientStockError, build_stock_summary, correct_bouquet_stock,
+    lock_reserve, reserve_stock_keys, shift_reserved_qty,
 )
+from .locks import is_db_conflict, lock_stock, retry_on_conflict
+from .read_model import mark_stock_read_model_dirty
+from .stock_alerts import read_stock_alerts
+from .summary_cache import get_stock_summary
 from apps.core.mixins import OrgPerformCreateMixin, _tenant_filter
+from apps.core.pagination import JournalPagination
 from apps.core.image_utils import compress_uploaded_image
 
+logger = logging.getLogger(__name__)
+
 
 def _validate_org_fk(instance, org, label='Объект'):
     """
@@ -125,36 +139,20 @@ class BatchViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
 
 
 class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
-    serializer_class = StockBalanceSerializer
-    queryset = StockBalance.objects.all()
+    """
+    Страница склада. Читает плоскую витрину StockReadModel (apps.inventory.read_model):
+    фильтры, поиск и сортировка идут по её колонкам без JOIN-ов.
+    """
+    serializer_class = StockReadModelSerializer
+    queryset = StockReadModel.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ['warehouse']
-    search_fields = ['nomenclature__name']
+    filterset_fields = ['warehouse', 'trading_point', 'accounting_type', 'group']
+    search_fields = ['nomenclature_name']
 
     def get_queryset(self):
-        qs = StockBalance.objects.select_related('nomenclature', 'warehouse')
-        qs = _tenant_filter(qs, self.request.user, tp_field='warehouse__trading_point')
-        return (
-            qs
-            .exclude(nomenclature__accounting_type='service')
-            .exclude(
-                Q(quantity=0)
-                & Q(nomenclature__accounting_type='finished_bouquet')
-            )
-            .order_by('nomenclature__name')
-        )
-
-    def destroy(self, request, *args, **kwargs):
-        """Удаление остатка — только для owner/admin."""
-        user = request.user
-        if user.role not in ('owner', 'admin'):
-            return Response(
-                {'detail': 'Удаление остатков доступно только владельцам и администраторам.'},
-                status=status.HTTP_403_FORBIDDEN,
-            )
-        instance = self.get_object()
-        instance.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        qs = StockReadModel.objects.filter(is_listed=True)
+        qs = _tenant_filter(qs, self.request.user, tp_field='trading_point')
+        return qs.order_by('nomenclature_name')
 
     @action(detail=True, methods=['get'], url_path='bouquet-detail')
     def bouquet_detail(self, request, pk=None):
@@ -162,81 +160,44 @@ class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
         Детальная информация о букете на остатках:
         - дата создания, кем создан
         - себестоимость, цена продажи
-        - состав (компоненты из BouquetBatchComponentSnapshot)
+        - состав (снимок BouquetBatchComponentSnapshot из витрины)
         """
-        from .models import BouquetBatchComponentSnapshot
+        from django.core.files.storage import default_storage
         from apps.nomenclature.models import BouquetTemplate
 
-        sb = self.get_object()
-        nom = sb.nomenclature
-        if nom.accounting_type != 'finished_bouquet':
+        row = self.get_object()
+        if row.accounting_type != 'finished_bouquet':
             return Response({'detail': 'Позиция не является букетом.'}, status=400)
 
-        # Ищем последнюю партию этого букета на этом складе с остатком
-        batch = (
-            Batch.objects.filter(
-                organization=sb.organization,
-                warehouse=sb.warehouse,
-                nomenclature=nom,
-                remaining__gt=0,
-            )
-            .order_by('-created_at')
-            .select_related('nomenclature')
-            .first()
-        )
-
         result = {
-            'nomenclature_id': str(nom.id),
-            'nomenclature_name': nom.name,
-            'purchase_price': str(nom.purchase_price),
-            'retail_price': str(nom.retail_price),
-            'quantity': str(sb.quantity),
-            'warehouse_name': sb.warehouse.name,
+            'nomenclature_id': str(row.nomenclature_id),
+            'nomenclature_name': row.nomenclature_name,
+            'purchase_price': str(row.purchase_price),
+            'retail_price': str(row.retail_price),
+            'quantity': str(row.quantity),
+            'warehouse_name': row.warehouse_name,
             'batch': None,
             'template_components': [],
         }
 
-        if batch:
-            # Находим пользователя-создателя через StockMovement
-            creator_movement = StockMovement.objects.filter(
-                batch=batch,
-                movement_type__in=['assembly', 'receipt'],
-            ).select_related('user').order_by('created_at').first()
-
-            creator_name = ''
-            if creator_movement and creator_movement.user:
-                u = creator_movement.user
-                creator_name = u.get_full_name() or u.username
-
-            # Получаем снимок состава
-            snapshots = BouquetBatchComponentSnapshot.objects.filter(
-                batch=batch,
-            ).select_related('nomenclature').order_by('sort_order')
-
-            components = [{
-                'nomenclature_id': str(s.nomenclature_id),
-                'nomenclature_name': s.nomenclature.name,
-                'quantity': str(s.quantity_per_unit),
-                'price': str(s.price_per_unit),
-                'accounting_type': s.accounting_type,
-                'source_mode': s.source_mode,
-            } for s in snapshots]
-
+        # Последняя партия этого букета на этом складе с остатком
+        if row.latest_batch_id and row.latest_batch:
+            batch = row.latest_batch
             result['batch'] = {
-                'id': str(batch.id),
-                'created_at': batch.created_at.isoformat(),
-                'arrival_date': str(batch.arrival_date),
-                'cost_price': str(batch.purchase_price),
-                'is_assembly': batch.is_assembly,
-                'creator': creator_name,
-                'image': batch.image.url if batch.image else None,
-                'notes': batch.notes,
-                'components': components,
+                'id': str(row.latest_batch_id),
+                'created_at': row.latest_batch_created_at.isoformat(),
+                'arrival_date': batch['arrival_date'],
+                'cost_price': batch['cost_price'],
+                'is_assembly': batch['is_assembly'],
+                'creator': batch['creator'],
+                'image': default_storage.url(batch['image']) if batch['image'] else None,
+                'notes': batch['notes'],
+                'components': batch['components'],
             }
 
         # Также загружаем компоненты из шаблона (для коррекции)
         try:
-            template = BouquetTemplate.objects.get(nomenclature=nom)
+            template = BouquetTemplate.objects.get(nomenclature_id=row.nomenclature_id)
             result['template_components'] = [{
                 'nomenclature_id': str(c.nomenclature_id),
                 'nomenclature_name': c.nomenclature.name,
@@ -253,6 +214,7 @@ class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
         Агрегированные остатки по номенклатуре (для продаж).
         Возвращает список {nomenclature, nomenclature_name, total_qty, warehouses: [{warehouse, warehouse_name, qty}]}
         Учитывает active_trading_point пользователя.
+        Ответ берётся из кэша по версии остатков точки; ETag / If-None-Match → 304.
         """
         from apps.core.mixins import _resolve_org, _resolve_tp
         org = _resolve_org(request.user)
@@ -267,44 +229,119 @@ class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
                 trading_point_id = str(tp.id)
 
         warehouse_id = request.query_params.get('warehouse')
-        result = build_stock_summary(
-            organization=org,
-            trading_point_id=trading_point_id,
-            warehouse_id=warehouse_id,
-        )
-        return Response(result)
+        try:
+            payload, etag = get_stock_summary(org, trading_point_id=trading_point_id, warehouse_id=warehouse_id)
+        except Exception:
+            logger.exception('Кэш сводки остатков недоступен, ответ из БД')
+            return Response(build_stock_summary(
+                organization=org,
+                trading_point_id=trading_point_id,
+                warehouse_id=warehouse_id,
+            ))
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        return response
 
     @action(detail=False, methods=['get'], url_path='low-stock')
     def low_stock(self, request):
         """
         Лёгкий endpoint для дашборда: только позиции с низким остатком.
         Возвращает уже отсортированный top-N без выгрузки всего склада.
+        Отвечает из кэша Redis (stock_alerts), без Redis — запросом к БД.
         """
+        from apps.core.mixins import _resolve_org, _resolve_tp
+
         try:
             limit = int(request.query_params.get('limit', 5))
         except (TypeError, ValueError):
             limit = 5
         limit = max(1, min(limit, 50))
 
+        org = _resolve_org(request.user)
+        tp = _resolve_tp(request.user)
+        cached = read_stock_alerts(org.pk, tp.pk if tp else None, 'low', limit) if org else None
+        if cached is not None:
+            return Response([
+                {
+                    'id': item['id'],
+                    'nomenclature_name': item['nomenclature_name'],
+                    'quantity': float(item['quantity']),
+                    'warehouse_name': item['warehouse_name'],
+                    'min_stock': float(item['min_stock']),
+                }
+                for item in cached[1]
+            ])
+
         qs = (
             self.get_queryset()
             .filter(
                 Q(quantity__lt=0)
-                | Q(nomenclature__min_stock__gt=0, quantity__lte=F('nomenclature__min_stock')),
-                nomenclature__is_active=True,
+                | Q(min_stock__gt=0, quantity__lte=F('min_stock')),
+                is_active=True,
             )
-            .order_by('quantity', 'nomenclature__name')[:limit]
+            .order_by('quantity', 'nomenclature_name')[:limit]
         )
 
         return Response([
             {
-                'id': str(sb.id),
-                'nomenclature_name': sb.nomenclature.name,
-                'quantity': float(sb.quantity),
-                'warehouse_name': sb.warehouse.name,
-                'min_stock': float(sb.nomenclature.min_stock),
+                'id': str(row.id),
+                'nomenclature_name': row.nomenclature_name,
+                'quantity': float(row.quantity),
+                'warehouse_name': row.warehouse_name,
+                'min_stock': float(row.min_stock),
+            }
+            for row in qs
+        ])
+
+    @action(detail=False, methods=['get'], url_path='atp')
+    def atp(self, request):
+        """
+        Доступно к обещанию по позициям рабочей (или переданной) торговой точки:
+        остаток − резерв − спрос открытых заказов.
+        ?nomenclature=<uuid>,<uuid> — только эти позиции.
+        """
+        import uuid
+        from apps.core.mixins import _resolve_org, _resolve_tp
+        from apps.nomenclature.models import Nomenclature
+        from .services import available_to_promise
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response([])
+
+        trading_point_id = request.query_params.get('trading_point')
+        if not trading_point_id:
+            tp = _resolve_tp(request.user)
+            if tp:
+                trading_point_id = str(tp.id)
+        raw_ids = [pk for pk in (request.query_params.get('nomenclature') or '').split(',') if pk.strip()]
+        try:
+            nomenclature_ids = [uuid.UUID(pk.strip()) for pk in raw_ids]
+            if trading_point_id:
+                uuid.UUID(str(trading_point_id))
+        except ValueError:
+            return Response({'detail': 'Некорректный идентификатор.'}, status=400)
+
+        rows = available_to_promise(org, trading_point_id=trading_point_id, nomenclature_ids=nomenclature_ids)
+        names = dict(Nomenclature.objects.filter(
+            pk__in={row['nomenclature_id'] for row in rows},
+        ).values_list('pk', 'name'))
+        rows.sort(key=lambda row: (names.get(row['nomenclature_id'], ''), str(row['trading_point_id'])))
+        return Response([
+            {
+                'trading_point': str(row['trading_point_id']) if row['trading_point_id'] else None,
+                'nomenclature': str(row['nomenclature_id']),
+                'nomenclature_name': names.get(row['nomenclature_id'], ''),
+                'on_hand': float(row['on_hand']),
+                'reserved': float(row['reserved']),
+                'committed': float(row['committed']),
+                'atp': float(row['atp']),
             }
-            for sb in qs
+            for row in rows
         ])
 
     @action(detail=False, methods=['get'], url_path='negative-alerts')
@@ -324,6 +361,23 @@ class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
             tp = _resolve_tp(request.user)
             trading_point_id = str(tp.id) if tp else None
 
+        cached = read_stock_alerts(org.pk, trading_point_id, 'negative', 10)
+        if cached is not None:
+            count, items = cached
+            return Response({
+                'count': count,
+                'items': [
+                    {
+                        'nomenclature': item['nomenclature'],
+                        'nomenclature_name': item['nomenclature_name'],
+                        'warehouse': item['warehouse'],
+                        'warehouse_name': item['warehouse_name'],
+                        'quantity': item['quantity'],
+                    }
+                    for item in items
+                ],
+            })
+
         qs = StockBalance.objects.filter(
             organization=org,
             quantity__lt=0,
@@ -340,15 +394,88 @@ class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
                 'warehouse_name': sb.warehouse.name,
                 'quantity': str(sb.quantity),
             }
-            for sb in qs.order_by('quantity')[:10]
+            for sb in qs.order_by('quantity', 'nomenclature__name')[:10]
         ]
         return Response({'count': qs.count(), 'items': items})
 
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        """
+        Остатки на момент времени: ?at=2026-03-07T20:00 (или дата — на конец дня).
+        Фильтры: warehouse, nomenclature, trading_point.
+        Считается от ближайшего ночного снимка + движения между снимком и моментом;
+        если снимка рядом с моментом нет — 400. Стоимость приближённая (total_cost_note).
+        """
+        from django.utils.dateparse import parse_date, parse_datetime
+        from apps.core.mixins import _resolve_org, _resolve_tp
+        from apps.core.models import Warehouse
+        from apps.nomenclature.models import Nomenclature
+        from .snapshots import TOTAL_COST_NOTE, SnapshotUnavailable, stock_as_of
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response({'at': None, 'source': None, 'items': []})
+
+        raw_at = request.query_params.get('at', '')
+        try:
+            day = parse_date(raw_at)
+            at = datetime.datetime.combine(day, datetime.time.max) if day else parse_datetime(raw_at)
+        except ValueError:
+            at = None
+        if at is None:
+            return Response(
+                {'detail': 'Укажите момент в параметре at (YYYY-MM-DD или YYYY-MM-DDTHH:MM).'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+        trading_point_id = request.query_params.get('trading_point')
+        if not trading_point_id:
+            tp = _resolve_tp(request.user)
+            trading_point_id = str(tp.id) if tp else None
+
+        warehouses = Warehouse.objects.filter(organization=org)
+        if trading_point_id:
+            warehouses = warehouses.filter(trading_point_id=trading_point_id)
+        if request.query_params.get('warehouse'):
+            warehouses = warehouses.filter(pk=request.query_params['warehouse'])
+        warehouse_names = dict(warehouses.values_list('id', 'name'))
+
+        try:
+            rows, source = stock_as_of(
+                org, at, list(warehouse_names),
+                nomenclature_id=request.query_params.get('nomenclature'),
+            )
+        except SnapshotUnavailable as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        nomenclature_names = dict(
+            Nomenclature.objects.filter(
+                pk__in={row['nomenclature'] for row in rows},
+            ).values_list('id', 'name')
+        )
+
+        items = sorted((
+            {
+                'nomenclature': str(row['nomenclature']),
+                'nomenclature_name': nomenclature_names.get(row['nomenclature'], ''),
+                'warehouse': str(row['warehouse']),
+                'warehouse_name': warehouse_names.get(row['warehouse'], ''),
+                'quantity': str(row['quantity']),
+                'total_cost': str(row['total_cost']),
+            }
+            for row in rows
+        ), key=lambda item: (item['nomenclature_name'], item['warehouse_name']))
+        return Response({
+            'at': at.isoformat(), 'source': source, 'total_cost_note': TOTAL_COST_NOTE, 'items': items,
+        })
+
 
 class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     http_method_names = ['get', 'post', 'head', 'options']
     serializer_class = StockMovementSerializer
     queryset = StockMovement.objects.all()
+    pagination_class = JournalPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['movement_type', 'warehouse_from', 'warehouse_to']
 
@@ -390,8 +517,67 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         except InsufficientStockError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_db_conflict(e):
+                raise  # повторит retry_on_conflict
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='write-off-bulk')
+    def write_off_bulk(self, request):
+        """
+        Пакетное списание (порча в конце дня) одной транзакцией.
+        POST: {lines: [{warehouse, nomenclature, quantity, reason?, notes?}], notes?}
+        Ответ: стоимость списания по каждой строке и итог.
+        """
+        from apps.nomenclature.models import Nomenclature
+        from apps.core.models import Warehouse
+        from apps.core.mixins import _resolve_org
+        from .serializers import BulkWriteOffSerializer
+        from .services import write_off_stock_many
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response({'detail': 'Не задана организация.'}, status=status.HTTP_400_BAD_REQUEST)
+        ser = BulkWriteOffSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        lines = ser.validated_data['lines']
+
+        warehouses = Warehouse.objects.in_bulk({line['warehouse'] for line in lines})
+        nomenclatures = Nomenclature.objects.in_bulk({line['nomenclature'] for line in lines})
+        for line in lines:
+            warehouse = warehouses.get(line['warehouse'])
+            nomenclature = nomenclatures.get(line['nomenclature'])
+            if warehouse is None or nomenclature is None:
+                return Response({'detail': 'Склад или номенклатура не найдены.'}, status=status.HTTP_400_BAD_REQUEST)
+            _validate_org_fk(warehouse, org, 'Склад')
+            _validate_org_fk(nomenclature, org, 'Номенклатура')
+            if nomenclature.accounting_type == 'service':
+                return Response(
+                    {'detail': f'«{nomenclature.name}»: услуги не участвуют в складском учёте.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            line['warehouse'], line['nomenclature'] = warehouse, nomenclature
+
+        try:
+            results = write_off_stock_many(org, lines, user=request.user, notes=ser.validated_data['notes'])
+        except InsufficientStockError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': 'ok',
+            'total_cost': str(sum((r['total_cost'] for r in results), Decimal('0'))),
+            'lines': [
+                {
+                    'warehouse': str(line['warehouse'].pk),
+                    'nomenclature': str(line['nomenclature'].pk),
+                    'nomenclature_name': line['nomenclature'].name,
+                    'quantity': str(line['quantity']),
+                    'total_cost': str(result['total_cost']),
+                    'batches_affected': len(result['items']),
+                }
+                for line, result in zip(lines, results)
+            ],
+        })
+
     @action(detail=False, methods=['post'], url_path='transfer')
     def transfer(self, request):
         """
@@ -427,9 +613,12 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         except InsufficientStockError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_db_conflict(e):
+                raise  # повторит retry_on_conflict
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['post'], url_path='assemble-bouquet')
+    @retry_on_conflict
     @db_transaction.atomic
     def assemble_bouquet_action(self, request):
         """
@@ -572,6 +761,9 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
                     batch.image.delete(save=False)
                 batch.image.save(image_file.name, compress_uploaded_image(image_file), save=True)
 
+            if image_file or selling_price not in (None, ''):
+                mark_stock_read_model_dirty([(wh_to.pk, bouquet_nom.pk)])
+
             # Опционально сохранить/обновить шаблон составом текущей сборки
             if _as_bool(data.get('add_to_templates')):
                 template, _ = BouquetTemplate.objects.get_or_create(
@@ -611,9 +803,113 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         except InsufficientStockError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_db_conflict(e):
+                raise  # повторит retry_on_conflict
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='assemble-bouquets')
+    def assemble_bouquets_action(self, request):
+        """
+        Пакетная сборка витрины по шаблонам одной транзакцией.
+        POST: {
+            warehouse_from: UUID, warehouse_to: UUID, notes?,
+            items: [{template: UUID, quantity: int, warehouse_from?, warehouse_to?, notes?,
+                     components?: [{nomenclature: UUID, quantity?, warehouse?}]}, ...]
+        }
+        components — переопределения компонентов шаблона (количество 0 — не использовать).
+        """
+        from apps.nomenclature.models import BouquetTemplate
+        from apps.core.models import Warehouse
+        from apps.core.mixins import _resolve_org
+        from .serializers import BatchAssemblySerializer
+        from .services import assemble_bouquets
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response({'detail': 'Не задана организация.'}, status=status.HTTP_400_BAD_REQUEST)
+        ser = BatchAssemblySerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+
+        templates = {
+            template.pk: template
+            for template in BouquetTemplate.objects.filter(
+                pk__in={item['template'] for item in data['items']},
+                nomenclature__organization=org,
+            ).select_related('nomenclature').prefetch_related('components__nomenclature')
+        }
+        warehouse_ids = {data['warehouse_from'], data['warehouse_to']}
+        for item in data['items']:
+            warehouse_ids.update(pk for pk in (item.get('warehouse_from'), item.get('warehouse_to')) if pk)
+            warehouse_ids.update(c['warehouse'] for c in item['components'] if c.get('warehouse'))
+        warehouses = Warehouse.objects.filter(organization=org).in_bulk(warehouse_ids)
+        if len(warehouses) != len(warehouse_ids):
+            return Response({'detail': 'Склад не найден.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        plans = []
+        for item in data['items']:
+            template = templates.get(item['template'])
+            if template is None:
+                return Response({'detail': 'Шаблон букета не найден.'}, status=status.HTTP_400_BAD_REQUEST)
+            wh_from = warehouses[item.get('warehouse_from') or data['warehouse_from']]
+            overrides = {c['nomenclature']: c for c in item['components']}
+            template_components = list(template.components.all())
+            unknown = overrides.keys() - {comp.nomenclature_id for comp in template_components}
+            if unknown:
+                return Response(
+                    {'detail': f'В шаблоне «{template.nomenclature.name}» нет компонентов: '
+                               f'{", ".join(sorted(map(str, unknown)))}.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            components = []
+            for comp in template_components:
+                override = overrides.get(comp.nomenclature_id, {})
+                quantity = override.get('quantity', comp.quantity)
+                if not quantity:
+                    continue
+                components.append({
+                    'nomenclature': comp.nomenclature,
+                    'quantity': quantity,
+                    'warehouse': warehouses[override['warehouse']] if override.get('warehouse') else wh_from,
+                })
+            if not components:
+                return Response(
+                    {'detail': f'Нет компонентов для сборки «{template.nomenclature.name}».'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            plans.append({
+                'nomenclature_bouquet': template.nomenclature,
+                'warehouse_from': wh_from,
+                'warehouse_to': warehouses[item.get('warehouse_to') or data['warehouse_to']],
+                'components': components,
+                'quantity': item['quantity'],
+                'notes': item['notes'] or data['notes'],
+                # Состав изменён переопределениями — снимок как у ручной сборки
+                'snapshot_source_mode': 'manual' if overrides else 'template',
+            })
+
+        try:
+            batches = assemble_bouquets(org, plans, user=request.user)
+        except InsufficientStockError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': 'ok',
+            'batches': [
+                {
+                    'batch_id': str(batch.id),
+                    'nomenclature': str(batch.nomenclature_id),
+                    'nomenclature_name': plan['nomenclature_bouquet'].name,
+                    'quantity': str(batch.quantity),
+                    'cost_price': str(batch.purchase_price),
+                }
+                for plan, batch in zip(plans, batches)
+            ],
+            'message': f'Собрано букетов: {sum(item["quantity"] for item in data["items"])}',
+        })
+
     @action(detail=False, methods=['post'], url_path='disassemble-bouquet')
+    @retry_on_conflict
     @db_transaction.atomic
     def disassemble_bouquet_action(self, request):
         """
@@ -683,9 +979,12 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         except InsufficientStockError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_db_conflict(e):
+                raise  # повторит retry_on_conflict
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['post'], url_path='correct-bouquet')
+    @retry_on_conflict
     @db_transaction.atomic
     def correct_bouquet_action(self, request):
         """
@@ -754,6 +1053,8 @@ class StockMovementViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         except InsufficientStockError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_db_conflict(e):
+                raise  # повторит retry_on_conflict
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -766,15 +1067,113 @@ class InventoryDocumentViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         qs = InventoryDocument.objects.select_related('warehouse').prefetch_related('items', 'items__nomenclature')
         return _tenant_filter(qs, self.request.user)
 
+    def _get_open_document(self):
+        doc = self.get_object()
+        if doc.status == InventoryDocument.Status.COMPLETED:
+            from rest_framework.exceptions import ValidationError as DRFValidationError
+            raise DRFValidationError({'detail': 'Инвентаризация уже проведена.'})
+        return doc
+
+    @action(detail=True, methods=['post'], url_path='seed')
+    def seed(self, request, pk=None):
+        """Заполнить документ всеми позициями склада (ожидаемое = учётный остаток)."""
+        from .services import seed_inventory_document
+        doc = self._get_open_document()
+        created = seed_inventory_document(doc)
+        return Response({'created': created, 'status': doc.status})
+
+    @action(detail=True, methods=['post'], url_path='counts')
+    def counts(self, request, pk=None):
+        """
+        Пачка фактических количеств: {items: [{nomenclature | barcode, actual_quantity}], accumulate: bool}.
+        accumulate=true — количества прибавляются (поштучное сканирование).
+        """
+        from .services import apply_inventory_counts
+        doc = self._get_open_document()
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Передайте непустой список items.'}, status=400)
+        try:
+            accepted, unknown = apply_inventory_counts(
+                doc, items, accumulate=_as_bool(request.data.get('accumulate')),
+            )
+        except (ArithmeticError, ValueError, TypeError):
+            return Response({'detail': 'Некорректное количество в items.'}, status=400)
+        return Response({'accepted': accepted, 'unknown': unknown})
+
+    @action(detail=True, methods=['post'], url_path='process')
+    def process_document(self, request, pk=None):
+        """Провести инвентаризацию — корректировки остатков по расхождениям."""
+        from .services import post_inventory_document
+        doc = self._get_open_document()
+        try:
+            result = post_inventory_document(doc, user=request.user)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        doc.refresh_from_db(fields=['status'])
+        return Response({'status': doc.status, **result})
+
 
 class ReserveViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     serializer_class = ReserveSerializer
     queryset = Reserve.objects.all()
 
     def get_queryset(self):
-        qs = Reserve.objects.select_related('nomenclature', 'warehouse')
+        qs = Reserve.objects.select_related('bouquet_nomenclature', 'warehouse')
         return _tenant_filter(qs, self.request.user)
 
+    # Счётчики reserved_qty партий и остатков меняются в той же транзакции, что и резерв;
+    # пары склад + букет (прежняя и новая) блокируются первыми
+    @retry_on_conflict
+    @db_transaction.atomic
+    def perform_create(self, serializer):
+        lock_stock(reserve_stock_keys(changes=serializer.validated_data))
+        super().perform_create(serializer)
+        shift_reserved_qty(serializer.instance, 1)
+
+    @retry_on_conflict
+    @db_transaction.atomic
+    def perform_update(self, serializer):
+        lock_stock(reserve_stock_keys(serializer.instance, serializer.validated_data))
+        lock_reserve(serializer.instance)
+        shift_reserved_qty(serializer.instance, -1)
+        super().perform_update(serializer)
+        shift_reserved_qty(serializer.instance, 1)
+
+    @retry_on_conflict
+    @db_transaction.atomic
+    def perform_destroy(self, instance):
+        lock_stock(reserve_stock_keys(instance))
+        shift_reserved_qty(lock_reserve(instance), -1)
+        instance.delete()
+
+
+class ExpiryAlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """Предупреждения о сроках годности (пересчитываются ночной задачей)."""
+    serializer_class = ExpiryAlertSerializer
+    queryset = ExpiryAlert.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['trading_point', 'warehouse', 'expiry_date']
+
+    def get_queryset(self):
+        qs = ExpiryAlert.objects.select_related('nomenclature', 'warehouse')
+        return _tenant_filter(qs, self.request.user, tp_field='trading_point')
+
+    @action(detail=False, methods=['get'], url_path='summary')
+    def summary(self, request):
+        """Счётчик для бейджа в UI: число позиций, количество и стоимость под угрозой."""
+        from django.db.models import Count, Sum
+        agg = self.filter_queryset(self.get_queryset()).aggregate(
+            count=Count('id'),
+            quantity=Sum('quantity'),
+            total_cost=Sum('total_cost'),
+        )
+        return Response({
+            'count': agg['count'],
+            'quantity': str(agg['quantity'] or 0),
+            'total_cost': str(agg['total_cost'] or 0),
+        })
+
 
 class ReceiptDocumentViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     """Документы приёмки (документ-ориентированный приход)."""
@@ -805,3 +1204,51 @@ class ReceiptDocumentViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             return Response({'status': 'ok', 'total_cost': str(doc.total_cost)})
         except Exception as e:
             return Response({'detail': str(e)}, status=400)
+
+
+class TransferDocumentViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
+    """Документы перемещения: строки по складам-получателям, проведение одним запросом."""
+    serializer_class = TransferDocumentSerializer
+    queryset = TransferDocument.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'warehouse_from']
+
+    def get_queryset(self):
+        qs = TransferDocument.objects.select_related('warehouse_from').prefetch_related(
+            'items', 'items__nomenclature', 'items__warehouse_to',
+        )
+        return _tenant_filter(qs, self.request.user)
+
+    def perform_create(self, serializer):
+        from apps.core.mixins import _resolve_org
+        org = _resolve_org(self.request.user)
+        serializer.save(organization=org, created_by=self.request.user)
+
+    def perform_destroy(self, instance):
+        if instance.status != TransferDocument.Status.DRAFT:
+            from rest_framework.exceptions import ValidationError as DRFValidationError
+            raise DRFValidationError({'detail': 'Проведённый документ нельзя удалить.'})
+        instance.delete()
+
+    @action(detail=True, methods=['post'], url_path='process')
+    def process_document(self, request, pk=None):
+        """
+        Провести документ — FIFO-списание с отправителя и партии на складах-получателях.
+        Принадлежность складов и позиций организации проверяет сериализатор при сохранении.
+        """
+        from .models import TransferDocumentItem
+        from .services import post_transfer_document
+
+        doc = self.get_object()
+        if doc.status != TransferDocument.Status.DRAFT:
+            return Response({'detail': 'Документ уже проведён.'}, status=400)
+        if not TransferDocumentItem.objects.filter(document=doc).exists():
+            return Response({'detail': 'Документ пуст — добавьте позиции.'}, status=400)
+
+        try:
+            doc = post_transfer_document(doc, user=request.user)
+        except InsufficientStockError as e:
+            return Response({'detail': str(e)}, status=400)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=400)
+        return Response(TransferDocumentSerializer(doc).data)
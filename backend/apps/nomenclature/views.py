@@ -16,6 +16,7 @@ from apps.core.mixins import (
     OrgPerformCreateMixin, _tenant_filter, _resolve_org,
     IsPlatformAdmin, ReadOnlyOrManager,
 )
+from apps.inventory.read_model import refresh_stock_read_model_for_nomenclatures
 
 
 class NomenclatureGroupViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
@@ -30,6 +31,12 @@ class NomenclatureGroupViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             qs = qs.filter(parent__isnull=True)
         return qs.distinct()
 
+    def perform_update(self, serializer):
+        """Новое название группы — в витрину остатков."""
+        group = serializer.save()
+        from apps.inventory.models import StockReadModel
+        StockReadModel.objects.filter(group=group).exclude(group_name=group.name).update(group_name=group.name)
+
     @action(detail=False, methods=['get'])
     def tree(self, request):
         """
@@ -170,7 +177,15 @@ class NomenclatureViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         instance = serializer.instance
         old_pp = instance.purchase_price
         old_rp = instance.retail_price
+        old_alert_fields = (instance.name, instance.min_stock, instance.is_active, instance.accounting_type)
         updated = serializer.save()
+        if (updated.name, updated.min_stock, updated.is_active, updated.accounting_type) != old_alert_fields:
+            # Название, порог и активность попадают в кэши остатков (тревоги, сводка продаж)
+            from apps.inventory.stock_alerts import invalidate_stock_alerts
+            from apps.inventory.summary_cache import invalidate_stock_summary
+            invalidate_stock_alerts(updated.organization_id)
+            invalidate_stock_summary(updated.organization_id)
+        refresh_stock_read_model_for_nomenclatures([updated.pk])
         if updated.purchase_price != old_pp or updated.retail_price != old_rp:
             PurchasePriceHistory.objects.create(
                 nomenclature=updated,
@@ -202,6 +217,7 @@ class NomenclatureViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             old_rp = nom.retail_price
             nom.retail_price = Decimal(str(retail))
             nom.save(update_fields=['retail_price'])
+            refresh_stock_read_model_for_nomenclatures([nom.pk])
             if nom.retail_price != old_rp:
                 PurchasePriceHistory.objects.create(
                     nomenclature=nom,
@@ -230,9 +246,17 @@ class NomenclatureViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             nom.group = None
 
         nom.save(update_fields=['group'])
+        refresh_stock_read_model_for_nomenclatures([nom.pk])
         return Response({'id': str(nom.id), 'group': str(nom.group_id) if nom.group_id else None})
 
 
+def _invalidate_buildable(organization_id):
+    """Рецептура изменилась — матрица «сколько можно собрать» (inventory.buildable) устарела."""
+    from apps.inventory.summary_cache import invalidate_stock_summary
+    if organization_id:
+        invalidate_stock_summary(organization_id)
+
+
 class BouquetTemplateViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     serializer_class = BouquetTemplateSerializer
     queryset = BouquetTemplate.objects.all()
@@ -245,6 +269,40 @@ class BouquetTemplateViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         """Автозаполнение organization из номенклатуры."""
         org = _resolve_org(self.request.user)
         serializer.save(organization=org)
+        _invalidate_buildable(org.pk if org else None)
+
+    def perform_update(self, serializer):
+        template = serializer.save()
+        _invalidate_buildable(template.nomenclature.organization_id)
+
+    def perform_destroy(self, instance):
+        organization_id = instance.nomenclature.organization_id
+        instance.delete()
+        _invalidate_buildable(organization_id)
+
+    @action(detail=False, methods=['get'], url_path='buildable')
+    def buildable(self, request):
+        """
+        Сколько букетов по каждому шаблону можно собрать из остатков точки
+        и какой компонент ограничивает сборку. ?trading_point=<uuid> — иначе рабочая точка.
+        """
+        import uuid
+        from apps.core.mixins import _resolve_tp
+        from apps.inventory.buildable import get_buildable_matrix
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response([])
+        trading_point_id = request.query_params.get('trading_point')
+        if trading_point_id:
+            try:
+                trading_point_id = str(uuid.UUID(trading_point_id))
+            except ValueError:
+                return Response({'detail': 'Некорректная торговая точка.'}, status=400)
+        else:
+            tp = _resolve_tp(request.user)
+            trading_point_id = str(tp.id) if tp else None
+        return Response(get_buildable_matrix(org.pk, trading_point_id))
 
 
 class BouquetComponentViewSet(viewsets.ModelViewSet):
@@ -269,4 +327,14 @@ class BouquetComponentViewSet(viewsets.ModelViewSet):
             if nom_org and str(nom_org) != str(org.id):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied('Шаблон не принадлежит вашей организации.')
-        serializer.save()
+        component = serializer.save()
+        _invalidate_buildable(component.template.nomenclature.organization_id)
+
+    def perform_update(self, serializer):
+        component = serializer.save()
+        _invalidate_buildable(component.template.nomenclature.organization_id)
+
+    def perform_destroy(self, instance):
+        organization_id = instance.template.nomenclature.organization_id
+        instance.delete()
+        _invalidate_buildable(organization_id)
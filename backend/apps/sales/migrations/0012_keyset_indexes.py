@@ -0,0 +1,52 @@
+"""Extend (..., -created_at) journal indexes with -id to back keyset (cursor) pagination."""
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_alter_organization_options_and_more'),
+        ('customers', '0003_alter_customeraddress_options_and_more'),
+        ('delivery', '0005_alter_courier_options_alter_deliveryzone_options'),
+        ('finance', '0012_keyset_indexes'),
+        ('marketing', '0004_alter_adchannel_options_alter_discount_options_and_more'),
+        ('sales', '0011_saleitem_reserve_saleitem_source_mode_salescategory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='idx_order_org_dt',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='idx_order_tp_dt',
+        ),
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='idx_sale_org_dt',
+        ),
+        migrations.RemoveIndex(
+            model_name='sale',
+            name='idx_sale_tp_dt',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='idx_order_org_dt_id'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['trading_point', '-created_at', '-id'], name='idx_order_tp_dt_id'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['organization', '-created_at', '-id'], name='idx_sale_org_dt_id'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['trading_point', '-created_at', '-id'], name='idx_sale_tp_dt_id'),
+        ),
+    ]
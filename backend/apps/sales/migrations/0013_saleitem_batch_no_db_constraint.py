@@ -0,0 +1,20 @@
+"""Drop the DB-level FK on SaleItem.batch so archived batches stay referenced."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_batch_archive'),
+        ('sales', '0012_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='saleitem',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sale_items', to='inventory.batch', verbose_name='Партия'),
+        ),
+    ]
@@ -103,8 +103,8 @@ class Sale(models.Model):
         verbose_name_plural = 'Продажи'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['organization', '-created_at'], name='idx_sale_org_dt'),
-            models.Index(fields=['trading_point', '-created_at'], name='idx_sale_tp_dt'),
+            models.Index(fields=['organization', '-created_at', '-id'], name='idx_sale_org_dt_id'),
+            models.Index(fields=['trading_point', '-created_at', '-id'], name='idx_sale_tp_dt_id'),
             models.Index(fields=['status'], name='idx_sale_status'),
         ]
         constraints = [
@@ -136,9 +136,11 @@ class SaleItem(models.Model):
         'nomenclature.Nomenclature', on_delete=models.PROTECT,
         related_name='sale_items', verbose_name='Номенклатура',
     )
+    # Без FK в БД: истощённая партия может уйти в архив (apps.inventory.archive)
     batch = models.ForeignKey(
         'inventory.Batch', on_delete=models.SET_NULL, null=True, blank=True,
         related_name='sale_items', verbose_name='Партия',
+        db_constraint=False,
     )
     quantity = models.DecimalField('Количество', max_digits=10, decimal_places=2)
     price = models.DecimalField('Цена за ед.', max_digits=12, decimal_places=2)
@@ -266,8 +268,8 @@ class Order(models.Model):
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['organization', '-created_at'], name='idx_order_org_dt'),
-            models.Index(fields=['trading_point', '-created_at'], name='idx_order_tp_dt'),
+            models.Index(fields=['organization', '-created_at', '-id'], name='idx_order_org_dt_id'),
+            models.Index(fields=['trading_point', '-created_at', '-id'], name='idx_order_tp_dt_id'),
             models.Index(fields=['status'], name='idx_order_status'),
             models.Index(fields=['delivery_date'], name='idx_order_delivery_date'),
         ]
@@ -46,14 +46,28 @@ class SaleItemSerializer(serializers.ModelSerializer):
         model = SaleItem
         fields = '__all__'
 
+    def _batch(self, obj):
+        # Партия могла уйти в архив: batch_id остаётся, а строки в batches уже нет
+        from apps.inventory.archive import get_batch
+        from apps.inventory.models import Batch
+        if not obj.batch_id:
+            return None
+        try:
+            batch = obj.batch
+        except Batch.DoesNotExist:
+            batch = None
+        return batch or get_batch(obj.batch_id)
+
     def get_warehouse_name(self, obj):
-        if obj.batch and obj.batch.warehouse:
-            return obj.batch.warehouse.name
+        batch = self._batch(obj)
+        if batch and batch.warehouse:
+            return batch.warehouse.name
         return ''
 
     def get_warehouse(self, obj):
-        if obj.batch and obj.batch.warehouse:
-            return str(obj.batch.warehouse_id)
+        batch = self._batch(obj)
+        if batch and batch.warehouse:
+            return str(batch.warehouse_id)
         return ''
 
     def get_bouquet_components(self, obj):
@@ -4,7 +4,7 @@ from django.db import models as db_models
 from django.db import transaction
 from django.db.models import Max
 
-from .models import Sale, Order, OrderStatusHistory
+from .models import Sale, SaleItem, Order, OrderStatusHistory
 
 
 def lock_organization_row(organization_id):
@@ -139,9 +139,14 @@ def do_sale_fifo_write_off(sale):
     FIFO-списание товаров со склада для позиций продажи.
     Вызывается при завершении + оплате.
     Идемпотентна: если FIFO-списание уже выполнено — пропускает.
+
+    Все строки чека (включая компоненты букетов) списываются одним
+    вызовом fifo_write_off_many: одна блокировка партий и один bulk_update.
     """
-    from apps.inventory.services import fifo_write_off, _update_stock_balance, InsufficientStockError
-    from apps.inventory.models import StockMovement, Batch
+    from apps.core.models import Warehouse
+    from apps.inventory.services import fifo_write_off_many, _update_stock_balance, _fifo_cost
+    from apps.inventory.ledger import record_movements
+    from apps.inventory.models import StockMovement
 
     # Идемпотентность: если для этой продажи уже есть SALE-движения — не списываем повторно
     if StockMovement.objects.filter(sale=sale, movement_type=StockMovement.MovementType.SALE).exists():
@@ -149,24 +154,15 @@ def do_sale_fifo_write_off(sale):
 
     warnings = []
 
-    warnings = []
-
-    for item in sale.items.select_related('nomenclature', 'batch').all():
-        nom = item.nomenclature
-        if nom.accounting_type == 'service':
-            continue
+    # Склад по умолчанию для торговой точки — вычисляется один раз на чек
+    default_warehouse = None
 
-        # Определение склада для списания
-        warehouse = None
-        if item.batch and item.batch.warehouse_id:
-            warehouse = item.batch.warehouse
-        if not warehouse:
-            from apps.core.models import Warehouse
-            warehouse = Warehouse.objects.filter(
-                organization=sale.organization,
-                is_default_for_sales=True,
-                trading_point=sale.trading_point,
-            ).first()
+    def _resolve_default_warehouse():
+        warehouse = Warehouse.objects.filter(
+            organization=sale.organization,
+            is_default_for_sales=True,
+            trading_point=sale.trading_point,
+        ).first()
         if not warehouse:
             warehouse = Warehouse.objects.filter(
                 organization=sale.organization,
@@ -176,98 +172,110 @@ def do_sale_fifo_write_off(sale):
             warehouse = Warehouse.objects.filter(organization=sale.organization).order_by('id').first()
         if not warehouse:
             raise ValueError(f'Не найден склад для списания. Убедитесь, что для торговой точки назначен склад.')
+        return warehouse
+
+    items = (
+        sale.items
+        .select_related('nomenclature', 'batch', 'batch__warehouse')
+        .prefetch_related(
+            'components__nomenclature',
+            'nomenclature__bouquet_template__components__nomenclature',
+        )
+    )
+
+    # Собираем строки списания по всем позициям чека
+    # Формат: (item, warehouse, nomenclature, total_qty_to_write_off)
+    plan = []
+    item_costs = {}
+    for item in items:
+        nom = item.nomenclature
+        if nom.accounting_type == 'service':
+            continue
 
-        # Собираем список того, что нужно списать
-        # Формат: [(nomenclature, total_qty_to_write_off), ...]
-        items_to_write_off = []
+        # Определение склада для списания
+        warehouse = None
+        if item.batch and item.batch.warehouse_id:
+            warehouse = item.batch.warehouse
+        if not warehouse:
+            if default_warehouse is None:
+                default_warehouse = _resolve_default_warehouse()
+            warehouse = default_warehouse
 
+        item_costs[item] = Decimal('0')
+        item_qty = Decimal(str(item.quantity))
         if getattr(item, 'is_custom_bouquet', False):
             # Если это авторский букет, списываем каждый его компонент
             for comp in item.components.all():
                 # Количество в составе умножаем на количество букетов
-                comp_qty = Decimal(str(comp.quantity)) * Decimal(str(item.quantity))
-                items_to_write_off.append((comp.nomenclature, comp_qty))
+                plan.append((item, warehouse, comp.nomenclature, Decimal(str(comp.quantity)) * item_qty))
         elif nom.accounting_type == 'finished_bouquet':
             # Если это шаблонный букет/композиция, списываем компоненты шаблона
             try:
                 template = nom.bouquet_template
                 for comp in template.components.all():
-                    comp_qty = Decimal(str(comp.quantity)) * Decimal(str(item.quantity))
-                    items_to_write_off.append((comp.nomenclature, comp_qty))
+                    plan.append((item, warehouse, comp.nomenclature, Decimal(str(comp.quantity)) * item_qty))
             except Exception:
                 # Если шаблона нет, попробуем списать как обычный товар (хотя это маловероятно)
-                items_to_write_off.append((nom, Decimal(str(item.quantity))))
+                plan.append((item, warehouse, nom, item_qty))
         else:
             # Обычный товар
-            items_to_write_off.append((nom, Decimal(str(item.quantity))))
-
-        total_item_cost = Decimal('0')
-
-        # Списание компонентов
-        from apps.inventory.models import StockMovement, Batch
-        from apps.inventory.services import fifo_write_off, _update_stock_balance
-        
-        for w_nom, required_qty in items_to_write_off:
-            available_qty = (
-                Batch.objects.filter(
-                    organization=sale.organization,
-                    warehouse=warehouse,
-                    nomenclature=w_nom,
-                    remaining__gt=0,
-                ).aggregate(total=db_models.Sum('remaining'))['total']
-                or Decimal('0')
+            plan.append((item, warehouse, nom, item_qty))
+
+    # Продажа допускает уход в минус: недостающее количество списывается без партии
+    fifo_results = fifo_write_off_many(
+        sale.organization,
+        [{'warehouse': wh, 'nomenclature': w_nom, 'quantity': qty} for _, wh, w_nom, qty in plan],
+        allow_shortage=True,
+    )
+
+    movements = []
+    for (item, warehouse, w_nom, required_qty), fifo_result in zip(plan, fifo_results):
+        nom = item.nomenclature
+        qty_from_fifo = sum((row['qty'] for row in fifo_result), Decimal('0'))
+        qty_shortage = required_qty - qty_from_fifo
+
+        for row in fifo_result:
+            movements.append(StockMovement(
+                organization=sale.organization,
+                nomenclature=w_nom,
+                movement_type=StockMovement.MovementType.SALE,
+                warehouse_from=warehouse,
+                batch=row['batch'],
+                quantity=row['qty'],
+                price=row['price'],
+                sale=sale,
+                notes=f'Продажа #{sale.number} ({nom.name})',
+            ))
+
+        if qty_shortage > 0:
+            movements.append(StockMovement(
+                organization=sale.organization,
+                nomenclature=w_nom,
+                movement_type=StockMovement.MovementType.SALE,
+                warehouse_from=warehouse,
+                batch=None,
+                quantity=qty_shortage,
+                price=w_nom.purchase_price,
+                sale=sale,
+                notes=f'Продажа в минус #{sale.number} ({nom.name})',
+            ))
+            warnings.append(
+                f'Продажа в минус: "{w_nom.name}" на складе "{warehouse.name}". '
+                f'Требуется {required_qty}, доступно {qty_from_fifo}, дефицит {qty_shortage}.'
             )
 
-            qty_from_fifo = min(required_qty, available_qty)
-            qty_shortage = required_qty - qty_from_fifo
-
-            fifo_result = []
-            if qty_from_fifo > 0:
-                fifo_result = fifo_write_off(
-                    organization=sale.organization,
-                    warehouse=warehouse,
-                    nomenclature=w_nom,
-                    quantity=qty_from_fifo,
-                )
-
-            for row in fifo_result:
-                StockMovement.objects.create(
-                    organization=sale.organization,
-                    nomenclature=w_nom,
-                    movement_type=StockMovement.MovementType.SALE,
-                    warehouse_from=warehouse,
-                    batch=row['batch'],
-                    quantity=row['qty'],
-                    price=row['price'],
-                    sale=sale,
-                    notes=f'Продажа #{sale.number} ({nom.name})',
-                )
-
-            if qty_shortage > 0:
-                StockMovement.objects.create(
-                    organization=sale.organization,
-                    nomenclature=w_nom,
-                    movement_type=StockMovement.MovementType.SALE,
-                    warehouse_from=warehouse,
-                    batch=None,
-                    quantity=qty_shortage,
-                    price=w_nom.purchase_price,
-                    sale=sale,
-                    notes=f'Продажа в минус #{sale.number} ({nom.name})',
-                )
-                warnings.append(
-                    f'Продажа в минус: "{w_nom.name}" на складе "{warehouse.name}". '
-                    f'Требуется {required_qty}, доступно {available_qty}, дефицит {qty_shortage}.'
-                )
-
-            # Суммируем себестоимость
-            comp_cost = sum(r['qty'] * r['price'] for r in fifo_result) + (qty_shortage * w_nom.purchase_price)
-            total_item_cost += comp_cost
-
-            _update_stock_balance(sale.organization, warehouse, w_nom, -required_qty)
+        # Суммируем себестоимость
+        batches_cost = _fifo_cost(fifo_result)
+        item_costs[item] += batches_cost + (qty_shortage * w_nom.purchase_price)
+
+        # Стоимость остатка уменьшается только на списанные партии (дефицит партий не трогает)
+        _update_stock_balance(sale.organization, warehouse, w_nom, -required_qty, -batches_cost)
+
+    record_movements(movements)
 
+    for item, total_item_cost in item_costs.items():
         item.cost_price = total_item_cost / Decimal(str(item.quantity)) if Decimal(str(item.quantity)) > 0 else Decimal('0')
-        item.save(update_fields=['cost_price'])
+    SaleItem.objects.bulk_update(list(item_costs), ['cost_price'])
 
     return warnings
 
@@ -404,7 +412,8 @@ def _rollback_sale_fifo(sale):
     Восстанавливает batch.remaining и StockBalance.
     Вызывается ВНУТРИ transaction.atomic.
     """
-    from apps.inventory.models import StockMovement, Batch
+    from apps.inventory.archive import get_batch_for_update
+    from apps.inventory.models import StockMovement
     from apps.inventory.services import _update_stock_balance
 
     sale_movements = (
@@ -421,11 +430,13 @@ def _rollback_sale_fifo(sale):
         return
 
     for movement in sale_movements:
+        restored_cost = Decimal('0')
         if movement.batch_id:
-            batch = Batch.objects.select_for_update().filter(pk=movement.batch_id).first()
+            batch = get_batch_for_update(movement.batch_id)
             if batch:
                 batch.remaining = (batch.remaining or Decimal('0')) + Decimal(str(movement.quantity or 0))
                 batch.save(update_fields=['remaining'])
+                restored_cost = Decimal(str(movement.quantity or 0)) * batch.purchase_price
 
         if movement.warehouse_from_id and movement.nomenclature_id:
             _update_stock_balance(
@@ -433,6 +444,7 @@ def _rollback_sale_fifo(sale):
                 warehouse=movement.warehouse_from,
                 nomenclature=movement.nomenclature,
                 qty_delta=Decimal(str(movement.quantity or 0)),
+                cost_delta=restored_cost,
             )
 
     sale_movements.delete()
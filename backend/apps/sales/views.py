@@ -13,11 +13,13 @@ from .serializers import (
 )
 from .services import rollback_sale_effects_before_delete
 from apps.core.mixins import OrgPerformCreateMixin, _tenant_filter, _resolve_org, ReadOnlyOrManager
+from apps.core.pagination import JournalPagination
 
 
 class SaleViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     serializer_class = SaleSerializer
     queryset = Sale.objects.all()
+    pagination_class = JournalPagination
     permission_classes = [ReadOnlyOrManager]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'trading_point', 'is_paid']
@@ -165,6 +167,7 @@ class OrderViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         raise MethodNotAllowed('DELETE', detail='Удаление заказов запрещено архитектурой. Переведите заказ в статус Отменён.')
     serializer_class = OrderSerializer
     queryset = Order.objects.all()
+    pagination_class = JournalPagination
     permission_classes = [ReadOnlyOrManager]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'source', 'trading_point', 'delivery_date']
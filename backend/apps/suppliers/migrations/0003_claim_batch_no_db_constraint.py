@@ -0,0 +1,20 @@
+"""Drop the DB-level FK on Claim.batch so archived batches stay referenced."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_batch_archive'),
+        ('suppliers', '0002_alter_supplier_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='claim',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claims', to='inventory.batch', verbose_name='Партия'),
+        ),
+    ]
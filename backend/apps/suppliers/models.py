@@ -151,6 +151,7 @@ class Claim(models.Model):
     batch = models.ForeignKey(
         'inventory.Batch', on_delete=models.SET_NULL, null=True, blank=True,
         related_name='claims', verbose_name='Партия',
+        db_constraint=False,
     )
     status = models.CharField(
         'Статус', max_length=20, choices=Status.choices, default=Status.OPEN,
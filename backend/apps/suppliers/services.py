@@ -0,0 +1,186 @@
+"""
+План потребности в материалах (MRP) по заказам клиентов.
+
+Валовая потребность — всё, что спишут продажи по подтверждённым заказам
+с датой доставки в периоде, разложенное так же, как его разложит
+do_sale_fifo_write_off: авторский букет — по составу позиции
+(OrderItemComposition), букет с шаблоном — по компонентам шаблона
+(BouquetComponent), остальное — сама позиция. Каждый вид позиций
+сворачивается по номенклатуре одним сгруппированным запросом.
+
+Чистая потребность = валовая − свободный остаток (quantity − reserved_qty).
+Её можно выгрузить черновиками заказов поставщикам: по поставщику с самой
+низкой ценой на позицию, одним заказом на поставщика.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+# Заказы, под которые закупаем: подтверждены, но ещё не проданы (не списаны со склада)
+MRP_ORDER_STATUSES = ('confirmed', 'in_assembly', 'assembled', 'on_delivery', 'delivered')
+
+MRP_NOTES_PREFIX = 'MRP'
+
+
+def _open_order_items(organization, date_from, date_to, trading_point_id=None):
+    from apps.sales.models import OrderItem
+
+    items = OrderItem.objects.filter(
+        order__organization=organization,
+        order__status__in=MRP_ORDER_STATUSES,
+        order__sales__isnull=True,
+        order__delivery_date__gte=date_from,
+        order__delivery_date__lte=date_to,
+    ).exclude(nomenclature__accounting_type='service')
+    if trading_point_id:
+        items = items.filter(order__trading_point_id=trading_point_id)
+    return items
+
+
+def gross_requirements(organization, date_from, date_to, trading_point_id=None):
+    """{nomenclature_id: количество} — валовая потребность заказов периода (три запроса)."""
+    from apps.nomenclature.models import BouquetComponent
+    from apps.sales.models import OrderItemComposition
+
+    items = _open_order_items(organization, date_from, date_to, trading_point_id)
+    gross = defaultdict(Decimal)
+
+    # Обычные позиции и букеты без шаблона
+    plain = items.filter(is_custom_bouquet=False).filter(
+        ~Q(nomenclature__accounting_type='finished_bouquet')
+        | Q(nomenclature__bouquet_template__isnull=True),
+    )
+    for row in plain.values('nomenclature_id').annotate(qty=Sum('quantity')).order_by():
+        gross[row['nomenclature_id']] += row['qty']
+
+    # Авторские букеты — по составу позиции
+    custom = OrderItemComposition.objects.filter(
+        order_item__in=items.filter(is_custom_bouquet=True),
+    ).values('nomenclature_id').annotate(qty=Sum(F('quantity') * F('order_item__quantity'))).order_by()
+    for row in custom:
+        gross[row['nomenclature_id']] += row['qty']
+
+    # Букеты по шаблону — по компонентам шаблона
+    templated = BouquetComponent.objects.filter(
+        template__nomenclature__order_items__in=items.filter(
+            is_custom_bouquet=False, nomenclature__accounting_type='finished_bouquet',
+        ),
+    ).values('nomenclature_id').annotate(
+        qty=Sum(F('quantity') * F('template__nomenclature__order_items__quantity')),
+    ).order_by()
+    for row in templated:
+        gross[row['nomenclature_id']] += row['qty']
+
+    return gross
+
+
+def material_requirements(organization, date_from, date_to, trading_point_id=None):
+    """
+    Валовая и чистая потребность по позициям за период (по дате доставки заказа).
+
+    Возвращает список по названию:
+    {nomenclature, nomenclature_name, gross, on_hand, reserved, net, supplier, supplier_name, price}.
+    Поставщик — с самой низкой ценой среди доступных предложений позиции.
+    """
+    from apps.inventory.models import StockBalance
+    from apps.nomenclature.models import Nomenclature
+    from .models import SupplierNomenclature
+
+    gross = {pk: qty.quantize(Decimal('0.01')) for pk, qty in gross_requirements(
+        organization, date_from, date_to, trading_point_id,
+    ).items() if qty > 0}
+    if not gross:
+        return []
+
+    balances = StockBalance.objects.filter(organization=organization, nomenclature_id__in=gross)
+    if trading_point_id:
+        balances = balances.filter(warehouse__trading_point_id=trading_point_id)
+    stock = {
+        row['nomenclature_id']: row
+        for row in balances.values('nomenclature_id').annotate(
+            on_hand=Sum('quantity'), reserved=Sum('reserved_qty'),
+        ).order_by()
+    }
+
+    offers = {}
+    for offer in SupplierNomenclature.objects.filter(
+        nomenclature_id__in=gross, is_available=True,
+        supplier__organization=organization, supplier__is_active=True,
+    ).select_related('supplier').order_by('nomenclature_id', 'price'):
+        offers.setdefault(offer.nomenclature_id, offer)
+
+    names = dict(Nomenclature.objects.filter(pk__in=gross).values_list('pk', 'name'))
+
+    result = []
+    zero = Decimal('0')
+    for nomenclature_id, qty in gross.items():
+        on_hand = stock.get(nomenclature_id, {}).get('on_hand') or zero
+        reserved = stock.get(nomenclature_id, {}).get('reserved') or zero
+        net = max(qty - max(on_hand - reserved, zero), zero)
+        offer = offers.get(nomenclature_id)
+        result.append({
+            'nomenclature': nomenclature_id,
+            'nomenclature_name': names.get(nomenclature_id, ''),
+            'gross': qty,
+            'on_hand': on_hand,
+            'reserved': reserved,
+            'net': net,
+            'supplier': offer.supplier_id if offer else None,
+            'supplier_name': offer.supplier.name if offer else '',
+            'price': offer.price if offer else None,
+            'min_quantity': offer.min_quantity if offer else None,
+        })
+    result.sort(key=lambda row: row['nomenclature_name'])
+    return result
+
+
+@transaction.atomic
+def export_requirements_to_supplier_orders(organization, date_from, date_to, trading_point_id=None, user=None):
+    """
+    Выгрузить чистую потребность черновиками заказов поставщикам — по заказу на поставщика.
+
+    Черновики прошлой выгрузки за тот же период (ещё не отправленные) заменяются.
+    Количество не меньше минимального у поставщика. Возвращает
+    {'orders': [SupplierOrder, ...], 'unassigned': [строки без поставщика]}.
+    """
+    from .models import SupplierOrder, SupplierOrderItem
+
+    notes = f'{MRP_NOTES_PREFIX} {date_from:%d.%m.%Y}–{date_to:%d.%m.%Y}'
+    if trading_point_id:
+        notes += f' ({trading_point_id})'
+    SupplierOrder.objects.filter(
+        organization=organization, status=SupplierOrder.Status.DRAFT, notes=notes,
+    ).delete()
+
+    lines = [row for row in material_requirements(organization, date_from, date_to, trading_point_id) if row['net'] > 0]
+    by_supplier = defaultdict(list)
+    unassigned = []
+    for row in lines:
+        if row['supplier']:
+            by_supplier[row['supplier']].append(row)
+        else:
+            unassigned.append(row)
+
+    orders = []
+    items = []
+    for supplier_id, rows in by_supplier.items():
+        order = SupplierOrder(
+            organization=organization,
+            supplier_id=supplier_id,
+            status=SupplierOrder.Status.DRAFT,
+            expected_date=date_from,
+            notes=notes,
+            created_by=user,
+        )
+        for row in rows:
+            quantity = max(row['net'], row['min_quantity'] or Decimal('0'))
+            items.append(SupplierOrderItem(
+                order=order, nomenclature_id=row['nomenclature'], quantity=quantity, price=row['price'],
+            ))
+            order.total += quantity * row['price']
+        orders.append(order)
+    SupplierOrder.objects.bulk_create(orders)
+    SupplierOrderItem.objects.bulk_create(items)
+    return {'orders': orders, 'unassigned': unassigned}
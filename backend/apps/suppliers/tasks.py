@@ -0,0 +1,27 @@
+from celery import shared_task
+from datetime import date
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def export_mrp_supplier_orders(organization_id, date_from, date_to, trading_point_id=None, user_id=None):
+    """Выгрузить план потребности за период черновиками заказов поставщикам (даты — ISO)."""
+    from apps.core.models import Organization, User
+    from apps.suppliers.services import export_requirements_to_supplier_orders
+
+    organization = Organization.objects.get(pk=organization_id)
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    result = export_requirements_to_supplier_orders(
+        organization, date.fromisoformat(date_from), date.fromisoformat(date_to),
+        trading_point_id=trading_point_id, user=user,
+    )
+    logger.info(
+        'MRP org %s %s–%s: черновиков %s, позиций без поставщика %s',
+        organization_id, date_from, date_to, len(result['orders']), len(result['unassigned']),
+    )
+    return {
+        'orders': [str(order.pk) for order in result['orders']],
+        'unassigned': [str(row['nomenclature']) for row in result['unassigned']],
+    }
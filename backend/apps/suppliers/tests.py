@@ -0,0 +1,111 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from apps.core.models import Organization, TradingPoint, Warehouse
+from apps.inventory.models import StockBalance
+from apps.nomenclature.models import BouquetComponent, BouquetTemplate, Nomenclature
+from apps.sales.models import Order, OrderItem, OrderItemComposition
+from apps.suppliers.models import Supplier, SupplierNomenclature, SupplierOrder
+from apps.suppliers.services import (
+    export_requirements_to_supplier_orders, gross_requirements, material_requirements,
+)
+
+WEEK = (date(2026, 3, 2), date(2026, 3, 8))
+
+
+class MaterialRequirementsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name='Сад')
+        cls.tp = TradingPoint.objects.create(organization=cls.org, name='Салон')
+        cls.warehouse = Warehouse.objects.create(organization=cls.org, trading_point=cls.tp, name='Холодильник')
+        cls.peony = Nomenclature.objects.create(organization=cls.org, name='Пион')
+        cls.ruscus = Nomenclature.objects.create(organization=cls.org, name='Рускус')
+        cls.ribbon = Nomenclature.objects.create(organization=cls.org, name='Лента')
+        cls.delivery = Nomenclature.objects.create(organization=cls.org, name='Доставка', accounting_type='service')
+        cls.bouquet = Nomenclature.objects.create(
+            organization=cls.org, name='Букет «Пионы»', accounting_type='finished_bouquet',
+        )
+        template = BouquetTemplate.objects.create(organization=cls.org, nomenclature=cls.bouquet)
+        BouquetComponent.objects.create(template=template, nomenclature=cls.peony, quantity=Decimal('5'))
+        BouquetComponent.objects.create(template=template, nomenclature=cls.ruscus, quantity=Decimal('3'))
+        cls.custom = Nomenclature.objects.create(
+            organization=cls.org, name='Авторский букет', accounting_type='finished_bouquet',
+        )
+
+        # Букет по шаблону ×2, авторский букет ×1 и лента ×4 — внутри периода
+        order = cls.order('confirmed', date(2026, 3, 3))
+        cls.item(order, cls.bouquet, '2')
+        cls.item(order, cls.ribbon, '4')
+        cls.item(order, cls.delivery, '1')
+        custom = cls.item(order, cls.custom, '1', is_custom_bouquet=True)
+        OrderItemComposition.objects.create(order_item=custom, nomenclature=cls.peony, quantity=Decimal('7'))
+        # Не попадают: новый заказ, заказ вне периода
+        cls.item(cls.order('new', date(2026, 3, 4)), cls.ribbon, '10')
+        cls.item(cls.order('confirmed', date(2026, 3, 10)), cls.ribbon, '10')
+
+        StockBalance.objects.create(
+            organization=cls.org, warehouse=cls.warehouse, nomenclature=cls.peony,
+            quantity=Decimal('10'), reserved_qty=Decimal('2'),
+        )
+        StockBalance.objects.create(
+            organization=cls.org, warehouse=cls.warehouse, nomenclature=cls.ribbon, quantity=Decimal('20'),
+        )
+
+        cheap = Supplier.objects.create(organization=cls.org, name='Оптовик')
+        dear = Supplier.objects.create(organization=cls.org, name='Ближний')
+        SupplierNomenclature.objects.create(supplier=cheap, nomenclature=cls.peony, price=Decimal('90'),
+                                            min_quantity=Decimal('25'))
+        SupplierNomenclature.objects.create(supplier=dear, nomenclature=cls.peony, price=Decimal('120'))
+        SupplierNomenclature.objects.create(supplier=dear, nomenclature=cls.ruscus, price=Decimal('30'))
+        cls.cheap, cls.dear = cheap, dear
+
+    @classmethod
+    def order(cls, status, delivery_date):
+        return Order.objects.create(
+            organization=cls.org, trading_point=cls.tp, status=status, delivery_date=delivery_date,
+        )
+
+    @classmethod
+    def item(cls, order, nomenclature, quantity, **kwargs):
+        return OrderItem.objects.create(
+            order=order, nomenclature=nomenclature, quantity=Decimal(quantity), price=Decimal('0'), **kwargs,
+        )
+
+    def test_gross_requirements_explode_bouquets_into_components(self):
+        gross = gross_requirements(self.org, *WEEK)
+
+        self.assertEqual(dict(gross), {
+            self.peony.pk: Decimal('17'),   # 2 × 5 по шаблону + 7 в авторском
+            self.ruscus.pk: Decimal('6'),
+            self.ribbon.pk: Decimal('4'),
+        })
+
+    def test_net_requirement_subtracts_free_stock(self):
+        rows = {row['nomenclature']: row for row in material_requirements(self.org, *WEEK)}
+
+        self.assertEqual(
+            [row['nomenclature_name'] for row in material_requirements(self.org, *WEEK)],
+            ['Лента', 'Пион', 'Рускус'],
+        )
+        peony = rows[self.peony.pk]
+        self.assertEqual((peony['on_hand'], peony['reserved'], peony['net']), (Decimal('10'), Decimal('2'), Decimal('9')))
+        self.assertEqual((peony['supplier'], peony['price']), (self.cheap.pk, Decimal('90')))
+        self.assertEqual(rows[self.ruscus.pk]['net'], Decimal('6'))
+        self.assertEqual(rows[self.ribbon.pk]['net'], Decimal('0'))
+        self.assertIsNone(rows[self.ribbon.pk]['supplier'])
+
+    def test_export_creates_one_draft_per_supplier_and_replaces_previous(self):
+        export_requirements_to_supplier_orders(self.org, *WEEK)
+        result = export_requirements_to_supplier_orders(self.org, *WEEK)
+
+        orders = SupplierOrder.objects.filter(organization=self.org)
+        self.assertEqual(orders.count(), 2)
+        self.assertEqual(result['unassigned'], [])
+        cheap_order = orders.get(supplier=self.cheap)
+        # Чистая потребность 9, но не меньше минимальной партии поставщика
+        self.assertEqual(list(cheap_order.items.values_list('quantity', flat=True)), [Decimal('25')])
+        self.assertEqual(cheap_order.total, Decimal('2250'))
+        self.assertEqual(orders.get(supplier=self.dear).total, Decimal('180'))
@@ -13,6 +13,9 @@ from .serializers import (
 )
 from apps.core.mixins import OrgPerformCreateMixin, _tenant_filter, _resolve_org
 
+# Самый длинный период плана потребности (дней)
+MRP_MAX_PERIOD_DAYS = 62
+
 
 class SupplierViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
     serializer_class = SupplierSerializer
@@ -64,6 +67,73 @@ class SupplierOrderViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         qs = SupplierOrder.objects.select_related('supplier').prefetch_related('items')
         return _tenant_filter(qs, self.request.user)
 
+    @staticmethod
+    def _mrp_params(params):
+        """(date_from, date_to, trading_point_id) из запроса; по умолчанию — только date_from."""
+        import uuid
+        from datetime import date
+
+        try:
+            date_from = date.fromisoformat(params.get('date_from') or '')
+            date_to = date.fromisoformat(params.get('date_to') or params.get('date_from'))
+            trading_point_id = params.get('trading_point') or None
+            if trading_point_id:
+                trading_point_id = str(uuid.UUID(str(trading_point_id)))
+        except (TypeError, ValueError):
+            raise ValidationError({'detail': 'Укажите date_from (и date_to) в формате ГГГГ-ММ-ДД.'})
+        if date_to < date_from:
+            raise ValidationError({'detail': 'date_to раньше date_from.'})
+        if (date_to - date_from).days > MRP_MAX_PERIOD_DAYS:
+            raise ValidationError({'detail': f'Период не длиннее {MRP_MAX_PERIOD_DAYS} дней.'})
+        return date_from, date_to, trading_point_id
+
+    @action(detail=False, methods=['get'], url_path='mrp')
+    def mrp(self, request):
+        """
+        План потребности по подтверждённым заказам с доставкой в периоде:
+        валовая потребность, остаток, резерв и чистая потребность по позициям.
+        GET ?date_from=&date_to=&trading_point=
+        """
+        from .services import material_requirements
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response([])
+        date_from, date_to, trading_point_id = self._mrp_params(request.query_params)
+        rows = material_requirements(org, date_from, date_to, trading_point_id)
+        return Response([
+            {
+                **row,
+                'nomenclature': str(row['nomenclature']),
+                'supplier': str(row['supplier']) if row['supplier'] else None,
+                'gross': str(row['gross']),
+                'on_hand': str(row['on_hand']),
+                'reserved': str(row['reserved']),
+                'net': str(row['net']),
+                'price': str(row['price']) if row['price'] is not None else None,
+                'min_quantity': str(row['min_quantity']) if row['min_quantity'] is not None else None,
+            }
+            for row in rows
+        ])
+
+    @action(detail=False, methods=['post'], url_path='mrp-export')
+    def mrp_export(self, request):
+        """
+        Выгрузить чистую потребность периода черновиками заказов поставщикам (фоновая задача).
+        POST {date_from, date_to?, trading_point?}
+        """
+        from .tasks import export_mrp_supplier_orders
+
+        org = _resolve_org(request.user)
+        if not org:
+            return Response({'detail': 'Не задана организация.'}, status=status.HTTP_400_BAD_REQUEST)
+        date_from, date_to, trading_point_id = self._mrp_params(request.data)
+        task = export_mrp_supplier_orders.delay(
+            str(org.pk), date_from.isoformat(), date_to.isoformat(),
+            trading_point_id=trading_point_id, user_id=str(request.user.pk),
+        )
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=True, methods=['post'], url_path='receive')
     @db_transaction.atomic
     def receive(self, request, pk=None):
@@ -71,7 +141,7 @@ class SupplierOrderViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
         C5: Приёмка поставки — создаёт партии, обновляет остатки, создаёт задолженность.
         Принимает опциональный параметр warehouse (UUID) и create_debt (bool, default True).
         """
-        from apps.inventory.services import process_batch_receipt
+        from apps.inventory.services import process_batch_receipts
         from apps.core.models import Warehouse
 
         order = self.get_object()
@@ -104,26 +174,27 @@ class SupplierOrderViewSet(OrgPerformCreateMixin, viewsets.ModelViewSet):
             if not warehouse:
                 raise ValidationError({'warehouse': 'Не найден склад для приёмки. Создайте склад.'})
 
-        items = order.items.select_related('nomenclature').all()
-        if not items.exists():
+        items = list(order.items.select_related('nomenclature'))
+        if not items:
             return Response({'detail': 'В заказе нет позиций.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        batches = []
+        created = process_batch_receipts(
+            order.organization,
+            [{
+                'warehouse': warehouse,
+                'nomenclature': item.nomenclature,
+                'quantity': item.quantity,
+                'purchase_price': item.price,
+            } for item in items],
+            supplier=order.supplier,
+            invoice_number=order.number,
+            user=request.user,
+            create_debt=bool(create_debt),
+        )
         for item in items:
-            batch = process_batch_receipt(
-                organization=order.organization,
-                warehouse=warehouse,
-                nomenclature=item.nomenclature,
-                supplier=order.supplier,
-                quantity=item.quantity,
-                purchase_price=item.price,
-                invoice_number=order.number,
-                user=request.user,
-                create_debt=bool(create_debt),
-            )
             item.received_quantity = item.quantity
-            item.save(update_fields=['received_quantity'])
-            batches.append(str(batch.id))
+        SupplierOrderItem.objects.bulk_update(items, ['received_quantity'])
+        batches = [str(batch.id) for batch in created]
 
         order.status = SupplierOrder.Status.RECEIVED
         order.save(update_fields=['status', 'updated_at'])
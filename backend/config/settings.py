@@ -193,6 +193,15 @@ CACHES = {
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
 
+# Пересчёт Nomenclature.purchase_price после прихода: False — в on_commit, True — задачей Celery
+PURCHASE_PRICE_RECOMPUTE_ASYNC = os.getenv('PURCHASE_PRICE_RECOMPUTE_ASYNC', 'False') == 'True'
+
+# Помесячные секции журналов (stock_movements, transactions): сколько месяцев держать наперёд
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+# Через сколько дней после истощения (remaining = 0) партия уходит в архив
+BATCH_ARCHIVE_AFTER_DAYS = int(os.getenv('BATCH_ARCHIVE_AFTER_DAYS', '90'))
+
 
 LOGGING = {
     'version': 1,
@@ -230,5 +239,25 @@ CELERY_BEAT_SCHEDULE = {
     'analytics_daily_summary_midnight': {
         'task': 'apps.analytics.tasks.calculate_daily_summary_for_all_points',
         'schedule': crontab(hour=0, minute=5),
-    }
+    },
+    'build_stock_snapshots_nightly': {
+        'task': 'apps.inventory.tasks.build_stock_snapshots',
+        'schedule': crontab(hour=23, minute=55),  # Снимок под текущей датой
+    },
+    'reconcile_stock_nightly': {
+        'task': 'apps.inventory.tasks.reconcile_stock',
+        'schedule': crontab(hour=3, minute=0),  # Только отчёт, без исправления
+    },
+    'ensure_journal_partitions_daily': {
+        'task': 'apps.core.tasks.ensure_journal_partitions',
+        'schedule': crontab(hour=2, minute=30),  # Секции журналов на месяцы вперёд
+    },
+    'archive_depleted_batches_nightly': {
+        'task': 'apps.inventory.tasks.archive_depleted_batches',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'auto_write_off_expired_daily': {
+        'task': 'apps.inventory.tasks.auto_write_off_expired',
+        'schedule': crontab(hour=6, minute=0),  # До открытия, только организации с политикой
+    },
 }